@@ -0,0 +1,131 @@
+"""Рассылка через подменённый Bot API с падением процесса посередине.
+
+Бот (bot.build_application) запускается в отдельном процессе и ходит в
+FakeTelegram этого процесса по HTTP. Рассылка создаётся заранее, и бот
+подхватывает её после запуска как незавершённую. Через --crash-after секунд
+процесс бота убивается SIGKILL, то есть без сохранения контрольной точки
+при остановке, и запускается снова, чтобы продолжить рассылку с последней
+сохранённой точки. Каждый --blocked-every-й пользователь "заблокировал бота"
+(ответ 403).
+
+Проверяется, что каждый пользователь получил сообщение, и считается, сколько
+получили его дважды из-за падения: не больше отправленных за интервал
+контрольной точки. Печатаются темп отправки и сообщения о прогрессе,
+которые получил администратор.
+
+Запуск: python bench/bench_broadcast.py --users 20000 --rate 500
+"""
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_telegram import FakeTelegram  # noqa: E402
+
+ADMIN_ID = 10 ** 9
+
+
+async def run_bot(base_url):
+    """Процесс бота: продолжить незавершённые рассылки и выйти, когда они закончатся"""
+    import bot
+    application = bot.build_application('123:TEST', base_url=base_url)
+    await application.initialize()
+    await application.post_init(application)
+    await application.start()
+    # Незавершённые рассылки подхватываются в фоне после запуска
+    await application.bot_data['warm_up']
+    while application.bot_data.get('broadcasts'):
+        await asyncio.sleep(0.1)
+    await application.stop()
+    await application.post_stop(application)
+    await application.shutdown()
+    await application.post_shutdown(application)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=20_000)
+    parser.add_argument('--rate', type=float, default=500, help='BROADCAST_RATE, сообщений в секунду')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--report-interval', type=float, default=1.0)
+    parser.add_argument('--crash-after', type=float, default=10.0)
+    parser.add_argument('--blocked-every', type=int, default=97)
+    parser.add_argument('--bot', metavar='BASE_URL', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.bot:
+        asyncio.run(run_bot(args.bot))
+        return
+
+    from broadcast import create_broadcast
+    from db import BROADCAST_LOAD_SQL, connect
+    from seed import seed
+
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    seed(path, args.users, 10, participations_per_user=0)
+    conn = connect(path)
+    with conn:
+        broadcast_id = create_broadcast(conn, ADMIN_ID, "Новые хакатоны в каталоге сообщества")
+
+    def handler(method, params):
+        if method == 'sendMessage' and int(params['chat_id']) % args.blocked_every == 0:
+            return 403, {'description': 'Forbidden: bot was blocked by the user'}
+        return 200, fake.answer(method, params)
+
+    env = dict(os.environ, BOT_DATABASE=path, RATE_LIMIT_GLOBAL='0', BROADCAST_RATE=str(args.rate),
+               BROADCAST_WORKERS=str(args.workers), BROADCAST_REPORT_INTERVAL=str(args.report_interval),
+               REMINDER_INTERVAL='3600')
+    command = [sys.executable, os.path.abspath(__file__), '--bot']
+
+    with FakeTelegram(handler=handler) as fake:
+        started = time.perf_counter()
+        process = subprocess.Popen(command + [fake.base_url], env=env, stderr=subprocess.DEVNULL)
+        try:
+            process.wait(args.crash_after)
+            crashed = False
+        except subprocess.TimeoutExpired:
+            process.send_signal(signal.SIGKILL)
+            process.wait()
+            crashed = True
+        killed_at = time.perf_counter() - started
+        before_crash = sum(1 for _, method, params in fake.calls
+                           if method == 'sendMessage' and int(params['chat_id']) != ADMIN_ID)
+        checkpoint = conn.execute(BROADCAST_LOAD_SQL, (broadcast_id,)).fetchone()
+        if crashed:
+            print(f"killed the bot after {killed_at:.1f}s: {before_crash} messages sent, "
+                  f"checkpoint cursor={checkpoint[3]} processed={checkpoint[4] + checkpoint[5]}")
+            subprocess.run(command + [fake.base_url], env=env, stderr=subprocess.DEVNULL, check=True)
+        elapsed = time.perf_counter() - started
+        calls = list(fake.calls)
+
+    _, _, total, cursor, sent, failed, finished_at = conn.execute(BROADCAST_LOAD_SQL, (broadcast_id,)).fetchone()
+    conn.close()
+    deliveries = Counter(int(params['chat_id']) for _, method, params in calls
+                         if method == 'sendMessage' and int(params['chat_id']) != ADMIN_ID)
+    reports = [params['text'] for _, method, params in calls if int(params.get('chat_id') or 0) == ADMIN_ID]
+    missing = args.users - sum(1 for user_id in range(1, args.users + 1) if deliveries[user_id])
+    duplicates = sum(1 for count in deliveries.values() if count > 1)
+    times = [moment for moment, method, params in calls if method == 'sendMessage']
+
+    print(f"{sum(deliveries.values())} sendMessage calls to {len(deliveries)} of {args.users} users "
+          f"in {elapsed:.1f}s including restart")
+    if len(times) > 1:
+        print(f"send rate: {len(times) / (times[-1] - times[0]):.0f} messages/s (limit {args.rate:.0f})")
+    print(f"stored: total={total} sent={sent} failed={failed} cursor={cursor} "
+          f"finished={'yes' if finished_at else 'no'}")
+    print(f"admin progress messages: {len(reports)}, last: {reports[-1] if reports else '-'}")
+    bound = args.rate * args.report_interval + 2 * args.workers * 3
+    ok = finished_at is not None and not missing and sent + failed == total and duplicates <= bound
+    print(f"missing {missing}, duplicated by the crash {duplicates} (bound {bound:.0f}) -> {'OK' if ok else 'FAIL'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
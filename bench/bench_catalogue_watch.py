@@ -0,0 +1,167 @@
+"""Горячая загрузка каталога хакатонов из CSV под нагрузкой.
+
+Бот из bot.build_application (Bot API подменён FakeRequest) следит за CSV-файлом
+(CATALOGUE_CSV) и получает поток обновлений - нажатия "Просмотр хакатонов" и
+текстовые сообщения, --rate в секунду. Тем временем файл --rewrites раз
+перезаписывается с --added новыми хакатонами: попеременно на месте и заменой
+через переименование, как сохраняют редакторы. Замеряется, через сколько
+новые хакатоны видны боту (CatalogueCache.names), и задержка обработки
+обновлений, пока идёт импорт; проверяется, что ни одно обновление не потеряно.
+С --polling inotify отключается и файл опрашивается.
+
+Запуск: python bench/bench_catalogue_watch.py --hackathons 2000 --rewrites 5
+"""
+import argparse
+import asyncio
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DIRECTORY = tempfile.mkdtemp()
+os.environ.setdefault('BOT_DATABASE', os.path.join(DIRECTORY, 'bench.db'))
+os.environ.setdefault('CATALOGUE_CSV', os.path.join(DIRECTORY, 'hackathons.csv'))
+os.environ.setdefault('CATALOGUE_DEBOUNCE', '0.5')
+os.environ.setdefault('CATALOGUE_POLL_INTERVAL', '1')
+# Измеряется обработка обновлений, а не ограничение исходящих запросов
+os.environ.setdefault('RATE_LIMIT_GLOBAL', '0')
+os.environ.setdefault('REMINDER_INTERVAL', '3600')
+
+from telegram import Update  # noqa: E402
+from telegram.ext import TypeHandler  # noqa: E402
+
+import config  # noqa: E402
+from fake_telegram import FakeTelegram, callback_update, message_update  # noqa: E402
+from import_hacks import CSV_COLUMNS  # noqa: E402
+from schedule import MSK  # noqa: E402
+from seed import hackathon_row, seed  # noqa: E402
+
+USERS = 1000
+
+
+def write_catalogue(path, count, replace):
+    """CSV с count хакатонами; replace - записать рядом и переименовать поверх"""
+    today = datetime.now(MSK)
+    target = path + '.tmp' if replace else path
+    with open(target, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_COLUMNS)
+        for i in range(1, count + 1):
+            name, registration, duration = hackathon_row(i, today)[:3]
+            writer.writerow([name, 'Призы', registration, duration, 'https://example.com', '@chat', ''])
+    if replace:
+        os.replace(target, path)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+async def wait_catalogue(catalogue, count, timeout):
+    """Время до того, как в каталоге бота станет count хакатонов, с"""
+    started = time.perf_counter()
+    while len(await catalogue.names()) != count:
+        if time.perf_counter() - started > timeout:
+            raise TimeoutError(f"Каталог не обновился за {timeout} с")
+        await asyncio.sleep(0.02)
+    return time.perf_counter() - started
+
+
+async def run(args):
+    import bot
+    import watcher
+    if args.polling:
+        watcher.inotify = None
+
+    write_catalogue(config.CATALOGUE_CSV, args.hackathons, replace=False)
+    fake = FakeTelegram()
+    application = bot.build_application(fake.token, request=fake.request())
+    sent, latencies = {}, []
+
+    async def processed(update, context):
+        latencies.append(time.perf_counter() - sent.pop(update.update_id))
+
+    application.add_handler(TypeHandler(Update, processed), group=1)
+    await application.initialize()
+    await application.post_init(application)
+    await application.start()
+    catalogue = application.bot_data['catalogue']
+    watching = application.bot_data['catalogue_watcher']
+
+    started = time.perf_counter()
+    await wait_catalogue(catalogue, args.hackathons, args.timeout)
+    print(f"watching {config.CATALOGUE_CSV} ({watching.mode}), initial import of {args.hackathons} hackathons "
+          f"visible after {time.perf_counter() - started:.2f}s")
+
+    rnd = random.Random(1)
+    running = True
+
+    async def load():
+        update_id = 0
+        while running:
+            update_id += 1
+            user_id = rnd.randrange(1, USERS + 1)
+            if update_id % 2:
+                data = callback_update(update_id, user_id, 'view_hackathons')
+            else:
+                data = message_update(update_id, user_id, 'привет')
+            sent[update_id] = time.perf_counter()
+            await application.update_queue.put(Update.de_json(data, application.bot))
+            await asyncio.sleep(1 / args.rate)
+        return update_id
+
+    loader = asyncio.ensure_future(load())
+    await asyncio.sleep(args.interval)
+    idle = list(latencies)
+    delays = []
+    count = args.hackathons
+    for rewrite in range(args.rewrites):
+        count += args.added
+        write_catalogue(config.CATALOGUE_CSV, count, replace=rewrite % 2 == 1)
+        delays.append(await wait_catalogue(catalogue, count, args.timeout))
+        await asyncio.sleep(args.interval)
+    running = False
+    total = await loader
+    deadline = time.perf_counter() + args.timeout
+    while sent and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+
+    await application.stop()
+    await application.post_stop(application)
+    await application.shutdown()
+    await application.post_shutdown(application)
+    return watching, total, len(sent), idle, latencies[len(idle):], delays
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--hackathons', type=int, default=2000, help='хакатонов в исходном CSV')
+    parser.add_argument('--added', type=int, default=50, help='новых хакатонов в каждой перезаписи')
+    parser.add_argument('--rewrites', type=int, default=5)
+    parser.add_argument('--interval', type=float, default=2.0, help='пауза между перезаписями, с')
+    parser.add_argument('--rate', type=float, default=200, help='обновлений в секунду')
+    parser.add_argument('--polling', action='store_true', help='без inotify, опросом файла')
+    parser.add_argument('--timeout', type=float, default=30.0)
+    args = parser.parse_args()
+
+    seed(os.environ['BOT_DATABASE'], USERS, 0, participations_per_user=0)
+    watching, total, lost, idle, during, delays = asyncio.run(run(args))
+
+    print(f"imports run: {watching.imports}, last: {watching.last_summary}")
+    print(f"new hackathons visible after: {', '.join(f'{delay:.2f}s' for delay in delays)} "
+          f"(debounce {config.CATALOGUE_DEBOUNCE}s"
+          f"{f', poll {config.CATALOGUE_POLL_INTERVAL}s' if watching.mode == 'polling' else ''})")
+    for title, values in (("before rewrites", idle), ("with rewrites", during)):
+        print(f"update latency {title}: n={len(values)} p50 {percentile(values, 0.5) * 1000:.2f}ms "
+              f"p99 {percentile(values, 0.99) * 1000:.2f}ms max {max(values, default=0) * 1000:.2f}ms")
+    print(f"{total} updates sent, {lost} not processed -> {'OK' if not lost else 'FAIL'}")
+    sys.exit(1 if lost else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Пропускная способность при параллельной обработке обновлений с порядком по пользователю.
+
+Бот из bot.build_application работает с подменённым Bot API, где каждый вызов занимает
+--api-delay секунд. Каждый пользователь присылает --per-user сообщений подряд; обработка
+одного пользователя должна идти строго по update_id, что проверяется для каждого прогона.
+
+Запуск: python bench/bench_concurrency.py --levels 1 4 16 64
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('BOT_DATABASE', os.path.join(tempfile.mkdtemp(), 'bench.db'))
+# Измеряется обработка обновлений, а не ограничение исходящих запросов
+os.environ.setdefault('RATE_LIMIT_GLOBAL', '0')
+
+from telegram import Update  # noqa: E402
+from telegram.ext import TypeHandler  # noqa: E402
+
+import bot  # noqa: E402
+import config  # noqa: E402
+from db import setup_database  # noqa: E402
+from fake_telegram import FakeTelegram, message_update  # noqa: E402
+
+
+async def run_level(concurrency, users, per_user, api_delay):
+    config.CONCURRENT_UPDATES = concurrency
+    fake = FakeTelegram()
+    application = bot.build_application(fake.token, request=fake.request(api_delay))
+
+    order = defaultdict(list)
+
+    async def record(update, context):
+        order[update.effective_user.id].append(update.update_id)
+
+    application.add_handler(TypeHandler(Update, record), group=-1)
+
+    await application.initialize()
+    await application.post_init(application)
+    await application.start()
+
+    count = users * per_user
+    updates = [message_update(i, 1 + (i - 1) % users, 'привет') for i in range(1, count + 1)]
+    started = time.perf_counter()
+    for data in updates:
+        await application.update_queue.put(Update.de_json(data, application.bot))
+    await asyncio.get_running_loop().run_in_executor(None, fake.wait_calls, count)
+    elapsed = time.perf_counter() - started
+
+    await application.stop()
+    await application.post_shutdown(application)
+    await application.shutdown()
+
+    ordered = all(ids == sorted(ids) for ids in order.values())
+    print(f"concurrency={concurrency:<4} {count / elapsed:8.0f} updates/s  per-user order {'ok' if ordered else 'BROKEN'}")
+    return ordered
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--levels', type=int, nargs='+', default=[1, 4, 16, 64])
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--per-user', type=int, default=5)
+    parser.add_argument('--api-delay', type=float, default=0.02, help='задержка одного вызова Bot API, с')
+    args = parser.parse_args()
+
+    setup_database()
+    results = [asyncio.run(run_level(level, args.users, args.per_user, args.api_delay)) for level in args.levels]
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Задержка обработчиков: sqlite3.connect на каждый запрос против пула Database.
+
+Каждый пользователь проходит цепочку запросов обработчиков; задержка считается
+от момента прихода обновления до ответа, поэтому включает ожидание event loop.
+
+Запуск: python bench/bench_db.py --users 200 --rounds 20
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import HACKATHON_PAGE_SQL, SAVE_PROFILE_SQL, Database  # noqa: E402
+from seed import seed  # noqa: E402
+
+
+async def journey_blocking(path, user_id, latencies):
+    started = time.perf_counter()
+    for sql, params, write in journey(user_id):
+        conn = sqlite3.connect(path, timeout=30)
+        cursor = conn.execute(sql, params)
+        if write:
+            conn.commit()
+        else:
+            cursor.fetchall()
+        conn.close()
+        await asyncio.sleep(0)
+    latencies.append(time.perf_counter() - started)
+
+
+async def journey_pooled(db, user_id, latencies):
+    started = time.perf_counter()
+    for sql, params, write in journey(user_id):
+        if write:
+            await db.execute(sql, params)
+        else:
+            await db.fetchall(sql, params)
+    latencies.append(time.perf_counter() - started)
+
+
+def journey(user_id):
+    yield "SELECT profile FROM users WHERE user_id = ?", (user_id,), False
+    yield HACKATHON_PAGE_SQL[False, 'next'], {'user_id': user_id, 'cursor': 0, 'now': int(time.time())}, False
+    yield SAVE_PROFILE_SQL, (user_id, f'user{user_id}', 'Go, backend'), True
+    yield "SELECT id, name FROM hackathons", (), False
+
+
+def report(name, latencies, elapsed):
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{name:<10} updates={len(latencies):>6}  p50={statistics.median(latencies) * 1000:8.2f}ms  "
+          f"p99={p99 * 1000:8.2f}ms  wall={elapsed:6.2f}s")
+
+
+async def run(args):
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    seed(path, args.seed_users, args.hackathons)
+
+    for name in ('blocking', 'pooled'):
+        latencies = []
+        db = Database(path, readers=args.readers) if name == 'pooled' else None
+        started = time.perf_counter()
+        for _ in range(args.rounds):
+            users = random.sample(range(1, args.seed_users + 1), args.users)
+            if db is None:
+                await asyncio.gather(*(journey_blocking(path, u, latencies) for u in users))
+            else:
+                await asyncio.gather(*(journey_pooled(db, u, latencies) for u in users))
+        report(name, latencies, time.perf_counter() - started)
+        if db is not None:
+            db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=100, help='одновременных пользователей')
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seed-users', type=int, default=5000)
+    parser.add_argument('--hackathons', type=int, default=200)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
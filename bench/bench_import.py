@@ -0,0 +1,104 @@
+"""Импорт синтетического CSV: построчный SELECT + UPDATE/INSERT против пакетного UPSERT.
+
+Оба варианта запускаются дважды: на пустой базе (вставка) и повторно (обновление).
+Затем инкрементальный импорт: повтор без изменений и с изменённым 1% строк.
+
+Запуск: python bench/bench_import.py --rows 100000
+"""
+import argparse
+import csv
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import connect, setup_database  # noqa: E402
+from import_hacks import CSV_COLUMNS, import_hackathons  # noqa: E402
+
+# Прежний импортер логировал каждую строку; форматирование сохраняется, вывод отбрасывается
+legacy_logger = logging.getLogger('legacy_import')
+legacy_logger.addHandler(logging.FileHandler(os.devnull))
+legacy_logger.propagate = False
+legacy_logger.setLevel(logging.INFO)
+
+
+def write_csv(path, rows, changed_every=0):
+    with open(path, 'w', encoding='utf-8', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(CSV_COLUMNS)
+        for i in range(rows):
+            comment = 'перенесён' if changed_every and i % changed_every == 0 else 'онлайн'
+            writer.writerow([f'Хакатон {i}', f'Призовой фонд {i % 1000} 000 ₽', '20.06.2024 23:55 мск',
+                             '21.06 - 23.06', f'https://example.com/{i}', f'@chat{i}', comment])
+
+
+def legacy_import(csv_file_path, db_path):
+    """Построчный импорт в том виде, в каком он был до пакетного UPSERT"""
+    conn = connect(db_path)
+    cursor = conn.cursor()
+    with open(csv_file_path, 'r', encoding='utf-8') as csv_file:
+        for row in csv.DictReader(csv_file):
+            if not row['Название']:
+                continue
+            cursor.execute("SELECT id FROM hackathons WHERE name = ?", (row['Название'],))
+            if cursor.fetchone():
+                cursor.execute('''
+                UPDATE hackathons
+                SET prizes = ?, registration = ?, duration = ?, link = ?, telegram_chat = ?, comments = ?
+                WHERE name = ?
+                ''', (row['Призы'], row['Регистрация'], row['Длительность'],
+                      row['Ссылка'], row['Telegram чат'], row['Комментарии'], row['Название']))
+                legacy_logger.info(f"Updated hackathon: {row['Название']}")
+            else:
+                cursor.execute('''
+                INSERT INTO hackathons (name, prizes, registration, duration, link, telegram_chat, comments)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (row['Название'], row['Призы'], row['Регистрация'], row['Длительность'],
+                      row['Ссылка'], row['Telegram чат'], row['Комментарии']))
+                legacy_logger.info(f"Inserted new hackathon: {row['Название']}")
+    conn.commit()
+    conn.close()
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100_000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    csv_path = os.path.join(workdir, 'hackathons.csv')
+    write_csv(csv_path, args.rows)
+    logging.getLogger('import_hacks').setLevel(logging.WARNING)
+
+    bulk_import = lambda csv_file_path, db_path: import_hackathons(csv_file_path, db_path, force=True)  # noqa: E731
+    for name, importer in (('per-row', legacy_import), ('bulk', bulk_import)):
+        db_path = os.path.join(workdir, f'{name}.db')
+        setup_database(db_path)
+        first = timed(importer, csv_path, db_path)
+        second = timed(importer, csv_path, db_path)
+        print(f"{name:<8} insert={first:7.2f}s ({args.rows / first:9.0f} rows/s)  "
+              f"update={second:7.2f}s ({args.rows / second:9.0f} rows/s)")
+
+    db_path = os.path.join(workdir, 'bulk.db')
+    unchanged = timed(import_hackathons, csv_path, db_path)
+    os.utime(csv_path)
+    touched = timed(import_hackathons, csv_path, db_path)
+    write_csv(csv_path, args.rows, changed_every=100)
+    started = time.perf_counter()
+    summary = import_hackathons(csv_path, db_path)
+    changed = time.perf_counter() - started
+    print(f"incremental unchanged={unchanged * 1000:.1f}ms  touched={touched * 1000:.1f}ms  "
+          f"1% changed={changed:.2f}s ({summary['changed']} rows written)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,428 @@
+"""Сквозной бенчмарк пользовательских сценариев на приложении из bot.build_application.
+
+Каждый из --journeys пользователей синтетической базы (--users пользователей,
+--hackathons хакатонов) проходит сценарий: /start, "Просмотр хакатонов", несколько
+"Следующий", "Я хочу участвовать", "Посмотреть участников" и листание участников.
+Следующее нажатие делается после ответа на предыдущее и берётся из клавиатуры,
+которую бот прислал, как у живого пользователя; одновременно сценарии проходят
+--concurrency пользователей.
+
+Без --workers обновления (Update с Message или CallbackQuery) кладутся прямо в
+update_queue приложения в этом процессе, Bot API подменён FakeRequest; задержка -
+от постановки в очередь до завершения всех обработчиков. С --workers 1 2 4 для
+каждого числа запускается bot.py (WORKERS=N, при N > 1 - фронт и N процессов-
+обработчиков), который получает обновления long polling'ом из FakeTelegram по
+HTTP; задержка - до ответа с клавиатурой. Так проверяется, даёт ли WORKERS выигрыш
+на данной машине: на одном ядре несколько процессов медленнее одного.
+
+Печатаются пропускная способность, квантили задержки по шагам, число SQL-запросов
+на обновление (только в этом процессе) и пиковый RSS. С --output результаты
+пишутся в JSON, а с --baseline сравниваются с прошлым JSON: при ухудшении больше
+--tolerance код выхода 1.
+
+Запуск: python bench/bench_journeys.py --users 20000 --journeys 500 --output journeys.json
+        python bench/bench_journeys.py --workers 1 2 4
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_telegram import FakeTelegram, callback_update, message_update  # noqa: E402
+
+# Шаги сценария: имя -> префикс callback_data кнопки, которую нажимает пользователь
+STEPS = {
+    'view_hackathons': 'view_hackathons',
+    'next_hackathon': 'next_hackathon:',
+    'participate': 'participate:',
+    'members': 'members:',
+    'next_participant': 'next_participant',
+}
+
+# Сколько ждать ответа бота на одно обновление, с
+REPLY_TIMEOUT = 60
+
+
+class StatementCounter:
+    """Число SQL-операторов, выполненных на соединениях бота (через sqlite3 trace callback)"""
+
+    def __init__(self):
+        self._counter = itertools.count(1)
+        self.value = 0
+
+    def trace(self, statement):
+        # Операторы внутри триггеров приходят отдельно с комментарием "-- TRIGGER"
+        if not statement.startswith('--'):
+            self.value = next(self._counter)
+
+    def patch(self, module):
+        """Подменить module.connect, чтобы новые соединения сообщали о каждом операторе"""
+        connect = module.connect
+
+        def traced_connect(*args, **kwargs):
+            conn = connect(*args, **kwargs)
+            conn.set_trace_callback(self.trace)
+            return conn
+
+        module.connect = traced_connect
+
+
+class Journeys:
+    """Прогон сценариев: отправка обновлений через submit(data) и ожидание ответа на них.
+
+    Обновление считается обработанным, когда вызван complete(user_id): у каждого
+    пользователя в обработке не больше одного обновления.
+    """
+
+    def __init__(self, submit, rnd, browse, participants):
+        self.submit = submit
+        self.rnd = rnd
+        self.browse = browse
+        self.participants = participants
+        self.loop = asyncio.get_running_loop()
+        self.update_ids = itertools.count(1)
+        self.keyboards = {}
+        self.waiting = {}
+        self.latencies = defaultdict(list)
+
+    def on_call(self, method, params):
+        """Вызов Bot API: запомнить последнюю inline-клавиатуру в чате; вернуть id чата, если она есть"""
+        markup = params.get('reply_markup')
+        if method in ('sendMessage', 'editMessageText') and markup:
+            buttons = json.loads(markup) if isinstance(markup, str) else markup
+            data = [button['callback_data'] for row in buttons.get('inline_keyboard', ())
+                    for button in row if 'callback_data' in button]
+            if data:
+                chat_id = int(params['chat_id'])
+                self.keyboards[chat_id] = data
+                return chat_id
+        return None
+
+    def complete(self, user_id):
+        """Обновление пользователя обработано; можно вызывать из любого потока"""
+        self.loop.call_soon_threadsafe(self._resolve, user_id, time.perf_counter())
+
+    def _resolve(self, user_id, moment):
+        future = self.waiting.pop(user_id, None)
+        if future is not None and not future.done():
+            future.set_result(moment)
+
+    def button(self, user_id, prefix):
+        return next((data for data in self.keyboards.get(user_id, ()) if data.startswith(prefix)), None)
+
+    async def send(self, step, user_id, data):
+        future = self.loop.create_future()
+        self.waiting[user_id] = future
+        started = time.perf_counter()
+        await self.submit(data)
+        try:
+            self.latencies[step].append(await asyncio.wait_for(future, REPLY_TIMEOUT) - started)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Нет ответа на {step} пользователю {user_id} за {REPLY_TIMEOUT} с") from None
+
+    async def press(self, user_id, step):
+        data = self.button(user_id, STEPS[step])
+        if data is None:
+            return False
+        await self.send(step, user_id, callback_update(next(self.update_ids), user_id, data))
+        return True
+
+    async def run(self, user_id, on_step=None):
+        """Сценарий одного пользователя; on_step(step) вызывается после каждого шага"""
+        on_step = on_step or (lambda step: None)
+        await self.send('start', user_id, message_update(next(self.update_ids), user_id, '/start'))
+        on_step('start')
+        plan = (['view_hackathons'] + ['next_hackathon'] * self.rnd.randint(1, self.browse)
+                + ['participate', 'members'] + ['next_participant'] * self.rnd.randint(1, self.participants))
+        for step in plan:
+            if not await self.press(user_id, step):
+                break
+            on_step(step)
+
+    async def warm_up(self, user_ids):
+        """Сценарии до измерений: кэши бота, подготовленные запросы, запуск процессов"""
+        await asyncio.gather(*(self.run(user_id) for user_id in user_ids))
+        self.latencies.clear()
+
+    async def measure(self, user_ids, concurrency):
+        """Прогнать сценарии user_ids, не больше concurrency одновременно; вернуть время прогона"""
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def journey(user_id):
+            async with semaphore:
+                await self.run(user_id)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(journey(user_id) for user_id in user_ids))
+        return time.perf_counter() - started
+
+    def summary(self, elapsed):
+        updates = sum(len(values) for values in self.latencies.values())
+        steps = {step: {'count': len(self.latencies[step]), 'latency_ms': percentiles(self.latencies[step]),
+                        'sql': None}
+                 for step in ('start', *STEPS) if step in self.latencies}
+        return {
+            'updates': updates,
+            'elapsed_s': elapsed,
+            'throughput': updates / elapsed,
+            'latency_ms': percentiles([value for values in self.latencies.values() for value in values]),
+            'steps': steps,
+        }
+
+
+def percentiles(values):
+    values = sorted(values)
+    if not values:
+        return {}
+    point = lambda q: values[min(len(values) - 1, int(q * len(values)))] * 1000  # noqa: E731
+    return {'p50': point(0.5), 'p90': point(0.9), 'p95': point(0.95), 'p99': point(0.99), 'max': values[-1] * 1000}
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux сообщает килобайты, macOS - байты
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def process_tree_peak_rss_mb(pid):
+    """Сумма пиковых RSS процесса и всех его потомков (по /proc); None, если /proc нет"""
+    if not os.path.isdir('/proc'):
+        return None
+    children = defaultdict(list)
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    parent = int(f.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            children[parent].append(int(entry))
+    total, stack = 0, [pid]
+    while stack:
+        current = stack.pop()
+        stack.extend(children[current])
+        try:
+            with open(f'/proc/{current}/status') as f:
+                total += next((int(line.split()[1]) for line in f if line.startswith('VmHWM:')), 0)
+        except OSError:
+            pass
+    return total / 1024
+
+
+async def run_in_process(args, path, user_ids):
+    """Прогон в этом процессе: обновления прямо в update_queue, завершение - по последней группе обработчиков"""
+    import bot
+    import config
+    import db
+    from telegram import Update
+    from telegram.ext import TypeHandler
+
+    counter = StatementCounter()
+    counter.patch(db)
+    config.CONCURRENT_UPDATES = args.concurrency
+
+    def handler(method, params):
+        journeys.on_call(method, params)
+        return 200, fake.answer(method, params)
+
+    fake = FakeTelegram(handler=handler)
+    application = bot.build_application(fake.token, request=fake.request(args.api_delay))
+
+    async def submit(data):
+        await application.update_queue.put(Update.de_json(data, application.bot))
+
+    async def processed(update, context):
+        journeys.complete(update.effective_user.id)
+
+    journeys = Journeys(submit, random.Random(args.seed), args.browse, args.participants)
+    application.add_handler(TypeHandler(Update, processed), group=1)
+
+    await application.initialize()
+    await application.post_init(application)
+    await application.start()
+    # Кэш каталога и индекс навыков готовятся в фоне после запуска; измеряется уже прогретый бот
+    await application.bot_data['warm_up']
+    if 'recommender' in application.bot_data:
+        await application.bot_data['recommender'].start()
+
+    await journeys.warm_up(user_ids[:args.warmup])
+    calls_before, statements_before = len(fake.calls), counter.value
+    elapsed = await journeys.measure(user_ids[args.warmup:-1], args.concurrency)
+    results = journeys.summary(elapsed)
+    results['sql_per_update'] = (counter.value - statements_before) / results['updates']
+    results['api_calls_per_update'] = (len(fake.calls) - calls_before) / results['updates']
+
+    # SQL по шагам: один сценарий без параллельных, чтобы операторы относились к своему шагу
+    step_statements = defaultdict(list)
+    mark = [counter.value]
+
+    def on_step(step):
+        step_statements[step].append(counter.value - mark[0])
+        mark[0] = counter.value
+
+    await journeys.run(user_ids[-1], on_step)
+    for step, values in results['steps'].items():
+        values['sql'] = max(step_statements[step], default=None)
+
+    await application.stop()
+    await application.post_stop(application)
+    await application.shutdown()
+    await application.post_shutdown(application)
+    results['peak_rss_mb'] = peak_rss_mb()
+    return results
+
+
+async def run_processes(args, path, user_ids, workers):
+    """Прогон bot.py в отдельном процессе (с WORKERS=workers), который ходит в FakeTelegram по HTTP"""
+    ready = threading.Event()
+
+    def handler(method, params):
+        if method == 'getUpdates':
+            ready.set()
+        elif args.api_delay:
+            time.sleep(args.api_delay)
+        chat_id = journeys.on_call(method, params)
+        if chat_id is not None:
+            journeys.complete(chat_id)
+        return 200, fake.answer(method, params)
+
+    async def submit(data):
+        fake.push([data])
+
+    journeys = Journeys(submit, random.Random(args.seed), args.browse, args.participants)
+    log = os.path.join(os.path.dirname(path), f'bot-{workers}.log')
+    with FakeTelegram(handler=handler) as fake, open(log, 'w') as stderr:
+        env = dict(os.environ, BOT_DATABASE=path, TELEGRAM_BOT_TOKEN=fake.token, TELEGRAM_API_URL=fake.base_url,
+                   BOT_MODE='polling', WORKERS=str(workers), CONCURRENT_UPDATES=str(args.concurrency))
+        process = subprocess.Popen([sys.executable, os.path.join(ROOT, 'bot.py')], env=env, stderr=stderr)
+        try:
+            if not await asyncio.get_running_loop().run_in_executor(None, ready.wait, REPLY_TIMEOUT):
+                raise TimeoutError(f"bot.py не начал получать обновления, см. {log}")
+            await journeys.warm_up(user_ids[:args.warmup])
+            calls_before = len(fake.calls)
+            elapsed = await journeys.measure(user_ids[args.warmup:-1], args.concurrency)
+            results = journeys.summary(elapsed)
+            results['sql_per_update'] = None
+            results['api_calls_per_update'] = (len(fake.calls) - calls_before) / results['updates']
+            results['peak_rss_mb'] = process_tree_peak_rss_mb(process.pid)
+        finally:
+            process.terminate()
+            process.wait()
+    return results
+
+
+def regressions(run, baseline, tolerance):
+    """Метрики, ухудшившиеся относительно baseline больше чем на tolerance"""
+    checks = [('throughput', run['throughput'], baseline['throughput'], False),
+              ('latency p95', run['latency_ms']['p95'], baseline['latency_ms']['p95'], True),
+              ('latency p99', run['latency_ms']['p99'], baseline['latency_ms']['p99'], True),
+              ('sql_per_update', run['sql_per_update'], baseline['sql_per_update'], True),
+              ('peak_rss_mb', run['peak_rss_mb'], baseline['peak_rss_mb'], True)]
+    found = []
+    for name, value, previous, lower_is_better in checks:
+        if value is None or not previous:
+            continue
+        change = (value - previous) / previous
+        if (change if lower_is_better else -change) > tolerance:
+            found.append(f"{name}: {previous:.2f} -> {value:.2f} ({change:+.0%})")
+    return found
+
+
+def print_run(run, journeys):
+    latency = run['latency_ms']
+    mode = f"bot.py WORKERS={run['workers']}" if run['workers'] else "in-process"
+    print(f"[{mode}] {run['updates']} updates from {journeys} journeys in {run['elapsed_s']:.2f}s: "
+          f"{run['throughput']:.0f} updates/s")
+    print(f"latency ms: p50 {latency['p50']:.2f}  p95 {latency['p95']:.2f}  p99 {latency['p99']:.2f}  "
+          f"max {latency['max']:.2f}")
+    sql = 'n/a' if run['sql_per_update'] is None else f"{run['sql_per_update']:.2f}"
+    rss = 'n/a' if run['peak_rss_mb'] is None else f"{run['peak_rss_mb']:.0f} MB"
+    print(f"SQL statements per update {sql}, Bot API calls per update {run['api_calls_per_update']:.2f}, "
+          f"peak RSS {rss}")
+    for step, values in run['steps'].items():
+        print(f"  {step:<17} n={values['count']:<6} p50 {values['latency_ms']['p50']:7.2f}ms  "
+              f"p95 {values['latency_ms']['p95']:7.2f}ms  sql {values['sql']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=20_000, help='пользователей в базе')
+    parser.add_argument('--hackathons', type=int, default=200, help='хакатонов в базе')
+    parser.add_argument('--participations', type=int, default=3, help='участий на пользователя в базе')
+    parser.add_argument('--journeys', type=int, default=500, help='пользователей, проходящих сценарий')
+    parser.add_argument('--concurrency', type=int, default=64, help='одновременных сценариев и CONCURRENT_UPDATES')
+    parser.add_argument('--browse', type=int, default=5, help='до скольких хакатонов пролистать')
+    parser.add_argument('--participants', type=int, default=10, help='до скольких участников пролистать')
+    parser.add_argument('--warmup', type=int, default=20, help='сценариев до начала измерений')
+    parser.add_argument('--workers', type=int, nargs='+', help='запускать bot.py с таким числом обработчиков')
+    parser.add_argument('--api-delay', type=float, default=0.0, help='задержка одного вызова Bot API, с')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='записать результаты в JSON')
+    parser.add_argument('--baseline', help='JSON прошлого прогона для сравнения')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='допустимое ухудшение, доля')
+    args = parser.parse_args()
+    if args.journeys + args.warmup + 1 > args.users:
+        parser.error('--users должно быть больше --journeys + --warmup')
+
+    # Измеряется обработка обновлений, а не ограничение исходящих запросов
+    os.environ['RATE_LIMIT_GLOBAL'] = '0'
+    os.environ.setdefault('REMINDER_INTERVAL', '3600')
+    # Сценарии записываются в базу (участия), поэтому каждый прогон - на своей базе;
+    # путь базы прогона в этом процессе config читает при импорте
+    directory = tempfile.mkdtemp()
+    os.environ['BOT_DATABASE'] = os.path.join(directory, 'bench.db')
+    from seed import seed
+
+    runs = []
+    for workers in args.workers or [None]:
+        path = os.path.join(directory, f'bench-{workers}.db') if workers else os.environ['BOT_DATABASE']
+        seed(path, args.users, args.hackathons, participations_per_user=args.participations, seed_value=args.seed)
+        # Сначала разогрев, затем измеряемые сценарии и один сценарий для SQL по шагам
+        user_ids = random.Random(args.seed).sample(range(1, args.users + 1), args.warmup + args.journeys + 1)
+        if workers:
+            run = asyncio.run(run_processes(args, path, user_ids, workers))
+        else:
+            run = asyncio.run(run_in_process(args, path, user_ids))
+        run['workers'] = workers
+        print_run(run, args.journeys)
+        runs.append(run)
+    if len(runs) > 1:
+        print("throughput relative to the first run: "
+              + ", ".join(f"{run['workers']} -> {run['throughput'] / runs[0]['throughput']:.2f}x" for run in runs))
+
+    results = {
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'baseline', 'tolerance')},
+        'environment': {'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version,
+                        'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'runs': runs,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = {run['workers']: run for run in json.load(f)['runs']}
+        found = [f"workers={run['workers']} {line}" for run in runs if run['workers'] in baseline
+                 for line in regressions(run, baseline[run['workers']], args.tolerance)]
+        for line in found:
+            print(f"REGRESSION {line}")
+        print(f"compared with {args.baseline}: {'FAIL' if found else 'OK'}")
+        sys.exit(1 if found else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Проверка планов и времени горячих запросов на большой базе.
+
+Завершается с ненулевым кодом, если какой-либо горячий запрос из db.HOT_QUERIES
+читает таблицу полным обходом без индекса.
+
+Запуск: python bench/bench_queries.py --users 100000 --hackathons 1000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import HOT_QUERIES, audit_query_plans, connect  # noqa: E402
+from search import match_query  # noqa: E402
+from seed import SKILLS, seed  # noqa: E402
+
+# Запросы до миграции 2: NOT IN с LEFT JOIN ... GROUP BY
+LEGACY_QUERIES = {
+    'view_hackathons': """
+        SELECT h.id, h.name, h.prizes, h.registration, h.duration, h.link, h.telegram_chat, h.comments, COUNT(p.user_id)
+        FROM hackathons h
+        LEFT JOIN participations p ON h.id = p.hackathon_id
+        WHERE h.id NOT IN (SELECT hackathon_id FROM participations WHERE user_id = ?)
+        GROUP BY h.id
+    """,
+    'view_my_hackathons': """
+        SELECT h.id, h.name, h.prizes, h.registration, h.duration, h.link, h.telegram_chat, h.comments, COUNT(p.user_id)
+        FROM hackathons h
+        JOIN participations p ON h.id = p.hackathon_id
+        WHERE p.user_id = ?
+        GROUP BY h.id
+    """,
+    'look_for_members': """
+        SELECT u.username, u.profile
+        FROM users u
+        JOIN participations p ON u.user_id = p.user_id
+        WHERE p.hackathon_id = ?
+    """,
+}
+
+
+def measure(conn, sql, params_fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        params = params_fn()
+        started = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--hackathons', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    seed(path, args.users, args.hackathons)
+    conn = connect(path)
+    conn.execute('ANALYZE')
+
+    problems = audit_query_plans(conn)
+    for name, tables in problems.items():
+        print(f"FULL SCAN  {name}: {', '.join(tables)}")
+
+    rnd = random.Random(2)
+    user = lambda: (rnd.randrange(1, args.users + 1),)  # noqa: E731
+    hackathon = lambda: (rnd.randrange(1, args.hackathons + 1),)  # noqa: E731
+    page = lambda: {'user_id': user()[0], 'cursor': hackathon()[0], 'now': int(time.time())}  # noqa: E731
+    search = lambda: {'query': match_query(rnd.choice(SKILLS)), 'hackathon_id': hackathon()[0],  # noqa: E731
+                      'limit': 50}
+    profiles = lambda: (json.dumps([user()[0] for _ in range(5)]),)  # noqa: E731
+    params = {'view_profile': user, 'next_hackathon': page, 'prev_hackathon': page, 'next_my_hackathon': page,
+              'prev_my_hackathon': page, 'look_for_members': hackathon, 'show_participant': lambda: hackathon() + (5, 0),
+              'catalogue_generation': tuple, 'catalogue_row': hackathon, 'catalogue_names': tuple,
+              'search_participants': search, 'search_hackathon_participants': search, 'search_profiles': profiles,
+              'recommend_members': hackathon, 'session_load': user, 'session_expire': lambda: (0,),
+              'reminders_due': lambda: {'now': int(time.time()), 'registration_lead': 86400, 'start_lead': 86400,
+                                        'limit': 1000},
+              'broadcast_recipients': lambda: (user()[0], 500)}
+    # Текущий запрос -> прежний запрос того же обработчика и его параметры
+    legacy = {'next_hackathon': ('view_hackathons', user), 'next_my_hackathon': ('view_my_hackathons', user),
+              'look_for_members': ('look_for_members', hackathon)}
+
+    for name, (sql, _, _) in HOT_QUERIES.items():
+        line = f"{name:<30} new={measure(conn, sql, params[name], args.repeat):9.2f}ms"
+        if name in legacy:
+            legacy_name, legacy_params = legacy[name]
+            line += f"  old={measure(conn, LEGACY_QUERIES[legacy_name], legacy_params, args.repeat):9.2f}ms"
+        print(line)
+    conn.close()
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
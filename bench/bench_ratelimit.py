@@ -0,0 +1,137 @@
+"""Ограничитель исходящих запросов против подмены Bot API с лимитами Telegram.
+
+Подмена отвечает 429 с retry_after, если бот превышает 30 сообщений в секунду
+на бота или больше 4 сообщений в чат за секунду. Сотни пользователей одновременно
+присылают /start (два сообщения подряд), затем бот получает пачку правок одного
+сообщения. Сравниваются прогоны без ограничителя и с TokenBucketRateLimiter.
+Затем проверяется цепочка схлопнутых правок: правка A ждёт очереди, B заменяет
+A, очередь A подходит, и A ждёт B, после чего C заменяет B; все три вызова
+должны завершиться результатом C.
+
+Запуск: python bench/bench_ratelimit.py --users 300
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from collections import Counter, deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('BOT_DATABASE', os.path.join(tempfile.mkdtemp(), 'bench.db'))
+
+from telegram import Update  # noqa: E402
+
+import bot  # noqa: E402
+import config  # noqa: E402
+from db import setup_database  # noqa: E402
+from fake_telegram import FakeTelegram, message_update  # noqa: E402
+from ratelimit import TokenBucketRateLimiter  # noqa: E402
+
+
+class TelegramLimits:
+    """Скользящие окна в одну секунду: на бота и на чат"""
+
+    def __init__(self, global_rate=30, chat_burst=4):
+        self.global_rate = global_rate
+        self.chat_burst = chat_burst
+        self.sent = deque()
+        self.per_chat = {}
+        self.statuses = Counter()
+
+    def __call__(self, method, params):
+        chat_id = params.get('chat_id')
+        if chat_id is not None:
+            now = time.monotonic()
+            chat = self.per_chat.setdefault(chat_id, deque())
+            for window in (self.sent, chat):
+                while window and now - window[0] >= 1:
+                    window.popleft()
+            if len(self.sent) >= self.global_rate or len(chat) >= self.chat_burst:
+                self.statuses[429] += 1
+                return 429, {'description': 'Too Many Requests: retry after 1', 'parameters': {'retry_after': 1}}
+            self.sent.append(now)
+            chat.append(now)
+        self.statuses[200] += 1
+        return 200, self.fake.answer(method, params)
+
+
+async def run(limited, users, edits):
+    config.RATE_LIMIT_GLOBAL = 30 if limited else 0
+    limits = TelegramLimits()
+    fake = FakeTelegram(handler=limits)
+    limits.fake = fake
+    application = bot.build_application(fake.token, request=fake.request(0.005))
+    await application.initialize()
+    await application.post_init(application)
+    await application.start()
+
+    started = time.perf_counter()
+    for i in range(1, users + 1):
+        await application.update_queue.put(Update.de_json(message_update(i, i, '/start'), application.bot))
+    while application.update_queue.qsize() or limits.statuses[200] + limits.statuses[429] < users * 2:
+        await asyncio.sleep(0.05)
+
+    # Пачка правок одного сообщения, как при быстрых нажатиях кнопок
+    results = await asyncio.gather(
+        *(application.bot.edit_message_text(f'версия {n}', chat_id=1, message_id=1) for n in range(edits)),
+        return_exceptions=True)
+    await application.stop()
+    elapsed = time.perf_counter() - started
+
+    failed = sum(isinstance(result, Exception) for result in results)
+    line = (f"{'limited' if limited else 'unlimited':<10} {elapsed:6.1f}s  200={limits.statuses[200]:<5} "
+            f"429={limits.statuses[429]:<5} failed edits={failed}")
+    if limited:
+        stats = application.bot.rate_limiter.stats()
+        line += (f"  retries={stats['retries']} merged={stats['merged_edits']} max depth={stats['max_queue_depth']} "
+                 f"wait p50={stats['wait_p50']:.2f}s p99={stats['wait_p99']:.2f}s")
+    print(line)
+    await application.post_shutdown(application)
+    await application.shutdown()
+
+
+async def edit_chain():
+    """Правки A, B, C одного сообщения вперемешку с очередью; вернуть результаты вызовов и отправленное"""
+    # Чат - 10 сообщений в секунду без всплеска: каждая правка ждёт 0,1 с после предыдущей
+    limiter = TokenBucketRateLimiter(global_rate=1000, chat_rate=10, chat_burst=1)
+    sent = []
+
+    async def send(text):
+        sent.append(text)
+        return text
+
+    def request(endpoint, text):
+        data = {'chat_id': 1, 'message_id': 1, 'text': text}
+        return asyncio.ensure_future(limiter.process_request(send, (text,), {}, endpoint, data, None))
+
+    await request('sendMessage', 'сообщение')
+    edits = [request('editMessageText', 'A'), request('editMessageText', 'B')]
+    # Очередь A подошла (0,1 с), она ждёт B; C приходит раньше очереди B (0,2 с)
+    await asyncio.sleep(0.15)
+    edits.append(request('editMessageText', 'C'))
+    done, pending = await asyncio.wait(edits, timeout=2)
+    for task in pending:
+        task.cancel()
+    return [task.result() if task in done else None for task in edits], sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=300)
+    parser.add_argument('--edits', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_database()
+    for limited in (False, True):
+        asyncio.run(run(limited, args.users, args.edits))
+
+    results, sent = asyncio.run(edit_chain())
+    ok = results == ['C', 'C', 'C']
+    print(f"edit chain A<-B<-C: results {results}, sent {sent[1:]} -> {'OK' if ok else 'FAIL'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
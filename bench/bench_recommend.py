@@ -0,0 +1,96 @@
+"""Подбор команды: построение индекса навыков, обновление профиля и запросы top-k.
+
+На синтетической базе строится recommend.SkillIndex по всем профилям, затем
+измеряется медианное время recommend для пользователя среди участников
+хакатона и среди --large случайных пользователей и всех профилей.
+Инкрементальные обновления сверяются с индексом, построенным заново.
+
+Запуск: python bench/bench_recommend.py --users 100000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import HACKATHON_MEMBERS_SQL, connect  # noqa: E402
+from recommend import SkillIndex  # noqa: E402
+from seed import profile_text, seed  # noqa: E402
+
+
+def measure(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--hackathons', type=int, default=1000)
+    parser.add_argument('--large', type=int, default=10_000, help='размер большого списка кандидатов')
+    parser.add_argument('--updates', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    seed(path, args.users, args.hackathons)
+    conn = connect(path)
+
+    started = time.perf_counter()
+    index = SkillIndex.load(conn)
+    elapsed = time.perf_counter() - started
+    memory = sum(array.nbytes for array in (index.indices, index.tf, index.rows, index.df,
+                                            index.user_ids, index.starts, index.ends))
+    print(f"built index: {len(index)} profiles, {len(index.terms)} terms, {index.size} entries "
+          f"in {elapsed:.2f}s, arrays {memory / 2 ** 20:.1f}MB")
+
+    rnd = random.Random(4)
+    hackathon, = conn.execute("SELECT id FROM hackathons ORDER BY participant_count DESC LIMIT 1").fetchone()
+    members = [user_id for user_id, in conn.execute(HACKATHON_MEMBERS_SQL, (hackathon,))]
+    large = rnd.sample(range(1, args.users + 1), args.large)
+    user = lambda: rnd.randrange(1, args.users + 1)  # noqa: E731
+
+    print(f"recommend top-5 among {len(members)} hackathon members: "
+          f"{measure(lambda: index.recommend(user(), members), args.repeat):.2f}ms")
+    print(f"recommend top-5 among {len(large)} users: "
+          f"{measure(lambda: index.recommend(user(), large), args.repeat):.2f}ms")
+    print(f"recommend top-5 among all {len(index)} profiles: "
+          f"{measure(lambda: index.recommend(user()), args.repeat):.2f}ms")
+    members_sql = measure(lambda: conn.execute(HACKATHON_MEMBERS_SQL, (hackathon,)).fetchall(), args.repeat)
+    print(f"members query: {members_sql:.2f}ms")
+
+    changes = [(user(), profile_text(rnd)) for _ in range(args.updates)]
+    started = time.perf_counter()
+    for user_id, profile in changes:
+        index.update(user_id, profile)
+    elapsed = time.perf_counter() - started
+    print(f"incremental update: {elapsed * 1e6 / len(changes):.0f}us per profile, "
+          f"garbage {index.garbage} of {index.size} entries")
+
+    with conn:
+        conn.executemany("UPDATE users SET profile = ? WHERE user_id = ?",
+                         [(profile, user_id) for user_id, profile in changes])
+    rebuilt = SkillIndex.load(conn)
+    conn.close()
+    mismatches = 0
+    for _ in range(100):
+        user_id = user()
+        expected = rebuilt.recommend(user_id, members)
+        actual = index.recommend(user_id, members)
+        if [candidate for candidate, _ in expected] != [candidate for candidate, _ in actual] or any(
+                abs(a - b) > 1e-4 for (_, a), (_, b) in zip(expected, actual)):
+            mismatches += 1
+    print(f"incremental index matches rebuild: {'yes' if not mismatches else f'NO, {mismatches} of 100 differ'}")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""Напоминания о дедлайнах на симулированных часах.
+
+На синтетической базе (--participations участий) reminders.ReminderScheduler
+тикает каждые --interval секунд симулированного времени в течение --days дней.
+Отправка подменена: она мгновенная, часть вызовов падает с временной ошибкой
+(напоминание должно уйти в следующий тик), часть - с Forbidden (пользователь
+заблокировал бота, повторять нельзя). На середине планировщик "перезапускается":
+новый экземпляр видит только таблицу reminders_sent.
+
+Проверяется, что каждое наступившее напоминание доставлено ровно один раз
+и не раньше, чем за lead до события; печатается время запроса на тик и
+задержка доставки от открытия окна напоминания.
+
+Запуск: python bench/bench_reminders.py --participations 100000 --days 7
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram.error import Forbidden, NetworkError  # noqa: E402
+
+from db import Database, connect  # noqa: E402
+from reminders import REGISTRATION, ReminderScheduler  # noqa: E402
+from seed import seed  # noqa: E402
+
+
+class FakeSender:
+    """Записывает доставленные напоминания; каждый transient_every-й вызов падает с NetworkError,
+    а пользователи с id, кратным blocked_every, заблокировали бота"""
+
+    def __init__(self, clock, transient_every=37, blocked_every=101):
+        self.clock = clock
+        self.transient_every = transient_every
+        self.blocked_every = blocked_every
+        self.calls = 0
+        self.delivered = Counter()
+        self.blocked = Counter()
+        self.delivered_at = {}
+
+    async def __call__(self, user_id, hackathon_id, kind, at):
+        self.calls += 1
+        key = (user_id, hackathon_id, kind, at)
+        if self.calls % self.transient_every == 0:
+            raise NetworkError("simulated network error")
+        if user_id % self.blocked_every == 0:
+            self.blocked[key] += 1
+            raise Forbidden("Forbidden: bot was blocked by the user")
+        self.delivered[key] += 1
+        self.delivered_at[key] = self.clock()
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+async def simulate(args, path):
+    db = Database(path)
+    now = [int(time.time()) // args.interval * args.interval]
+    clock = lambda: now[0]  # noqa: E731
+    sender = FakeSender(clock)
+    lead = {0: args.lead_hours * 3600, 1: args.lead_hours * 3600}
+
+    def scheduler():
+        return ReminderScheduler(db, sender, registration_lead=lead[0], start_lead=lead[1],
+                                 batch_size=args.batch_size, clock=clock)
+
+    reminders = scheduler()
+    started_at = now[0]
+    ticks = args.days * 86400 // args.interval
+    query_times, tick_sizes = [], []
+    wall = time.perf_counter()
+    for tick in range(ticks):
+        if tick == ticks // 2:
+            reminders = scheduler()  # Перезапуск: в памяти ничего не осталось
+        before = time.perf_counter()
+        selected = await reminders.tick()
+        elapsed = time.perf_counter() - before
+        if selected:
+            tick_sizes.append(selected)
+        else:
+            query_times.append(elapsed)
+        now[0] += args.interval
+    wall = time.perf_counter() - wall
+    finished_at = now[0] - args.interval
+    db.close()
+    return sender, started_at, finished_at, lead, ticks, query_times, tick_sizes, wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--participations', type=int, default=100_000)
+    parser.add_argument('--hackathons', type=int, default=100)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--interval', type=int, default=60)
+    parser.add_argument('--lead-hours', type=int, default=24)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    seed(path, args.participations // 3 + 1, args.hackathons, participations_per_user=3)
+    conn = connect(path)
+    conn.execute('ANALYZE')
+    participations, = conn.execute("SELECT COUNT(*) FROM participations").fetchone()
+
+    sender, started_at, finished_at, lead, ticks, query_times, tick_sizes, wall = asyncio.run(simulate(args, path))
+
+    # Напоминание должно уйти, если хотя бы один тик попал в его окно [событие - lead, событие)
+    expected = set()
+    for kind, column in ((0, 'registration_deadline'), (1, 'starts_at')):
+        for user_id, hackathon_id, at in conn.execute(
+                f"SELECT p.user_id, h.id, h.{column} FROM participations p JOIN hackathons h ON h.id = p.hackathon_id "
+                f"WHERE h.{column} > ? AND h.{column} - ? <= ?", (started_at, lead[kind], finished_at)):
+            expected.add((user_id, hackathon_id, kind, at))
+    recorded, = conn.execute("SELECT COUNT(*) FROM reminders_sent").fetchone()
+    conn.close()
+
+    outcomes = sender.delivered + sender.blocked
+    duplicates = sum(1 for count in outcomes.values() if count > 1)
+    missing = len(expected - set(outcomes))
+    unexpected = len(set(outcomes) - expected)
+    early = sum(1 for (_, _, kind, at), moment in sender.delivered_at.items() if moment < at - lead[kind])
+    lags = [moment - max(at - lead[kind], started_at) for (_, _, kind, at), moment in sender.delivered_at.items()]
+    registration = sum(1 for key in sender.delivered if key[2] == REGISTRATION)
+
+    print(f"{participations} participations, {args.hackathons} hackathons, {ticks} ticks of {args.interval}s "
+          f"simulated in {wall:.1f}s")
+    print(f"delivered {len(sender.delivered)} ({registration} registration, {len(sender.delivered) - registration} "
+          f"start), blocked {len(sender.blocked)}, send calls {sender.calls}, recorded {recorded}")
+    print(f"idle tick query: median {statistics.median(query_times) * 1000:.2f}ms, "
+          f"p99 {percentile(query_times, 0.99) * 1000:.2f}ms")
+    if tick_sizes:
+        print(f"ticks with reminders: {len(tick_sizes)}, max {max(tick_sizes)} per tick")
+    if lags:
+        print(f"delay after the reminder window opens: median {statistics.median(lags):.0f}s, max {max(lags):.0f}s")
+    ok = not (duplicates or missing or unexpected or early)
+    print(f"expected {len(expected)}: duplicates {duplicates}, missing {missing}, unexpected {unexpected}, "
+          f"early {early} -> {'OK' if ok else 'FAIL'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
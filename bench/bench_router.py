@@ -0,0 +1,81 @@
+"""Стоимость диспетчеризации callback_data по мере роста числа кнопок.
+
+Сравнивается цепочка if/elif с == и startswith (как было в button_click)
+и CallbackRouter с поиском в словаре. Обработчики пустые, измеряется только
+разбор и выбор маршрута для случайных нажатий.
+
+Запуск: python bench/bench_router.py --routes 10 50 200 1000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from router import CallbackRouter, callback_data  # noqa: E402
+
+
+def noop(*args):
+    return args
+
+
+def build_chain(count):
+    """Последовательность проверок в духе прежнего button_click: половина с аргументом"""
+    checks = []
+    for i in range(count):
+        if i % 2:
+            prefix = f'route{i}_'
+            checks.append((lambda data, prefix=prefix: data.startswith(prefix),
+                           lambda data: noop(int(data.split('_')[1]))))
+        else:
+            name = f'route{i}'
+            checks.append((lambda data, name=name: data == name, lambda data: noop()))
+
+    def dispatch(data):
+        for matches, handler in checks:
+            if matches(data):
+                return handler(data)
+    return dispatch
+
+
+def build_router(count):
+    router = CallbackRouter()
+    for i in range(count):
+        if i % 2:
+            router.add(f'route{i}', noop, int)
+        else:
+            router.add(f'route{i}', noop)
+
+    def dispatch(data):
+        _, handler, args = router.resolve(data)
+        return handler(*args)
+    return dispatch
+
+
+def measure(dispatch, payloads):
+    started = time.perf_counter()
+    for data in payloads:
+        dispatch(data)
+    return (time.perf_counter() - started) / len(payloads) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--routes', type=int, nargs='+', default=[10, 50, 200, 1000])
+    parser.add_argument('--clicks', type=int, default=200_000)
+    args = parser.parse_args()
+
+    rnd = random.Random(3)
+    for count in args.routes:
+        indexes = [rnd.randrange(count) for _ in range(args.clicks)]
+        chain_payloads = [f'route{i}_{i * 7}' if i % 2 else f'route{i}' for i in indexes]
+        router_payloads = [callback_data(f'route{i}', i * 7) if i % 2 else f'route{i}' for i in indexes]
+        chain = measure(build_chain(count), chain_payloads)
+        routed = measure(build_router(count), router_payloads)
+        print(f"routes={count:<5} if/elif={chain:10.0f}ns  router={routed:6.0f}ns")
+
+
+if __name__ == '__main__':
+    main()
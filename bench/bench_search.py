@@ -0,0 +1,108 @@
+"""Поиск участников по навыкам: FTS5 (users_fts) против LIKE по users.profile.
+
+Для каждого запроса на синтетической базе измеряется:
+  fts     - id 50 самых подходящих по bm25 (один раз на поиск, PARTICIPANT_SEARCH_SQL);
+  page    - страница профилей по этим id (каждое листание, SEARCH_PROFILES_SQL);
+  like    - первые 6 совпадений LIKE '%слово%' без ранжирования: лучший случай LIKE,
+            он останавливается на первых совпадениях;
+  like_all - все совпадения LIKE: столько читает LIKE, чтобы ранжировать или посчитать.
+Отдельно - поиск среди участников самого большого хакатона и сохранение профиля
+с триггерами индекса, после которого проверяется, что индекс не устарел.
+
+Запуск: python bench/bench_search.py --users 100000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json  # noqa: E402
+
+from db import PARTICIPANT_SEARCH_SQL, SAVE_PROFILE_SQL, SEARCH_PROFILES_SQL, connect  # noqa: E402
+from search import match_query, terms  # noqa: E402
+from seed import profile_text, seed  # noqa: E402
+
+QUERIES = ['Python', 'Python ML', 'rust kotlin', 'Data Science', 'разраб', 'команде go', 'haskell']
+RESULTS = 50
+PAGE = 5
+
+
+def like_sql(words, hackathon, limit):
+    conditions = ' AND '.join('u.profile LIKE ?' for _ in words)
+    if hackathon:
+        conditions += ' AND EXISTS (SELECT 1 FROM participations p WHERE p.user_id = u.user_id AND p.hackathon_id = ?)'
+    return f"SELECT u.user_id, u.username, u.profile FROM users u WHERE {conditions} LIMIT {limit}"
+
+
+def measure(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--hackathons', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    started = time.perf_counter()
+    seed(path, args.users, args.hackathons)
+    print(f"seeded {args.users} profiles with FTS triggers in {time.perf_counter() - started:.1f}s")
+    conn = connect(path)
+    conn.execute('ANALYZE')
+    hackathon, = conn.execute("SELECT id FROM hackathons ORDER BY participant_count DESC LIMIT 1").fetchone()
+
+    for scope in (None, hackathon):
+        print(f"\n{'all profiles' if scope is None else f'participants of hackathon {scope}'}:")
+        for text in QUERIES:
+            fts_params = {'query': match_query(text), 'hackathon_id': scope, 'limit': RESULTS}
+            fts = lambda: conn.execute(PARTICIPANT_SEARCH_SQL[scope is not None], fts_params).fetchall()  # noqa: E731
+            page_ids = json.dumps([user_id for user_id, in fts()][:PAGE])
+            page = lambda: conn.execute(SEARCH_PROFILES_SQL, (page_ids,)).fetchall()  # noqa: E731
+            words = terms(text)
+            like_params = [f'%{word}%' for word in words] + ([scope] if scope else [])
+            like = lambda: conn.execute(like_sql(words, scope, PAGE), like_params).fetchall()  # noqa: E731
+            like_all = lambda: conn.execute(like_sql(words, scope, -1), like_params).fetchall()  # noqa: E731
+            found = conn.execute("SELECT COUNT(*) FROM users_fts WHERE users_fts MATCH ?",
+                                 (fts_params['query'],)).fetchone()[0]
+            print(f"  {text!r:<14} matches={found:<6} fts={measure(fts, args.repeat):7.2f}ms "
+                  f"page={measure(page, args.repeat):5.2f}ms  like={measure(like, args.repeat):6.2f}ms "
+                  f"like_all={measure(like_all, args.repeat):6.2f}ms")
+
+    rnd = random.Random(3)
+    profiles = {rnd.randrange(1, args.users + 1): profile_text(rnd) for _ in range(1000)}
+    before = dict(conn.execute(f"SELECT user_id, profile FROM users WHERE user_id IN ({','.join('?' * len(profiles))})",
+                               list(profiles)).fetchall())
+    started = time.perf_counter()
+    with conn:
+        for user_id, profile in profiles.items():
+            conn.execute(SAVE_PROFILE_SQL, (user_id, f'user{user_id}', profile))
+    elapsed = time.perf_counter() - started
+    print(f"\nsave_profile with index triggers: {elapsed * 1000 / len(profiles):.3f}ms per profile")
+
+    # Первая строка профиля ("Участник <число>") почти уникальна: новая должна находиться, старая - нет
+    def indexed(user_id, text):
+        return conn.execute("SELECT 1 FROM users_fts WHERE users_fts MATCH ? AND rowid = ?",
+                            (match_query(text.splitlines()[0]), user_id)).fetchone() is not None
+
+    stale = sum(1 for user_id, profile in profiles.items()
+                if not indexed(user_id, profile)
+                or (before[user_id].splitlines()[0] != profile.splitlines()[0] and indexed(user_id, before[user_id])))
+    conn.close()
+    print(f"index in sync after updates: {'yes' if not stale else f'NO, {stale} profiles stale'}")
+    sys.exit(1 if stale else 0)
+
+
+if __name__ == '__main__':
+    main()
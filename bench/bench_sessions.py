@@ -0,0 +1,110 @@
+"""Память и запись состояния диалогов при росте числа пользователей.
+
+Бот из bot.build_application с подменённым Bot API получает волны нажатий
+"Создать профиль" от новых пользователей. После каждой волны печатается,
+сколько user_data держит приложение, RSS процесса и сколько состояний
+записано в таблицу sessions (RSS включает журнал вызовов подмены Bot API,
+который растёт с числом обновлений). Без выгрузки число user_data росло бы с каждой
+волной; с выгрузкой оно ограничено пользователями за последние --idle-ttl секунд.
+В конце бот перезапускается, и пользователь из первой волны отправляет текст
+профиля: состояние "ожидается профиль" должно пережить перезапуск.
+
+Запуск: python bench/bench_sessions.py --waves 10 --wave-size 2000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('BOT_DATABASE', os.path.join(tempfile.mkdtemp(), 'bench.db'))
+# Измеряется состояние диалогов, а не ограничение исходящих запросов
+os.environ.setdefault('RATE_LIMIT_GLOBAL', '0')
+
+from telegram import Update  # noqa: E402
+
+import bot  # noqa: E402
+import config  # noqa: E402
+from db import connect, setup_database  # noqa: E402
+from fake_telegram import FakeTelegram, callback_update, message_update  # noqa: E402
+
+
+def rss_mb():
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+
+
+async def start_bot(fake):
+    application = bot.build_application(fake.token, request=fake.request())
+    await application.initialize()
+    await application.post_init(application)
+    await application.start()
+    return application
+
+
+async def stop_bot(application):
+    await application.stop()
+    await application.shutdown()
+    await application.post_shutdown(application)
+
+
+async def run(waves, wave_size, pause):
+    fake = FakeTelegram()
+    application = await start_bot(fake)
+    persistence = application.persistence
+    update_id = 0
+    expected = 0
+    for wave in range(waves):
+        started = time.perf_counter()
+        for user_id in range(wave * wave_size + 1, (wave + 1) * wave_size + 1):
+            update_id += 1
+            await application.update_queue.put(
+                Update.de_json(callback_update(update_id, user_id, 'create_profile'), application.bot))
+        # answerCallbackQuery и editMessageText на каждое нажатие
+        expected += 2 * wave_size
+        await asyncio.get_running_loop().run_in_executor(None, fake.wait_calls, expected)
+        elapsed = time.perf_counter() - started
+        await asyncio.sleep(pause)
+        stats = persistence.stats()
+        print(f"wave {wave + 1:<3} users={(wave + 1) * wave_size:<7} {wave_size / elapsed:7.0f} updates/s  "
+              f"user_data={len(application.user_data):<6} resident={stats['resident']:<6} "
+              f"evicted={stats['evictions']:<7} written={stats['writes']:<7} rss={rss_mb():6.1f}MB")
+    await stop_bot(application)
+
+    conn = connect()
+    stored, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(state)), 0) FROM sessions").fetchone()
+    conn.close()
+    print(f"sessions: {stored} rows, {size / max(stored, 1):.0f} bytes of state per user")
+
+    # Перезапуск: пользователь 1 нажал "Создать профиль" в первой волне и теперь присылает текст
+    application = await start_bot(fake)
+    calls = len(fake.calls)
+    await application.update_queue.put(Update.de_json(message_update(update_id + 1, 1, 'Профиль'), application.bot))
+    await asyncio.get_running_loop().run_in_executor(None, fake.wait_calls, calls + 1)
+    # Ответ на сохранение профиля, затем главное меню
+    await asyncio.get_running_loop().run_in_executor(None, fake.wait_calls, calls + 2)
+    await stop_bot(application)
+    restored = 'профиль был успешно сохранен' in fake.calls[calls][2].get('text', '')
+    print(f"state after restart: {'restored' if restored else 'LOST'}")
+    return restored
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--waves', type=int, default=10)
+    parser.add_argument('--wave-size', type=int, default=2000)
+    parser.add_argument('--idle-ttl', type=float, default=1.0, help='выгрузка неактивных, с')
+    parser.add_argument('--flush-interval', type=float, default=0.25, help='период пакетной записи, с')
+    args = parser.parse_args()
+
+    config.SESSION_IDLE_TTL = args.idle_ttl
+    config.SESSION_FLUSH_INTERVAL = args.flush_interval
+    setup_database()
+    ok = asyncio.run(run(args.waves, args.wave_size, pause=args.idle_ttl))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
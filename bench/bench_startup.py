@@ -0,0 +1,130 @@
+"""Время запуска бота: импорт bot.py и время до первого обработанного обновления.
+
+Импорт замеряется в отдельном интерпретаторе с -X importtime: общее время
+import bot и самые дорогие прямые импорты. Проверка схемы - setup_database на
+уже мигрированной базе. Затем --repeat раз запускается bot.py (WORKERS=--workers)
+против FakeTelegram, в очереди которого уже лежит /start, как после перезапуска
+под нагрузкой; от запуска процесса отмечаются первый вызов Bot API (getMe),
+первый getUpdates (polling начался) и ответ на /start. После SIGTERM замеряется,
+за сколько процесс завершается.
+
+Запуск: python bench/bench_startup.py --users 20000 --hackathons 200 --repeat 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+DIRECTORY = tempfile.mkdtemp()
+os.environ.setdefault('BOT_DATABASE', os.path.join(DIRECTORY, 'bench.db'))
+
+from db import setup_database  # noqa: E402
+from fake_telegram import FakeTelegram, message_update  # noqa: E402
+from seed import seed  # noqa: E402
+
+TIMEOUT = 60
+
+
+def import_profile():
+    """(время import bot, [(модуль, время)] прямых импортов bot.py по убыванию), с"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import bot'], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    total, children = None, []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|')
+        if not cumulative.strip().isdigit():
+            continue
+        depth = (len(name) - len(name.lstrip())) // 2
+        seconds = int(cumulative) / 1e6
+        # -X importtime печатает модуль после его зависимостей: прямые импорты bot - уровень 1 перед строкой bot
+        if depth == 0:
+            if name.strip() == 'bot':
+                total = seconds
+                break
+            children = []
+        elif depth == 1:
+            children.append((name.strip(), seconds))
+    return total, sorted(children, key=lambda item: item[1], reverse=True)
+
+
+def schema_check(path, repeat=20):
+    """Медиана времени setup_database на актуальной схеме, с"""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        setup_database(path)
+        times.append(time.perf_counter() - started)
+    return statistics.median(times)
+
+
+def start_once(path, workers, log):
+    """Запустить bot.py и вернуть отметки {событие: секунды от запуска}"""
+    marks = {}
+    replied = threading.Event()
+    started = None
+
+    def handler(method, params):
+        now = time.perf_counter() - started
+        marks.setdefault('first API call', now)
+        if method == 'getUpdates':
+            marks.setdefault('polling', now)
+        elif method == 'sendMessage' and int(params.get('chat_id') or 0) == 1:
+            marks.setdefault('first reply', now)
+            replied.set()
+        return 200, fake.answer(method, params)
+
+    with FakeTelegram(handler=handler) as fake, open(log, 'a') as stderr:
+        fake.push([message_update(1, 1, '/start')])
+        env = dict(os.environ, BOT_DATABASE=path, TELEGRAM_BOT_TOKEN=fake.token, TELEGRAM_API_URL=fake.base_url,
+                   BOT_MODE='polling', WORKERS=str(workers), METRICS_PORT='0')
+        started = time.perf_counter()
+        process = subprocess.Popen([sys.executable, os.path.join(ROOT, 'bot.py')], env=env, stderr=stderr)
+        try:
+            if not replied.wait(TIMEOUT):
+                raise TimeoutError(f"bot.py не ответил на /start за {TIMEOUT} с, см. {log}")
+        finally:
+            stopping = time.perf_counter()
+            process.terminate()
+            process.wait()
+            marks['stop'] = time.perf_counter() - stopping
+    return marks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=20_000, help='пользователей в базе')
+    parser.add_argument('--hackathons', type=int, default=200, help='хакатонов в базе')
+    parser.add_argument('--workers', type=int, default=1, help='WORKERS для bot.py')
+    parser.add_argument('--repeat', type=int, default=5, help='запусков bot.py и замеров импорта')
+    args = parser.parse_args()
+
+    path = os.environ['BOT_DATABASE']
+    seed(path, args.users, args.hackathons)
+    log = os.path.join(DIRECTORY, 'bot.log')
+
+    profiles = [import_profile() for _ in range(args.repeat)]
+    total = statistics.median(profile[0] for profile in profiles)
+    print(f"import bot: median {total * 1000:.0f}ms over {args.repeat} runs")
+    for name, seconds in profiles[-1][1][:8]:
+        print(f"  {name:<20} {seconds * 1000:7.1f}ms")
+    print(f"schema check (setup_database, up to date): {schema_check(path) * 1000:.2f}ms")
+
+    runs = [start_once(path, args.workers, log) for _ in range(args.repeat)]
+    print(f"bot.py WORKERS={args.workers}, {args.users} users, {args.hackathons} hackathons, "
+          f"{args.repeat} starts (median / min, from process start):")
+    for event in ('first API call', 'polling', 'first reply', 'stop'):
+        values = [run[event] for run in runs]
+        title = 'stop after SIGTERM' if event == 'stop' else event
+        print(f"  {title:<20} {statistics.median(values) * 1000:7.0f}ms / {min(values) * 1000:7.0f}ms")
+
+
+if __name__ == '__main__':
+    main()
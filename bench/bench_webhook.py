@@ -0,0 +1,94 @@
+"""Пропускная способность и задержка: long polling против webhook на локальной подмене Bot API.
+
+Реальное приложение из bot.build_application получает N текстовых сообщений от разных
+пользователей и отвечает на каждое; задержка - от отправки обновления до sendMessage.
+Для webhook дополнительно проверяется, что запрос с неверным секретом отклоняется.
+
+Запуск: python bench/bench_webhook.py --updates 2000
+"""
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('BOT_DATABASE', os.path.join(tempfile.mkdtemp(), 'bench.db'))
+# Измеряется обработка обновлений, а не ограничение исходящих запросов
+os.environ.setdefault('RATE_LIMIT_GLOBAL', '0')
+
+import httpx  # noqa: E402
+
+import bot  # noqa: E402
+from db import setup_database  # noqa: E402
+from fake_telegram import FakeTelegram, message_update, post_updates  # noqa: E402
+
+SECRET = 'bench-secret'
+FIRST_USER = 10_000
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def run_mode(mode, count, concurrency):
+    with FakeTelegram() as fake:
+        application = bot.build_application(fake.token, base_url=fake.base_url)
+        await application.initialize()
+        await application.post_init(application)
+        await application.start()
+
+        updates = [message_update(i, FIRST_USER + i, 'привет') for i in range(1, count + 1)]
+        started = time.perf_counter()
+        if mode == 'polling':
+            await application.updater.start_polling(poll_interval=0, timeout=10)
+            started = time.perf_counter()
+            sent = {update['update_id']: started for update in updates}
+            fake.push(updates)
+        else:
+            port = free_port()
+            url = f'http://127.0.0.1:{port}/webhook'
+            await application.updater.start_webhook(listen='127.0.0.1', port=port, url_path='webhook',
+                                                    webhook_url=url, secret_token=SECRET)
+            async with httpx.AsyncClient() as client:
+                rejected = await client.post(url, json=updates[0], headers={'X-Telegram-Bot-Api-Secret-Token': 'x'})
+            assert rejected.status_code == 403, rejected.status_code
+            started = time.perf_counter()
+            sent, statuses = await post_updates(url, updates, SECRET, concurrency)
+            assert set(statuses) == {200}, set(statuses)
+
+        await asyncio.get_running_loop().run_in_executor(None, fake.wait_calls, count)
+        elapsed = time.perf_counter() - started
+        latencies = sorted(at - sent[int(params['chat_id']) - FIRST_USER]
+                           for at, method, params in fake.calls if method == 'sendMessage')
+
+        await application.updater.stop()
+        await application.stop()
+        await application.post_shutdown(application)
+        await application.shutdown()
+
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{mode:<8} updates={count}  {count / elapsed:8.0f} updates/s  "
+          f"p50={statistics.median(latencies) * 1000:8.1f}ms  p99={p99 * 1000:8.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--updates', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=32, help='одновременных POST на webhook')
+    args = parser.parse_args()
+
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+    setup_database()
+    for mode in ('polling', 'webhook'):
+        asyncio.run(run_mode(mode, args.updates, args.concurrency))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+"""Локальная подмена Telegram Bot API для бенчмарков.
+
+Сервер отвечает на вызовы бота (getMe, getUpdates, sendMessage, editMessageText, ...),
+раздает обновления через long polling или отправляет их POST-запросами на webhook
+и записывает время каждого ответа бота, чтобы считать задержку обработки.
+"""
+import asyncio
+import itertools
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+import httpx
+from telegram.request import BaseRequest
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Community', 'username': 'community_bot'}
+
+
+def make_user(user_id):
+    return {'id': user_id, 'is_bot': False, 'first_name': f'User {user_id}', 'username': f'user{user_id}'}
+
+
+def message_update(update_id, user_id, text):
+    """Текстовое сообщение (или команда, если text начинается с /) от пользователя user_id"""
+    message = {'message_id': update_id, 'date': int(time.time()), 'chat': {'id': user_id, 'type': 'private'},
+               'from': make_user(user_id), 'text': text}
+    if text.startswith('/'):
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    return {'update_id': update_id, 'message': message}
+
+
+def callback_update(update_id, user_id, data, message_id=1):
+    """Нажатие inline-кнопки с callback_data под сообщением бота message_id"""
+    message = {'message_id': message_id, 'date': int(time.time()), 'chat': {'id': user_id, 'type': 'private'},
+               'from': BOT_USER, 'text': '...'}
+    return {'update_id': update_id, 'callback_query': {
+        'id': str(update_id), 'from': make_user(user_id), 'chat_instance': str(user_id),
+        'message': message, 'data': data}}
+
+
+class Server(ThreadingHTTPServer):
+    # Несколько процессов бота открывают десятки соединений сразу: очереди в 5 не хватает
+    request_queue_size = 256
+    daemon_threads = True
+
+
+class FakeTelegram:
+    """Bot API на 127.0.0.1 в фоновом потоке.
+
+    calls - список (время, метод, параметры) всех вызовов бота, кроме служебных.
+    """
+
+    SERVICE_METHODS = {'getMe', 'getUpdates', 'setWebhook', 'deleteWebhook', 'getWebhookInfo', 'close', 'logOut'}
+
+    def __init__(self, token='123:TEST', port=0, handler=None):
+        self.token = token
+        self.calls = []
+        self.pending = []
+        self.condition = threading.Condition()
+        self._message_ids = itertools.count(1000)
+        self._handler = handler
+        self._server = Server(('127.0.0.1', port), self._request_handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self._server.server_address[1]}/bot'
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        with self.condition:
+            self.condition.notify_all()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def push(self, updates):
+        """Поставить обновления в очередь для getUpdates"""
+        with self.condition:
+            self.pending.extend(updates)
+            self.condition.notify_all()
+
+    def wait_calls(self, count, timeout=60):
+        """Дождаться count ответов бота"""
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while len(self.calls) < count:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"Бот ответил {len(self.calls)} раз из {count}")
+                self.condition.wait(remaining)
+
+    def answer(self, method, params):
+        """Результат вызова метода Bot API"""
+        if method == 'getMe':
+            return BOT_USER
+        if method == 'getUpdates':
+            return self._get_updates(params)
+        if method in ('sendMessage', 'editMessageText'):
+            chat_id = int(params.get('chat_id') or 0)
+            return {'message_id': next(self._message_ids), 'date': int(time.time()),
+                    'chat': {'id': chat_id, 'type': 'private'}, 'from': BOT_USER, 'text': params.get('text', '')}
+        return True
+
+    def _get_updates(self, params):
+        offset = int(params.get('offset') or 0)
+        timeout = float(params.get('timeout') or 0)
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            self.pending = [update for update in self.pending if update['update_id'] >= offset]
+            while not self.pending and time.monotonic() < deadline:
+                self.condition.wait(deadline - time.monotonic())
+            return self.pending[:int(params.get('limit') or 100)]
+
+    def call(self, method, params):
+        """Обработать вызов метода: вернуть HTTP-код и тело ответа Bot API"""
+        if self._handler is not None:
+            status, result = self._handler(method, params)
+        else:
+            status, result = 200, self.answer(method, params)
+        if method not in self.SERVICE_METHODS:
+            self._record(method, params)
+        if status == 200:
+            return status, {'ok': True, 'result': result}
+        return status, {'ok': False, 'error_code': status, **result}
+
+    def request(self, delay=0.0):
+        """HTTP-клиент бота, который обращается к этой подмене напрямую, без сети"""
+        return FakeRequest(self, delay)
+
+    def _record(self, method, params):
+        with self.condition:
+            self.calls.append((time.perf_counter(), method, params))
+            self.condition.notify_all()
+
+    def _request_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                # Заголовки и тело пишутся отдельно: без TCP_NODELAY каждый ответ ждет отложенный ACK
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def do_POST(self):
+                method = self.path.rsplit('/', 1)[-1]
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                if 'json' in (self.headers.get('Content-Type') or ''):
+                    params = json.loads(body or b'{}')
+                else:
+                    params = dict(parse_qsl(body.decode()))
+                status, payload = fake.call(method, params)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                try:
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    # Бот закрыл long polling при остановке
+                    pass
+
+            do_GET = do_POST
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+class FakeRequest(BaseRequest):
+    """Подмена HTTP-клиента бота: каждый вызов Bot API занимает delay секунд и уходит в FakeTelegram"""
+
+    def __init__(self, fake, delay=0.0):
+        self.fake = fake
+        self.delay = delay
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        params = request_data.json_parameters if request_data else {}
+        status, payload = self.fake.call(url.rsplit('/', 1)[-1], params)
+        return status, json.dumps(payload).encode()
+
+
+async def post_updates(url, updates, secret_token, concurrency=32):
+    """Отправить обновления на webhook, вернуть {update_id: время отправки} и коды ответов"""
+    sent, statuses = {}, []
+    semaphore = asyncio.Semaphore(concurrency)
+    headers = {'X-Telegram-Bot-Api-Secret-Token': secret_token} if secret_token else {}
+    async with httpx.AsyncClient(timeout=30) as client:
+        async def post(update):
+            async with semaphore:
+                sent[update['update_id']] = time.perf_counter()
+                response = await client.post(url, json=update, headers=headers)
+                statuses.append(response.status_code)
+        await asyncio.gather(*(post(update) for update in updates))
+    return sent, statuses
@@ -0,0 +1,48 @@
+"""Наполнение тестовой базы синтетическими пользователями, хакатонами и участиями"""
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import connect, setup_database  # noqa: E402
+from schedule import MSK, parse_schedule  # noqa: E402
+
+SKILLS = ['Python', 'ML', 'JavaScript', 'React', 'Go', 'Rust', 'UI/UX', 'DevOps', 'NLP', 'CV',
+          'Backend', 'Frontend', 'Data Science', 'Product', 'Blockchain', 'Kotlin', 'iOS', 'SQL']
+
+
+def profile_text(rnd):
+    skills = ', '.join(rnd.sample(SKILLS, 4))
+    return (f"Участник {rnd.randrange(10 ** 6)}\n"
+            f"Навыки: {skills}\n"
+            f"Опыт: {rnd.randrange(1, 10)} года разработки\n"
+            "Доп. инфо: люблю работать в команде")
+
+
+def hackathon_row(i, today):
+    """Хакатон i: дедлайн от 60 дней назад до 120 дней вперёд, так что часть регистраций закрыта"""
+    deadline = today + timedelta(days=(i * 37) % 180 - 60)
+    start, end = deadline + timedelta(days=3), deadline + timedelta(days=5)
+    registration = f"{deadline:%d.%m.%Y} 23:59 мск"
+    duration = f"{start:%d.%m} - {end:%d.%m.%Y}"
+    return (f'Хакатон {i}', registration, duration) + parse_schedule(registration, duration)
+
+
+def seed(path, users, hackathons, participations_per_user=3, seed_value=1):
+    setup_database(path)
+    rnd = random.Random(seed_value)
+    conn = connect(path)
+    with conn:
+        conn.executemany("INSERT INTO users (user_id, username, profile) VALUES (?, ?, ?)",
+                         ((i, f'user{i}', profile_text(rnd)) for i in range(1, users + 1)))
+        today = datetime.now(MSK)
+        conn.executemany("INSERT INTO hackathons (name, prizes, registration, duration, link, telegram_chat, comments, "
+                         "starts_at, ends_at, registration_deadline) "
+                         "VALUES (?, 'Призы', ?, ?, 'https://example.com', '@chat', '', ?, ?, ?)",
+                         (hackathon_row(i, today) for i in range(1, hackathons + 1)))
+        conn.executemany("INSERT OR IGNORE INTO participations (user_id, hackathon_id) VALUES (?, ?)",
+                         ((rnd.randrange(1, users + 1), rnd.randrange(1, hackathons + 1))
+                          for _ in range(users * participations_per_user)))
+    conn.close()
@@ -1,54 +1,55 @@
+import asyncio
+import importlib
+import json
 import logging
+import secrets
+import time
+from datetime import datetime
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters, ContextTypes
 from telegram.error import BadRequest
-import sqlite3
 import os
+from functools import partial
+
+import config
+from db import (BROADCAST_UNFINISHED_SQL, HACKATHON_PAGE_SQL, NEW_HACKATHONS_SQL, PARTICIPANTS_PAGE_SQL,
+                PARTICIPANT_COUNT_SQL, PARTICIPANT_SEARCH_SQL, SEARCH_PROFILES_SQL, SAVE_PROFILE_SQL,
+                setup_database, open_database, close_database)
+from catalogue import CatalogueCache
+from concurrency import OrderedApplication
+from metrics import METRICS, timed
+from render import RenderCache, edit_message
+from router import CallbackRouter, callback_data
+from schedule import MSK
+from search import match_query
 
 # Настройка логирования
 logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Настройка базы данных
-def setup_database():
-    """Создание и настройка базы данных SQLite"""
-    conn = sqlite3.connect('bot_database.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS users (
-        user_id INTEGER PRIMARY KEY,
-        username TEXT,
-        profile TEXT
-    )
-    ''')
-    
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS hackathons (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT,
-        prizes TEXT,
-        registration TEXT,
-        duration TEXT,
-        link TEXT,
-        telegram_chat TEXT,
-        comments TEXT
-    )
-    ''')
-    
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS participations (
-        user_id INTEGER,
-        hackathon_id INTEGER,
-        FOREIGN KEY (user_id) REFERENCES users (user_id),
-        FOREIGN KEY (hackathon_id) REFERENCES hackathons (id),
-        PRIMARY KEY (user_id, hackathon_id)
-    )
-    ''')
-    
-    conn.commit()
-    conn.close()
+# Курсор "после последнего хакатона" для перехода назад с начала списка
+LAST_CURSOR = 2 ** 63 - 1
+
+# Сколько профилей участников загружать за один запрос
+PARTICIPANTS_PREFETCH = 5
+
+# Поиск по навыкам: сколько самых подходящих профилей ранжировать, результатов на странице,
+# символов профиля в результате и символов запроса
+SEARCH_MAX_RESULTS = 50
+SEARCH_PAGE_SIZE = 5
+SEARCH_PREVIEW_LENGTH = 300
+SEARCH_QUERY_MAX_LENGTH = 100
+
+# Сколько кандидатов в команду предлагать
+RECOMMEND_COUNT = 5
+
+# Сколько новых хакатонов перечислять в объявлении: сообщение Telegram ограничено 4096 символами
+ANNOUNCE_MAX_HACKATHONS = 20
 
+# Маршруты inline-кнопок регистрируются перед main(); время каждого маршрута попадает в метрики
+router = CallbackRouter(timer=METRICS.time_handler)
+
+@timed('start')
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обработчик команды /start"""
     user = update.effective_user
@@ -70,8 +71,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     await update.message.reply_html(welcome_message, reply_markup=reply_markup)
     await show_main_menu(update, context)
 
-async def show_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Показать главное меню"""
+def build_main_menu():
+    """Текст и клавиатура главного меню"""
     keyboard = [
         [InlineKeyboardButton("Мой профиль", callback_data='view_profile')],
         [InlineKeyboardButton("Просмотр хакатонов", callback_data='view_hackathons')],
@@ -87,17 +88,24 @@ async def show_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         "• Мои хакатоны - просмотрите хакатоны, в которых вы участвуете\n"
         "• Поиск участников - найдите участников для вашей команды"  # Новое описание
     )
+    return menu_message, reply_markup
+
+# Главное меню не зависит от пользователя и собирается один раз
+MAIN_MENU = build_main_menu()
+
+async def show_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Показать главное меню"""
+    menu_message, reply_markup = MAIN_MENU
     
-    try:
-        if update.message:
-            await update.message.reply_text(menu_message, reply_markup=reply_markup)
-        else:
-            await update.callback_query.message.edit_text(menu_message, reply_markup=reply_markup)
-    except BadRequest as e:
-        if str(e) == "Message is not modified":
-            pass
-        else:
-            raise
+    if update.message:
+        await update.message.reply_text(menu_message, reply_markup=reply_markup)
+    else:
+        await edit_message(update.callback_query.message, menu_message, reply_markup)
+
+async def outdated_button(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Кнопка из старого сообщения, которую бот больше не обслуживает: показать главное меню"""
+    menu_message, reply_markup = MAIN_MENU
+    await edit_message(update.callback_query.message, f"Эта кнопка устарела.\n\n{menu_message}", reply_markup)
 
 async def button_click(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обработчик нажатий на inline-кнопки"""
@@ -105,51 +113,18 @@ async def button_click(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     await query.answer()
 
     try:
-        if query.data == 'prev_participant':
-            context.user_data['current_participant'] = max(0, context.user_data['current_participant'] - 1)
-            await show_participant(update, context)
-        elif query.data == 'next_participant':
-            context.user_data['current_participant'] += 1
-            await show_participant(update, context)
-        elif query.data == 'view_profile':
-            await view_profile(update, context)
-        elif query.data == 'edit_profile':
-            await edit_profile(update, context)
-        elif query.data == 'create_profile':
-            await create_profile(update, context)
-        elif query.data == 'view_hackathons':
-            await view_hackathons(update, context)
-        elif query.data == 'my_hackathons':
-            await view_my_hackathons(update, context)
-        elif query.data == 'prev_hackathon':
-            context.user_data['current_hackathon'] = (context.user_data['current_hackathon'] - 1) % len(context.user_data['hackathons'])
-            await show_hackathon(update, context)
-        elif query.data == 'next_hackathon':
-            context.user_data['current_hackathon'] = (context.user_data['current_hackathon'] + 1) % len(context.user_data['hackathons'])
-            await show_hackathon(update, context)
-        elif query.data.startswith('participate_'):
-            hackathon_id = int(query.data.split('_')[1])
-            await participate_hackathon(update, context, hackathon_id)
-        elif query.data.startswith('look_for_members_'):
-            hackathon_id = int(query.data.split('_')[3])
-            await look_for_members(update, context, hackathon_id)
-        elif query.data == 'main_menu':
-            await show_main_menu(update, context)
-        elif query.data == 'search_participants':
-            await search_participants(update, context)
+        await router.dispatch(update, context)
     except Exception as e:
         logger.error(f"Ошибка при обработке нажатия кнопки: {e}")
-        await query.message.edit_text("Произошла ошибка. Пожалуйста, попробуйте еще раз.")
-        await show_main_menu(update, context)
+        message = await query.message.edit_text("Произошла ошибка. Пожалуйста, попробуйте еще раз.")
+        # Меню сравнивается с сообщением после правки: query.message ещё показывает прежнее меню
+        await edit_message(message, *MAIN_MENU)
 
 async def view_profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Показать профиль пользователя"""
     user_id = update.effective_user.id
-    conn = sqlite3.connect('bot_database.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT profile FROM users WHERE user_id = ?", (user_id,))
-    profile = cursor.fetchone()
-    conn.close()
+    db = context.bot_data['db']
+    profile = await db.fetchone("SELECT profile FROM users WHERE user_id = ?", (user_id,))
 
     if profile:
         message = f"Ваш текущий профиль:\n\n{profile[0]}\n\nХотите отредактировать свой профиль?"
@@ -183,11 +158,8 @@ async def create_profile(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 async def edit_profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Начало процесса редактирования профиля"""
     user_id = update.effective_user.id
-    conn = sqlite3.connect('bot_database.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT profile FROM users WHERE user_id = ?", (user_id,))
-    profile = cursor.fetchone()
-    conn.close()
+    db = context.bot_data['db']
+    profile = await db.fetchone("SELECT profile FROM users WHERE user_id = ?", (user_id,))
 
     instructions = (
         "Ваш текущий профиль:\n\n"
@@ -209,62 +181,52 @@ async def save_profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     user_id = update.effective_user.id
     profile_text = update.message.text
     
-    conn = sqlite3.connect('bot_database.db')
-    cursor = conn.cursor()
-    cursor.execute("INSERT OR REPLACE INTO users (user_id, username, profile) VALUES (?, ?, ?)",
-                   (user_id, update.effective_user.username, profile_text))
-    conn.commit()
-    conn.close()
+    db = context.bot_data['db']
+    await db.execute(SAVE_PROFILE_SQL, (user_id, update.effective_user.username, profile_text))
+    if 'recommender' in context.bot_data:
+        context.bot_data['recommender'].update(user_id, profile_text)
     
     await update.message.reply_text("Ваш профиль был успешно сохранен! Теперь другие участники смогут узнать о ваших навыках и интересах.")
     context.user_data['expecting_profile'] = False
     await show_main_menu(update, context)
 
-async def view_hackathons(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Получение списка хакатонов из базы данных"""
-    user_id = update.effective_user.id
-    conn = sqlite3.connect('bot_database.db')
-    cursor = conn.cursor()
+async def fetch_hackathon(update: Update, context: ContextTypes.DEFAULT_TYPE, cursor, direction, is_my_hackathons):
+    """Получить соседний с курсором хакатон; на краю списка переход идет по кругу"""
+    db = context.bot_data['db']
+    sql = HACKATHON_PAGE_SQL[is_my_hackathons, direction]
+    params = {'user_id': update.effective_user.id, 'cursor': cursor, 'now': int(time.time())}
+    page = await db.fetchone(sql, params)
+    if page is None:
+        params['cursor'] = 0 if direction == 'next' else LAST_CURSOR
+        page = await db.fetchone(sql, params)
+    if page is None:
+        return None
+
+    hackathon_id, participant_count = page
+    hackathon = await context.bot_data['catalogue'].get(hackathon_id)
+    if hackathon is None:
+        return None
+    return hackathon + (participant_count,)
+
+async def view_hackathons(update: Update, context: ContextTypes.DEFAULT_TYPE, cursor=0, direction='next') -> None:
+    """Показать хакатон с открытой регистрацией рядом с курсором, по порядку дедлайнов"""
+    hackathon = await fetch_hackathon(update, context, cursor, direction, is_my_hackathons=False)
     
-    cursor.execute("""
-        SELECT h.id, h.name, h.prizes, h.registration, h.duration, h.link, h.telegram_chat, h.comments, COUNT(p.user_id) as participant_count
-        FROM hackathons h
-        LEFT JOIN participations p ON h.id = p.hackathon_id
-        WHERE h.id NOT IN (SELECT hackathon_id FROM participations WHERE user_id = ?)
-        GROUP BY h.id
-    """, (user_id,))
-    hackathons = cursor.fetchall()
-    conn.close()
-    
-    if not hackathons:
+    if not hackathon:
         await update.callback_query.message.edit_text(
-            "На данный момент нет доступных хакатонов, в которых вы еще не участвуете. Проверьте позже или посмотрите свои текущие хакатоны.",
+            "На данный момент нет хакатонов с открытой регистрацией, в которых вы еще не участвуете. Проверьте позже или посмотрите свои текущие хакатоны.",
             reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("Мои хакатоны", callback_data='my_hackathons')],
                                                [InlineKeyboardButton("Вернуться в меню", callback_data='main_menu')]])
         )
         return
     
-    context.user_data['current_hackathon'] = 0
-    context.user_data['hackathons'] = hackathons
-    await show_hackathon(update, context)
+    await show_hackathon(update, context, hackathon)
 
-async def view_my_hackathons(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def view_my_hackathons(update: Update, context: ContextTypes.DEFAULT_TYPE, cursor=0, direction='next') -> None:
     """Показать хакатоны, в которых учствует пользователь"""
-    user_id = update.effective_user.id
-    conn = sqlite3.connect('bot_database.db')
-    cursor = conn.cursor()
+    hackathon = await fetch_hackathon(update, context, cursor, direction, is_my_hackathons=True)
     
-    cursor.execute("""
-        SELECT h.id, h.name, h.prizes, h.registration, h.duration, h.link, h.telegram_chat, h.comments, COUNT(p.user_id) as participant_count
-        FROM hackathons h
-        JOIN participations p ON h.id = p.hackathon_id
-        WHERE p.user_id = ?
-        GROUP BY h.id
-    """, (user_id,))
-    hackathons = cursor.fetchall()
-    conn.close()
-    
-    if not hackathons:
+    if not hackathon:
         await update.callback_query.message.edit_text(
             "Вы еще не участвуете ни в одном хакатоне. Хотите просмотреть доступные хакатоны?",
             reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("Просмотр хакатонов", callback_data='view_hackathons')],
@@ -272,16 +234,10 @@ async def view_my_hackathons(update: Update, context: ContextTypes.DEFAULT_TYPE)
         )
         return
     
-    context.user_data['current_hackathon'] = 0
-    context.user_data['hackathons'] = hackathons
-    await show_hackathon(update, context, is_my_hackathons=True)
+    await show_hackathon(update, context, hackathon, is_my_hackathons=True)
 
-async def show_hackathon(update: Update, context: ContextTypes.DEFAULT_TYPE, is_my_hackathons=False):
-    """Показать информацию о конкретном хакатоне"""
-    hackathons = context.user_data['hackathons']
-    current_index = context.user_data['current_hackathon']
-    hackathon = hackathons[current_index]
-    
+def build_hackathon_card(hackathon, is_my_hackathons):
+    """Текст и клавиатура карточки хакатона"""
     hackathon_id, name, prizes, registration, duration, link, telegram_chat, comments, participant_count = hackathon
     
     message = (
@@ -295,60 +251,53 @@ async def show_hackathon(update: Update, context: ContextTypes.DEFAULT_TYPE, is_
         f"Количество участников от сообщества: {participant_count}"
     )
     
+    page = 'my_hackathon' if is_my_hackathons else 'hackathon'
     keyboard = [
-        [InlineKeyboardButton("Предыдущий", callback_data='prev_hackathon'),
-         InlineKeyboardButton("Следующий", callback_data='next_hackathon')],
-        [InlineKeyboardButton("Посмотреть участников", callback_data=f'look_for_members_{hackathon_id}')],
+        [InlineKeyboardButton("Предыдущий", callback_data=callback_data(f'prev_{page}', hackathon_id)),
+         InlineKeyboardButton("Следующий", callback_data=callback_data(f'next_{page}', hackathon_id))],
+        [InlineKeyboardButton("Посмотреть участников", callback_data=callback_data('members', hackathon_id))],
         [InlineKeyboardButton("Вернуться в меню", callback_data='main_menu')]
     ]
     
     if not is_my_hackathons:
-        keyboard.insert(1, [InlineKeyboardButton("Я хочу участвовать", callback_data=f'participate_{hackathon_id}')])
+        keyboard.insert(1, [InlineKeyboardButton("Я хочу участвовать", callback_data=callback_data('participate', hackathon_id))])
     
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    return message, InlineKeyboardMarkup(keyboard)
+
+async def show_hackathon(update: Update, context: ContextTypes.DEFAULT_TYPE, hackathon, is_my_hackathons=False):
+    """Показать информацию о конкретном хакатоне"""
+    # Карточка определяется строкой каталога, счетчиком участников и вариантом
+    version = (context.bot_data['catalogue'].generation, hackathon[-1])
+    message, reply_markup = context.bot_data['render'].get(
+        (hackathon[0], version, is_my_hackathons), build_hackathon_card, hackathon, is_my_hackathons)
     
-    try:
-        if update.callback_query:
-            await update.callback_query.message.edit_text(message, reply_markup=reply_markup)
-        else:
-            await update.message.reply_text(message, reply_markup=reply_markup)
-    except BadRequest as e:
-        if str(e) == "Message is not modified":
-            pass
-        else:
-            raise
+    if update.callback_query:
+        await edit_message(update.callback_query.message, message, reply_markup)
+    else:
+        await update.message.reply_text(message, reply_markup=reply_markup)
 
 async def participate_hackathon(update: Update, context: ContextTypes.DEFAULT_TYPE, hackathon_id: int) -> None:
     """Регистрация пользователя на участие в хакатоне"""
     user_id = update.effective_user.id
     
-    conn = sqlite3.connect('bot_database.db')
-    cursor = conn.cursor()
-    
-    cursor.execute("INSERT INTO participations (user_id, hackathon_id) VALUES (?, ?)", (user_id, hackathon_id))
-    conn.commit()
-    conn.close()
+    db = context.bot_data['db']
+    await db.execute("INSERT INTO participations (user_id, hackathon_id) VALUES (?, ?)", (user_id, hackathon_id))
     
     await update.callback_query.answer("Вы успешно зарегистрировались на участие в этом хакатоне!")
     
     # Обновляем список хакатонов и отображаем следующий доступный
-    await view_hackathons(update, context)
+    await view_hackathons(update, context, hackathon_id)
 
 async def look_for_members(update: Update, context: ContextTypes.DEFAULT_TYPE, hackathon_id: int) -> None:
     """Просмотр участников конкретного хакатона"""
-    conn = sqlite3.connect('bot_database.db')
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT u.username, u.profile 
-        FROM users u 
-        JOIN participations p ON u.user_id = p.user_id 
-        WHERE p.hackathon_id = ?
-    """, (hackathon_id,))
-    participants = cursor.fetchall()
-    conn.close()
-
-    if participants:
-        context.user_data['participants'] = participants
+    db = context.bot_data['db']
+    total, = await db.fetchone(PARTICIPANT_COUNT_SQL, (hackathon_id,))
+
+    if total:
+        context.user_data['participants_hackathon'] = hackathon_id
+        context.user_data['participants_total'] = total
+        context.user_data['participants_offset'] = 0
+        context.user_data['participants'] = []
         context.user_data['current_participant'] = 0
         await show_participant(update, context)
     else:
@@ -360,10 +309,36 @@ async def look_for_members(update: Update, context: ContextTypes.DEFAULT_TYPE, h
         reply_markup = InlineKeyboardMarkup(keyboard)
         await update.callback_query.message.edit_text(message, reply_markup=reply_markup)
 
+async def fetch_participant(context: ContextTypes.DEFAULT_TYPE, index):
+    """Участник по номеру из окна предзагрузки; при промахе загружается окно вокруг номера"""
+    window = context.user_data['participants']
+    offset = context.user_data['participants_offset']
+    if not offset <= index < offset + len(window):
+        # Листая назад, загружаем окно, которое заканчивается на нужном участнике
+        offset = index if index >= offset else max(0, index - PARTICIPANTS_PREFETCH + 1)
+        db = context.bot_data['db']
+        window = await db.fetchall(PARTICIPANTS_PAGE_SQL,
+                                   (context.user_data['participants_hackathon'], PARTICIPANTS_PREFETCH, offset))
+        context.user_data['participants'] = window
+        context.user_data['participants_offset'] = offset
+    if index - offset < len(window):
+        return window[index - offset]
+    return None
+
+async def prev_participant(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Предыдущий участник"""
+    context.user_data['current_participant'] = max(0, context.user_data['current_participant'] - 1)
+    await show_participant(update, context)
+
+async def next_participant(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Следующий участник"""
+    context.user_data['current_participant'] += 1
+    await show_participant(update, context)
+
 async def show_participant(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Показать профиль участника"""
-    participants = context.user_data.get('participants', [])
-    if not participants:
+    total = context.user_data.get('participants_total', 0)
+    if not total:
         await update.callback_query.message.edit_text(
             "Извините, нет доступных участников для этого хакатона.",
             reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("Главное меню", callback_data='main_menu')]])
@@ -371,8 +346,9 @@ async def show_participant(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         return
 
     current_index = context.user_data['current_participant']
+    participant = await fetch_participant(context, current_index) if current_index < total else None
     
-    if current_index >= len(participants):
+    if participant is None:
         message = "Больше нет участников для отображения."
         keyboard = [
             [InlineKeyboardButton("⬅️ Предыдущий", callback_data='prev_participant')],
@@ -380,17 +356,22 @@ async def show_participant(update: Update, context: ContextTypes.DEFAULT_TYPE) -
             [InlineKeyboardButton("Главное меню", callback_data='main_menu')]
         ]
     else:
-        username, profile = participants[current_index]
-        message = f"Участник {current_index + 1} из {len(participants)}:\n\n@{username}:\n{profile}"
+        username, profile = participant
+        message = f"Участник {current_index + 1} из {total}:\n\n@{username}:\n{profile}"
         keyboard = [
             [InlineKeyboardButton("⬅️ Предыдущий", callback_data='prev_participant'),
              InlineKeyboardButton("Следующий ➡️", callback_data='next_participant')],
+            [InlineKeyboardButton("Поиск по навыкам среди участников",
+                                  callback_data=callback_data('search_skills', context.user_data['participants_hackathon']))],
             [InlineKeyboardButton("Вернуться к хакатонам", callback_data='view_hackathons')],
             [InlineKeyboardButton("Главное меню", callback_data='main_menu')]
         ]
+        if 'recommender' in context.bot_data:
+            keyboard.insert(2, [InlineKeyboardButton(
+                "Подобрать команду", callback_data=callback_data('recommend', context.user_data['participants_hackathon']))])
 
     reply_markup = InlineKeyboardMarkup(keyboard)
-    await update.callback_query.message.edit_text(message, reply_markup=reply_markup)
+    await edit_message(update.callback_query.message, message, reply_markup)
 
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Логирование ошибок"""
@@ -404,16 +385,20 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     
     # Для других типов ошибок отправляем сообщение пользователю
     error_message = "Извините, произошла ошибка при обработке вашего запроса. Пожалуйста, попробуйте еще раз или свяжитесь с администратором."
-    if update.effective_message:
+    # Ошибки задач JobQueue (напоминания) приходят без обновления
+    if isinstance(update, Update) and update.effective_message:
         try:
             await update.effective_message.reply_text(error_message)
         except Exception as e:
             logger.error(f"Не удалось отправить сообщение об ошибке: {e}")
 
+@timed('message')
 async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обработчик текстовых сообщений"""
     if context.user_data.get('expecting_profile'):
         await save_profile(update, context)
+    elif context.user_data.get('expecting_search'):
+        await search_by_skills(update, context)
     else:
         await update.message.reply_text(
             "Извините, я не понимаю этой команды. Пожалуйста, используйте кнопки меню для навигации.",
@@ -422,11 +407,7 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 
 async def search_participants(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Поиск участников"""
-    conn = sqlite3.connect('bot_database.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, name FROM hackathons")
-    hackathons = cursor.fetchall()
-    conn.close()
+    hackathons = await context.bot_data['catalogue'].names()
 
     if not hackathons:
         await update.callback_query.message.edit_text(
@@ -435,33 +416,441 @@ async def search_participants(update: Update, context: ContextTypes.DEFAULT_TYPE
         )
         return
 
-    keyboard = [[InlineKeyboardButton(name, callback_data=f'look_for_members_{id}')] for id, name in hackathons]
+    keyboard = [[InlineKeyboardButton("Поиск по навыкам", callback_data='search_skills')]]
+    keyboard += [[InlineKeyboardButton(name, callback_data=callback_data('members', id))] for id, name in hackathons]
     keyboard.append([InlineKeyboardButton("Вернуться в меню", callback_data='main_menu')])
     reply_markup = InlineKeyboardMarkup(keyboard)
 
     await update.callback_query.message.edit_text(
-        "Выберите хакатон, для которого вы хотите найти участников:",
+        "Найдите участников по навыкам или выберите хакатон, для которого вы хотите найти участников:",
         reply_markup=reply_markup
     )
 
+async def ask_search_query(update: Update, context: ContextTypes.DEFAULT_TYPE, hackathon_id=None) -> None:
+    """Запросить навыки для поиска участников, среди всех или среди участников хакатона"""
+    instructions = (
+        "Введите навыки или ключевые слова, например: Python ML\n\n"
+        "Будут найдены профили, в которых есть все слова. Слово можно писать не полностью: "
+        "\"разраб\" найдет и \"разработчик\", и \"разработка\"."
+    )
+    if hackathon_id is not None:
+        hackathon = await context.bot_data['catalogue'].get(hackathon_id)
+        if hackathon:
+            instructions = f"Поиск среди участников хакатона {hackathon[1]}.\n\n{instructions}"
+    keyboard = [[InlineKeyboardButton("Отмена", callback_data='main_menu')]]
+    await update.callback_query.message.edit_text(instructions, reply_markup=InlineKeyboardMarkup(keyboard))
+    context.user_data['expecting_profile'] = False
+    context.user_data['expecting_search'] = True
+    context.user_data['search_hackathon'] = hackathon_id
+    context.user_data.pop('search_query', None)
+    context.user_data.pop('search_results', None)
+
+async def search_by_skills(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Поиск участников по тексту сообщения"""
+    query = update.message.text[:SEARCH_QUERY_MAX_LENGTH]
+    if match_query(query) is None:
+        await update.message.reply_text("В запросе нет ни одного слова. Введите навыки, например: Python ML")
+        return
+
+    context.user_data['expecting_search'] = False
+    context.user_data['search_query'] = query
+    context.user_data.pop('search_results', None)
+    await show_search_results(update, context)
+
+async def fetch_search_results(context: ContextTypes.DEFAULT_TYPE):
+    """id найденных профилей по убыванию релевантности; считаются один раз на поиск"""
+    results = context.user_data.get('search_results')
+    if results is None:
+        hackathon_id = context.user_data.get('search_hackathon')
+        db = context.bot_data['db']
+        rows = await db.fetchall(PARTICIPANT_SEARCH_SQL[hackathon_id is not None],
+                                 {'query': match_query(context.user_data['search_query']),
+                                  'hackathon_id': hackathon_id, 'limit': SEARCH_MAX_RESULTS})
+        results = [user_id for user_id, in rows]
+        context.user_data['search_results'] = results
+    return results
+
+async def show_search_results(update: Update, context: ContextTypes.DEFAULT_TYPE, offset=0) -> None:
+    """Страница результатов поиска по навыкам, самые подходящие профили первыми"""
+    query = context.user_data.get('search_query')
+    if not query:
+        await ask_search_query(update, context)
+        return
+
+    results = await fetch_search_results(context)
+    page_ids = results[offset:offset + SEARCH_PAGE_SIZE]
+    page = await context.bot_data['db'].fetchall(SEARCH_PROFILES_SQL, (json.dumps(page_ids),)) if page_ids else []
+    hackathon_id = context.user_data.get('search_hackathon')
+
+    scope = ""
+    if hackathon_id is not None:
+        hackathon = await context.bot_data['catalogue'].get(hackathon_id)
+        if hackathon:
+            scope = f" среди участников хакатона {hackathon[1]}"
+    if page:
+        found = f"{SEARCH_MAX_RESULTS} и больше" if len(results) == SEARCH_MAX_RESULTS else len(results)
+        lines = [f"Поиск «{query}»{scope}: найдено {found}, самые подходящие первыми. "
+                 f"Результаты {offset + 1}-{offset + len(page)}:"]
+        for number, (_, username, profile) in enumerate(page, start=offset + 1):
+            if len(profile) > SEARCH_PREVIEW_LENGTH:
+                profile = profile[:SEARCH_PREVIEW_LENGTH] + "…"
+            lines.append(f"{number}. @{username}:\n{profile}")
+        message = "\n\n".join(lines)
+    else:
+        message = f"По запросу «{query}»{scope} никого не нашлось. Попробуйте другие слова."
+
+    navigation = []
+    if offset > 0:
+        navigation.append(InlineKeyboardButton(
+            "⬅️ Предыдущие", callback_data=callback_data('search_page', max(0, offset - SEARCH_PAGE_SIZE))))
+    if offset + SEARCH_PAGE_SIZE < len(results):
+        navigation.append(InlineKeyboardButton(
+            "Следующие ➡️", callback_data=callback_data('search_page', offset + SEARCH_PAGE_SIZE)))
+    keyboard = [navigation] if navigation else []
+    new_search = callback_data('search_skills', hackathon_id) if hackathon_id is not None else 'search_skills'
+    keyboard.append([InlineKeyboardButton("Новый поиск", callback_data=new_search)])
+    keyboard.append([InlineKeyboardButton("Главное меню", callback_data='main_menu')])
+    reply_markup = InlineKeyboardMarkup(keyboard)
+
+    if update.callback_query:
+        await edit_message(update.callback_query.message, message, reply_markup)
+    else:
+        await update.message.reply_text(message, reply_markup=reply_markup)
+
+async def recommend_teammates(update: Update, context: ContextTypes.DEFAULT_TYPE, hackathon_id: int) -> None:
+    """Участники хакатона, чьи навыки лучше всего дополняют навыки пользователя"""
+    recommender = context.bot_data['recommender']
+    candidates = await recommender.recommend(update.effective_user.id, hackathon_id, RECOMMEND_COUNT)
+    back = [InlineKeyboardButton("Вернуться к участникам", callback_data=callback_data('members', hackathon_id))]
+    menu = [InlineKeyboardButton("Главное меню", callback_data='main_menu')]
+
+    if candidates is None:
+        await update.callback_query.message.edit_text(
+            "Чтобы подобрать команду, нужен ваш профиль с навыками.",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("Создать профиль", callback_data='create_profile')],
+                                               back, menu])
+        )
+        return
+
+    hackathon = await context.bot_data['catalogue'].get(hackathon_id)
+    name = hackathon[1] if hackathon else ""
+    if candidates:
+        new_skills = dict(candidates)
+        profiles = await context.bot_data['db'].fetchall(
+            SEARCH_PROFILES_SQL, (json.dumps([user_id for user_id, _ in candidates]),))
+        lines = [f"Участники хакатона {name}, которые лучше всего дополнят ваши навыки:"]
+        for number, (user_id, username, profile) in enumerate(profiles, start=1):
+            if len(profile) > SEARCH_PREVIEW_LENGTH:
+                profile = profile[:SEARCH_PREVIEW_LENGTH] + "…"
+            skills = ", ".join(new_skills[user_id])
+            lines.append(f"{number}. @{username}" + (f" - добавит: {skills}" if skills else "") + f"\n{profile}")
+        message = "\n\n".join(lines)
+    else:
+        message = f"Среди участников хакатона {name} пока нет профилей для подбора команды."
+
+    await edit_message(update.callback_query.message, message, InlineKeyboardMarkup([back, menu]))
+
+async def send_reminder(application: Application, user_id, hackathon_id, kind, at) -> None:
+    """Отправить участнику напоминание о дедлайне регистрации или начале хакатона"""
+    hackathon = await application.bot_data['catalogue'].get(hackathon_id)
+    if hackathon is None:
+        return
+    from reminders import REGISTRATION
+    moment = datetime.fromtimestamp(at, MSK)
+    if kind == REGISTRATION:
+        message = (f"Напоминание: регистрация на хакатон {hackathon[1]} закрывается {moment:%d.%m в %H:%M} по Москве.\n\n"
+                   f"Ссылка: {hackathon[5]}")
+    else:
+        message = f"Напоминание: хакатон {hackathon[1]} начинается {moment:%d.%m}. Удачи вам и вашей команде!"
+    keyboard = [[InlineKeyboardButton("Посмотреть участников", callback_data=callback_data('members', hackathon_id))],
+                [InlineKeyboardButton("Мои хакатоны", callback_data='my_hackathons')]]
+    await application.bot.send_message(chat_id=user_id, text=message, reply_markup=InlineKeyboardMarkup(keyboard))
+
+def is_admin(update: Update) -> bool:
+    return update.effective_user.id in config.ADMIN_IDS
+
+@timed('announce')
+async def announce(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Обработчик команды /announce: предпросмотр рассылки о новых хакатонах для администратора"""
+    if not is_admin(update):
+        await update.message.reply_text("Эта команда доступна только администраторам.")
+        return
+
+    db = context.bot_data['db']
+    hackathons = await db.fetchall(NEW_HACKATHONS_SQL, (int(time.time()),))
+    if not hackathons:
+        await update.message.reply_text("Новых хакатонов с открытой регистрацией с прошлой рассылки не добавлено.")
+        return
+
+    lines = []
+    for hackathon_id, deadline in hackathons[:ANNOUNCE_MAX_HACKATHONS]:
+        hackathon = await context.bot_data['catalogue'].get(hackathon_id)
+        if hackathon:
+            lines.append(f"• {hackathon[1]} - регистрация до {datetime.fromtimestamp(deadline, MSK):%d.%m.%Y}")
+    if len(hackathons) > ANNOUNCE_MAX_HACKATHONS:
+        lines.append(f"...и еще {len(hackathons) - ANNOUNCE_MAX_HACKATHONS}")
+    text = ("В каталоге сообщества новые хакатоны:\n\n" + "\n".join(lines) +
+            "\n\nПодробности и участие - в разделе «Просмотр хакатонов».")
+    announced_id, = await db.fetchone("SELECT MAX(id) FROM hackathons")
+    recipients, = await db.fetchone("SELECT COUNT(*) FROM users")
+    context.user_data['announcement'] = (text, announced_id)
+
+    keyboard = [[InlineKeyboardButton(f"Разослать ({recipients} получателей)", callback_data='broadcast_start')],
+                [InlineKeyboardButton("Отмена", callback_data='main_menu')]]
+    await update.message.reply_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
+
+@timed('stats')
+async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Обработчик команды /stats: время обработчиков и запросов SQL для администратора"""
+    if not is_admin(update):
+        await update.message.reply_text("Эта команда доступна только администраторам.")
+        return
+    await update.message.reply_text(METRICS.summary())
+
+async def confirm_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Запустить рассылку из предпросмотра /announce"""
+    announcement = context.user_data.pop('announcement', None)
+    if not is_admin(update) or announcement is None:
+        await update.callback_query.message.edit_text("Предпросмотр рассылки устарел, отправьте /announce еще раз.")
+        return
+    from broadcast import create_broadcast
+    text, announced_id = announcement
+    broadcast_id = await context.bot_data['db'].write(create_broadcast, update.effective_user.id, text, announced_id)
+    start_broadcast(context.application, broadcast_id, update.callback_query.message)
+
+def broadcast_progress(broadcast) -> str:
+    processed = broadcast.sent + broadcast.failed
+    state = "завершена" if broadcast.finished else "идет"
+    return (f"Рассылка #{broadcast.id} {state}: обработано {processed} из {broadcast.total}, "
+            f"доставлено {broadcast.sent}, не доставлено {broadcast.failed}, "
+            f"{broadcast.throughput:.1f} сообщений/с")
+
+async def send_broadcast_message(application: Application, user_id, text) -> None:
+    keyboard = [[InlineKeyboardButton("Просмотр хакатонов", callback_data='view_hackathons')]]
+    await application.bot.send_message(chat_id=user_id, text=text, reply_markup=InlineKeyboardMarkup(keyboard))
+
+def start_broadcast(application: Application, broadcast_id, progress_message=None) -> asyncio.Task:
+    """Запустить или возобновить рассылку в фоне; прогресс обновляется в progress_message
+    или в новом сообщении администратору"""
+    from broadcast import Broadcast
+
+    async def report(broadcast):
+        nonlocal progress_message
+        text = broadcast_progress(broadcast)
+        if progress_message is None:
+            progress_message = await application.bot.send_message(chat_id=broadcast.admin_id, text=text)
+        elif progress_message.text != text:
+            progress_message = await progress_message.edit_text(text)
+
+    broadcast = Broadcast(application.bot_data['db'], broadcast_id, partial(send_broadcast_message, application),
+                          rate=config.BROADCAST_RATE, workers=config.BROADCAST_WORKERS,
+                          report_interval=config.BROADCAST_REPORT_INTERVAL, report=report)
+    tasks = application.bot_data.setdefault('broadcasts', {})
+    task = tasks[broadcast_id] = asyncio.ensure_future(broadcast.run())
+
+    def done(task):
+        tasks.pop(broadcast_id, None)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Рассылка %s прервана", broadcast_id, exc_info=task.exception())
+
+    task.add_done_callback(done)
+    return task
+
+async def stop_broadcasts(application: Application) -> None:
+    """post_stop: прервать рассылки, сохранив их контрольные точки; после запуска они продолжатся"""
+    tasks = list(application.bot_data.get('broadcasts', {}).values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+# Маршруты inline-кнопок: имя -> обработчик и типы аргументов из callback_data
+router.add('view_profile', view_profile)
+router.add('edit_profile', edit_profile)
+router.add('create_profile', create_profile)
+router.add('main_menu', show_main_menu)
+router.add('view_hackathons', view_hackathons)
+router.add('my_hackathons', view_my_hackathons)
+router.add('prev_hackathon', partial(view_hackathons, direction='prev'), int)
+router.add('next_hackathon', partial(view_hackathons, direction='next'), int)
+router.add('prev_my_hackathon', partial(view_my_hackathons, direction='prev'), int)
+router.add('next_my_hackathon', partial(view_my_hackathons, direction='next'), int)
+router.add('participate', participate_hackathon, int)
+router.add('members', look_for_members, int)
+router.add('prev_participant', prev_participant)
+router.add('next_participant', next_participant)
+router.add('search_participants', search_participants)
+router.add('search_skills', ask_search_query, int)
+router.add('search_page', show_search_results, int)
+router.add('recommend', recommend_teammates, int)
+router.add('broadcast_start', confirm_broadcast)
+# Кнопки в сообщениях, отправленных до появления маршрутов: participate_12, look_for_members_12, ...
+router.add_legacy('participate_', 'participate')
+router.add_legacy('look_for_members_', 'members')
+router.add_legacy('prev_hackathon_', 'prev_hackathon')
+router.add_legacy('next_hackathon_', 'next_hackathon')
+router.add_legacy('prev_my_hackathon_', 'prev_my_hackathon')
+router.add_legacy('next_my_hackathon_', 'next_my_hackathon')
+router.unknown = outdated_button
+
+async def post_init(application: Application) -> None:
+    """Создание общих ресурсов приложения"""
+    # Номер процесса-обработчика при WORKERS > 1; фоновые задачи выполняет только нулевой
+    worker = application.bot_data.get('worker', 0)
+    METRICS.slow_query = config.SLOW_QUERY_MS / 1000
+    application.bot_data['metrics'] = METRICS
+    if config.RATE_LIMIT_GLOBAL and application.bot.rate_limiter is not None:
+        # Очередь исходящих запросов и время ожидания в ней - в /stats и /metrics
+        METRICS.add_gauges('rate_limiter', "Ограничитель запросов к Bot API (ожидание, с)",
+                           application.bot.rate_limiter.stats, counters=('requests', 'retries', 'merged_edits'))
+    if config.METRICS_PORT:
+        application.bot_data['metrics_server'] = METRICS.serve(config.METRICS_PORT + worker, config.METRICS_HOST)
+    await open_database(application)
+    application.bot_data['catalogue'] = CatalogueCache(application.bot_data['db'])
+    application.bot_data['render'] = RenderCache()
+    application.persistence.bind(application)
+    if application.job_queue is not None and worker == 0:
+        # JobQueue требует python-telegram-bot[job-queue]; без него напоминаний нет
+        from reminders import ReminderScheduler
+        reminders = ReminderScheduler(
+            application.bot_data['db'], partial(send_reminder, application),
+            registration_lead=int(config.REMINDER_REGISTRATION_LEAD_HOURS * 3600),
+            start_lead=int(config.REMINDER_START_LEAD_HOURS * 3600),
+            batch_size=config.REMINDER_BATCH_SIZE,
+        )
+        reminders.schedule(application.job_queue, config.REMINDER_INTERVAL)
+        application.bot_data['reminders'] = reminders
+    if config.CATALOGUE_CSV and worker == 0:
+        # Новые хакатоны из CSV появляются без перезапуска; импорт пишет в ту же базу своим соединением
+        from import_hacks import import_hackathons
+        from watcher import CatalogueWatcher
+        watcher = CatalogueWatcher(config.CATALOGUE_CSV,
+                                   partial(import_hackathons, db_path=application.bot_data['db'].path),
+                                   debounce=config.CATALOGUE_DEBOUNCE, poll_interval=config.CATALOGUE_POLL_INTERVAL)
+        watcher.start()
+        application.bot_data['catalogue_watcher'] = watcher
+
+async def post_start(application: Application) -> None:
+    """Запуск фоновой подготовки, когда приложение уже принимает обновления"""
+    application.bot_data['warm_up'] = asyncio.ensure_future(warm_up(application))
+
+async def warm_up(application: Application) -> None:
+    """Необязательная подготовка, которая не должна задерживать первое обновление после перезапуска"""
+    try:
+        if application.bot_data.get('worker', 0) == 0:
+            # Рассылки, прерванные остановкой или падением, продолжаются с контрольной точки
+            for broadcast_id, in await application.bot_data['db'].fetchall(BROADCAST_UNFINISHED_SQL):
+                start_broadcast(application, broadcast_id)
+        await application.bot_data['catalogue'].warm()
+        # NumPy - необязательная зависимость: без неё кнопки подбора команды нет.
+        # Импорт NumPy долгий, поэтому идёт в потоке; индекс навыков строится в фоне,
+        # первый запрос рекомендаций дождётся его
+        recommend = await asyncio.to_thread(importlib.import_module, 'recommend')
+        if recommend.np is not None:
+            application.bot_data['recommender'] = recommend.Recommender(application.bot_data['db'])
+            application.bot_data['recommender'].start()
+    except Exception:
+        logger.exception("Не удалось подготовить бота после запуска")
+
+async def post_shutdown(application: Application) -> None:
+    """Освобождение общих ресурсов приложения"""
+    task = application.bot_data.pop('warm_up', None)
+    if task is not None:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+    watcher = application.bot_data.pop('catalogue_watcher', None)
+    if watcher is not None:
+        await watcher.stop()
+    server = application.bot_data.pop('metrics_server', None)
+    if server is not None:
+        server.shutdown()
+        server.server_close()
+    await close_database(application)
+
+def build_application(token: str, base_url=None, request=None, rate_bucket=None) -> Application:
+    """Собрать приложение со всеми обработчиками; base_url и request позволяют подменить Bot API.
+
+    rate_bucket - общая с другими процессами корзина лимита бота (workers.py).
+    """
+    from persistence import SessionPersistence
+
+    builder = (
+        Application.builder()
+        .token(token)
+        .application_class(OrderedApplication, kwargs={'concurrency': config.CONCURRENT_UPDATES,
+                                                        'max_pending': config.UPDATE_QUEUE_SIZE,
+                                                        'post_start': post_start})
+        .update_queue(asyncio.Queue(maxsize=config.UPDATE_QUEUE_SIZE))
+        .persistence(SessionPersistence(flush_interval=config.SESSION_FLUSH_INTERVAL,
+                                        idle_ttl=config.SESSION_IDLE_TTL,
+                                        retention_days=config.SESSION_RETENTION_DAYS))
+        .post_init(post_init)
+        .post_stop(stop_broadcasts)
+        .post_shutdown(post_shutdown)
+    )
+    if config.RATE_LIMIT_GLOBAL:
+        from ratelimit import TokenBucketRateLimiter
+        builder = builder.rate_limiter(TokenBucketRateLimiter(
+            global_rate=config.RATE_LIMIT_GLOBAL,
+            chat_rate=config.RATE_LIMIT_CHAT,
+            chat_burst=config.RATE_LIMIT_CHAT_BURST,
+            group_per_minute=config.RATE_LIMIT_GROUP_PER_MINUTE,
+            max_retries=config.RATE_LIMIT_MAX_RETRIES,
+            global_bucket=rate_bucket,
+        ))
+    if base_url:
+        builder = builder.base_url(base_url)
+    if request:
+        builder = builder.request(request)
+    else:
+        # Параллельные обработчики не должны ждать единственное соединение с Bot API
+        builder = builder.connection_pool_size(config.CONCURRENT_UPDATES)
+    application = builder.build()
+
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("announce", announce))
+    application.add_handler(CommandHandler("stats", stats))
+    application.add_handler(CallbackQueryHandler(button_click))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, message_handler))
+    
+    application.add_error_handler(error_handler)
+    return application
+
 def main() -> None:
     """Основная функция для запуска бота"""
     setup_database()
     
-    token = 'your_token'
+    token = config.TELEGRAM_BOT_TOKEN
     if not token:
         logger.error("Не найден токен бота. Установите переменную окружения TELEGRAM_BOT_TOKEN.")
         return
 
-    application = Application.builder().token(token).build()
+    if config.BOT_MODE == 'webhook' and not config.WEBHOOK_URL:
+        logger.error("Для режима webhook установите переменную окружения WEBHOOK_URL.")
+        return
+    base_url = config.TELEGRAM_API_URL or None
+    secret_token = config.WEBHOOK_SECRET or secrets.token_urlsafe(32)
+
+    if config.WORKERS > 1:
+        if config.WORKERS > (os.cpu_count() or 1):
+            logger.warning("WORKERS=%s больше числа ядер (%s): процессы будут делить ядра и работать медленнее",
+                           config.WORKERS, os.cpu_count())
+        # Этот процесс только принимает обновления и раздаёт их процессам-обработчикам по пользователям
+        from workers import run_front
+        asyncio.run(run_front(token, config.WORKERS, base_url=base_url, secret_token=secret_token))
+        return
 
-    application.add_handler(CommandHandler("start", start))
-    application.add_handler(CallbackQueryHandler(button_click))
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, message_handler))
-    
-    application.add_error_handler(error_handler)
+    application = build_application(token, base_url=base_url)
 
-    application.run_polling()
+    if config.BOT_MODE == 'webhook':
+        application.run_webhook(
+            listen=config.WEBHOOK_LISTEN,
+            port=config.WEBHOOK_PORT,
+            url_path=config.WEBHOOK_PATH,
+            webhook_url=config.WEBHOOK_URL,
+            secret_token=secret_token,
+        )
+    else:
+        application.run_polling()
 
 if __name__ == '__main__':
     main()
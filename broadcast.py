@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+from telegram.error import BadRequest, Forbidden, TelegramError
+
+from db import BROADCAST_CHECKPOINT_SQL, BROADCAST_LOAD_SQL, BROADCAST_RECIPIENTS_SQL
+from ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Сколько раз пробовать отправить сообщение при сетевых ошибках и пауза перед повтором, с
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 2.0
+
+
+def create_broadcast(conn, admin_id, text, announced_id=None):
+    """Сохранить новую рассылку всем пользователям и вернуть её id.
+
+    announced_id - последний объявленный хакатон: следующая рассылка о новых
+    хакатонах начнётся после него.
+    """
+    total, = conn.execute("SELECT COUNT(*) FROM users").fetchone()
+    broadcast_id = conn.execute(
+        "INSERT INTO broadcasts (admin_id, text, total, created_at) VALUES (?, ?, ?, ?)",
+        (admin_id, text, total, int(time.time()))).lastrowid
+    if announced_id is not None:
+        conn.execute("UPDATE metadata SET value = ? WHERE key = 'announced_hackathon_id'", (announced_id,))
+    return broadcast_id
+
+
+class Broadcast:
+    """Рассылка одного сообщения всем пользователям из таблицы users.
+
+    Получатели читаются из базы пачками по chunk_size в порядке user_id, а не
+    загружаются целиком, и через ограниченную очередь раздаются workers
+    обработчикам. Темп - не больше rate сообщений в секунду, чтобы рассылка
+    оставляла запас общего лимита бота для ответов пользователям; сами вызовы
+    идут через ограничитель запросов бота. Раз в report_interval секунд курсор -
+    наибольший user_id, до которого все получатели обработаны, - и счётчики
+    записываются в таблицу broadcasts, а report(broadcast) сообщает прогресс.
+    После падения run продолжает с курсора: повторно сообщение могут получить
+    только отправленные за последний интервал.
+    """
+
+    def __init__(self, db, broadcast_id, send, rate=20, workers=8, chunk_size=500, report_interval=5.0,
+                 report=None):
+        self.db = db
+        self.id = broadcast_id
+        self.send = send
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.report_interval = report_interval
+        self.report = report
+        self._bucket = TokenBucket(rate, 1) if rate else None
+        self.admin_id = self.text = None
+        self.total = self.cursor = self.sent = self.failed = 0
+        self.finished = False
+        self._started = time.monotonic()
+        self._processed = 0
+        self._pending = deque()
+        self._done = {}
+
+    @property
+    def throughput(self):
+        """Сообщений в секунду с начала (или возобновления) рассылки"""
+        return self._processed / max(time.monotonic() - self._started, 1e-9)
+
+    async def run(self):
+        """Разослать сообщение оставшимся получателям (всем, если рассылка новая)"""
+        row = await self.db.fetchone(BROADCAST_LOAD_SQL, (self.id,))
+        if row is None:
+            raise ValueError(f"Рассылка {self.id} не найдена")
+        self.admin_id, self.text, self.total, self.cursor, self.sent, self.failed, finished_at = row
+        if finished_at is not None:
+            self.finished = True
+            return
+        logger.info("Рассылка %s: начало с user_id > %s, обработано %s из %s",
+                    self.id, self.cursor, self.sent + self.failed, self.total)
+
+        self._started = time.monotonic()
+        queue = asyncio.Queue(self.workers * 2)
+        workers = [asyncio.ensure_future(self._worker(queue)) for _ in range(self.workers)]
+        reporter = asyncio.ensure_future(self._report_loop())
+        try:
+            last = self.cursor
+            while rows := await self.db.fetchall(BROADCAST_RECIPIENTS_SQL, (last, self.chunk_size)):
+                for user_id, in rows:
+                    self._pending.append(user_id)
+                    await queue.put(user_id)
+                last = rows[-1][0]
+            await queue.join()
+            self.finished = True
+        finally:
+            reporter.cancel()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(reporter, *workers, return_exceptions=True)
+            await self._checkpoint()
+        logger.info("Рассылка %s завершена: отправлено %s, не доставлено %s, %.1f сообщений/с",
+                    self.id, self.sent, self.failed, self.throughput)
+        await self._report()
+
+    async def _worker(self, queue):
+        while True:
+            user_id = await queue.get()
+            try:
+                delivered = await self._deliver(user_id)
+            except Exception:
+                logger.exception("Рассылка %s: ошибка отправки пользователю %s", self.id, user_id)
+                delivered = False
+            self._processed += 1
+            self._complete(user_id, delivered)
+            queue.task_done()
+
+    async def _deliver(self, user_id):
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            if self._bucket is not None:
+                await asyncio.sleep(self._bucket.acquire())
+            try:
+                await self.send(user_id, self.text)
+                return True
+            except (Forbidden, BadRequest):
+                # Пользователь заблокировал бота или чат недоступен: повтор не поможет
+                return False
+            except TelegramError as e:
+                if attempt == MAX_ATTEMPTS:
+                    logger.warning("Рассылка %s: сообщение пользователю %s не отправлено: %s", self.id, user_id, e)
+                    return False
+                await asyncio.sleep(RETRY_DELAY * attempt)
+
+    def _complete(self, user_id, delivered):
+        """Отметить получателя обработанным и продвинуть курсор по непрерывному обработанному началу.
+
+        Счётчики растут вместе с курсором, поэтому после возобновления они не считают никого дважды.
+        """
+        self._done[user_id] = delivered
+        while self._pending and self._pending[0] in self._done:
+            self.cursor = self._pending.popleft()
+            if self._done.pop(self.cursor):
+                self.sent += 1
+            else:
+                self.failed += 1
+
+    async def _checkpoint(self):
+        finished_at = int(time.time()) if self.finished else None
+        await self.db.execute(BROADCAST_CHECKPOINT_SQL, (self.cursor, self.sent, self.failed, finished_at, self.id))
+
+    async def _report(self):
+        if self.report is None:
+            return
+        try:
+            await self.report(self)
+        except Exception as e:
+            logger.warning("Рассылка %s: не удалось сообщить прогресс: %s", self.id, e)
+
+    async def _report_loop(self):
+        while True:
+            await asyncio.sleep(self.report_interval)
+            await self._checkpoint()
+            await self._report()
@@ -0,0 +1,79 @@
+import time
+from collections import OrderedDict
+
+from db import CATALOGUE_GENERATION_SQL, CATALOGUE_NAMES_SQL, CATALOGUE_RECENT_SQL, CATALOGUE_ROW_SQL
+
+
+class CatalogueCache:
+    """Кэш каталога хакатонов в памяти процесса.
+
+    Каталог меняется только при импорте, поэтому строки хакатонов и список
+    названий читаются из памяти. На каждый запрос проверяется поколение
+    каталога в таблице metadata (один поиск по первичному ключу): триггеры
+    увеличивают его при любом изменении хакатонов, и после импорта кэш
+    сбрасывается без перезапуска бота.
+    """
+
+    def __init__(self, db, ttl=600, max_size=2048):
+        self.db = db
+        self.ttl = ttl
+        self.max_size = max_size
+        self.generation = None
+        self._loaded_at = 0
+        self._rows = OrderedDict()
+        self._names = None
+
+    def invalidate(self):
+        self.generation = None
+        self._rows.clear()
+        self._names = None
+
+    async def _validate(self):
+        row = await self.db.fetchone(CATALOGUE_GENERATION_SQL)
+        generation = row[0] if row else None
+        now = time.monotonic()
+        if generation != self.generation or now - self._loaded_at > self.ttl:
+            self.invalidate()
+            self.generation = generation
+            self._loaded_at = now
+
+    async def get(self, hackathon_id):
+        """Строка хакатона (id, name, prizes, registration, duration, link, telegram_chat, comments) или None"""
+        await self._validate()
+        row = self._rows.get(hackathon_id)
+        if row is not None:
+            self._rows.move_to_end(hackathon_id)
+            return row
+
+        generation = self.generation
+        row = await self.db.fetchone(CATALOGUE_ROW_SQL, (hackathon_id,))
+        # Пока шёл запрос, другой обработчик мог увидеть новое поколение и сбросить кэш:
+        # строку старого поколения в новый кэш не кладём
+        if row is not None and self.generation == generation:
+            self._rows[hackathon_id] = row
+            if len(self._rows) > self.max_size:
+                self._rows.popitem(last=False)
+        return row
+
+    async def warm(self):
+        """Заполнить кэш заранее: список названий и строки последних max_size хакатонов одним запросом"""
+        await self._validate()
+        generation = self.generation
+        rows = await self.db.fetchall(CATALOGUE_RECENT_SQL, (self.max_size,))
+        if self.generation != generation:
+            return
+        # Новые хакатоны смотрят чаще: они последними вытесняются из LRU
+        for row in reversed(rows):
+            self._rows.setdefault(row[0], row)
+        await self.names()
+
+    async def names(self):
+        """Список (id, name) всех хакатонов"""
+        await self._validate()
+        if self._names is not None:
+            return self._names
+        generation = self.generation
+        names = await self.db.fetchall(CATALOGUE_NAMES_SQL)
+        if self.generation == generation:
+            self._names = names
+        return names
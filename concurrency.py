@@ -0,0 +1,82 @@
+import asyncio
+
+from telegram import Update
+from telegram.ext import Application
+
+
+def ordering_key(update):
+    """Ключ, в пределах которого обновления обрабатываются строго по очереди"""
+    if isinstance(update, Update):
+        if update.effective_user:
+            return 'user', update.effective_user.id
+        if update.effective_chat:
+            return 'chat', update.effective_chat.id
+    return None
+
+
+class OrderedApplication(Application):
+    """Приложение, обрабатывающее обновления разных пользователей параллельно.
+
+    Обновления одного пользователя выполняются строго в порядке поступления,
+    поэтому состояние в user_data (expecting_profile, курсоры) не гоняется.
+    Одновременно выполняется не больше concurrency обработчиков, а ожидающих
+    обновлений не больше max_pending: дальше приём притормаживает очередь.
+
+    post_start(application) вызывается в конце start(), когда обновления уже
+    принимаются (post_init PTB выполняется до начала polling или webhook).
+    """
+
+    def __init__(self, *, concurrency, max_pending, post_start=None, **kwargs):
+        super().__init__(**kwargs)
+        self.post_start = post_start
+        self._workers = asyncio.Semaphore(concurrency)
+        self._pending = asyncio.Semaphore(max_pending)
+        self._locks = {}
+
+    async def start(self) -> None:
+        await super().start()
+        if self.post_start is not None:
+            await self.post_start(self)
+
+    async def process_update(self, update: object) -> None:
+        key = ordering_key(update)
+        if key is None:
+            async with self._workers:
+                await super().process_update(update)
+            return
+
+        await self._pending.acquire()
+        lock, waiting = self._locks.get(key, (None, 0))
+        if lock is None:
+            lock = asyncio.Lock()
+        self._locks[key] = (lock, waiting + 1)
+        self.create_task(self._process_in_order(key, lock, update), update=update)
+
+    async def _process_in_order(self, key, lock, update):
+        try:
+            # asyncio.Lock пропускает ожидающих по очереди, а задачи стартуют в порядке создания
+            async with lock:
+                async with self._workers:
+                    await super().process_update(update)
+        finally:
+            self._pending.release()
+            lock, waiting = self._locks[key]
+            if waiting == 1:
+                del self._locks[key]
+            else:
+                self._locks[key] = (lock, waiting - 1)
+
+    def evict_user_data(self, user_ids):
+        """Выгрузить из памяти user_data неактивных пользователей через drop_user_data.
+
+        Пропускает пользователей с обновлением в обработке. Persistence получит
+        drop_user_data выгруженных при следующей записи и должна отличать выгрузку
+        от удаления. Возвращает список выгруженных.
+        """
+        evicted = []
+        for user_id in user_ids:
+            if ('user', user_id) in self._locks or user_id not in self.user_data:
+                continue
+            self.drop_user_data(user_id)
+            evicted.append(user_id)
+        return evicted
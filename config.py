@@ -0,0 +1,81 @@
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Токен бота и способ получения обновлений: polling или webhook
+TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN', '')
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+# Адрес Bot API, например собственного сервера telegram-bot-api (пусто - api.telegram.org)
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', '')
+
+# Webhook: публичный URL, на который Telegram присылает обновления, и локальный адрес сервера.
+# Секрет проверяется в заголовке X-Telegram-Bot-Api-Secret-Token; если не задан, генерируется при запуске
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', 'telegram')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+
+# Сколько обновлений может ждать обработки; при заполнении очереди приём обновлений притормаживается
+UPDATE_QUEUE_SIZE = int(os.getenv('UPDATE_QUEUE_SIZE', '1000'))
+
+# Сколько обновлений разных пользователей обрабатывается одновременно;
+# обновления одного пользователя всегда идут по очереди
+CONCURRENT_UPDATES = int(os.getenv('CONCURRENT_UPDATES', '32'))
+
+# Несколько процессов-обработчиков: при WORKERS > 1 основной процесс только принимает обновления
+# (polling или webhook) и раздаёт их WORKERS процессам по пользователю через Unix-сокеты в
+# WORKER_SOCKET_DIR (пусто - временный каталог). Процессы работают с общей базой и общим лимитом
+# RATE_LIMIT_GLOBAL; CONCURRENT_UPDATES и UPDATE_QUEUE_SIZE действуют в каждом процессе.
+# По умолчанию выключено: выигрыш от нескольких процессов не измерен, а на одном ядре они медленнее
+# одного процесса (передача через сокеты). Включать после bench/bench_journeys.py --workers 1 2 4 на целевой машине
+WORKERS = int(os.getenv('WORKERS', '1'))
+WORKER_SOCKET_DIR = os.getenv('WORKER_SOCKET_DIR', '')
+
+# Ограничение исходящих запросов к Bot API: сообщений в секунду на бота (0 - без ограничения),
+# в секунду на личный чат с допустимым всплеском и в минуту на группу
+RATE_LIMIT_GLOBAL = float(os.getenv('RATE_LIMIT_GLOBAL', '30'))
+RATE_LIMIT_CHAT = float(os.getenv('RATE_LIMIT_CHAT', '1'))
+RATE_LIMIT_CHAT_BURST = int(os.getenv('RATE_LIMIT_CHAT_BURST', '3'))
+RATE_LIMIT_GROUP_PER_MINUTE = int(os.getenv('RATE_LIMIT_GROUP_PER_MINUTE', '20'))
+RATE_LIMIT_MAX_RETRIES = int(os.getenv('RATE_LIMIT_MAX_RETRIES', '3'))
+
+# Каталог хакатонов - CSV-выгрузка таблицы, которую загружает import_hacks.py. Если задан
+# CATALOGUE_CSV, бот сам следит за файлом (inotify, без него - проверка раз в CATALOGUE_POLL_INTERVAL с)
+# и импортирует его в фоне через CATALOGUE_DEBOUNCE с после последнего изменения
+CATALOGUE_CSV = os.getenv('CATALOGUE_CSV', '')
+CATALOGUE_DEBOUNCE = float(os.getenv('CATALOGUE_DEBOUNCE', '2'))
+CATALOGUE_POLL_INTERVAL = float(os.getenv('CATALOGUE_POLL_INTERVAL', '5'))
+
+# Состояние диалогов пользователей хранится в базе: изменения записываются пачкой раз в
+# SESSION_FLUSH_INTERVAL секунд, состояние неактивных дольше SESSION_IDLE_TTL секунд выгружается
+# из памяти, а записи без изменений дольше SESSION_RETENTION_DAYS дней удаляются (0 - хранить всегда)
+SESSION_FLUSH_INTERVAL = float(os.getenv('SESSION_FLUSH_INTERVAL', '5'))
+SESSION_IDLE_TTL = float(os.getenv('SESSION_IDLE_TTL', '900'))
+SESSION_RETENTION_DAYS = float(os.getenv('SESSION_RETENTION_DAYS', '30'))
+
+# Напоминания участникам: за сколько часов до окончания регистрации и до начала хакатона,
+# как часто проверять наступившие (с) и сколько напоминаний отправлять за одну проверку
+REMINDER_REGISTRATION_LEAD_HOURS = float(os.getenv('REMINDER_REGISTRATION_LEAD_HOURS', '24'))
+REMINDER_START_LEAD_HOURS = float(os.getenv('REMINDER_START_LEAD_HOURS', '24'))
+REMINDER_INTERVAL = float(os.getenv('REMINDER_INTERVAL', '60'))
+REMINDER_BATCH_SIZE = int(os.getenv('REMINDER_BATCH_SIZE', '1000'))
+
+# Администраторы бота (id пользователей Telegram через запятую): им доступна команда /announce
+ADMIN_IDS = {int(user_id) for user_id in os.getenv('ADMIN_IDS', '').split(',') if user_id.strip()}
+
+# Рассылки: сообщений в секунду (меньше RATE_LIMIT_GLOBAL, чтобы бот успевал отвечать пользователям),
+# число одновременных отправок и как часто сохранять прогресс и сообщать его администратору, с
+BROADCAST_RATE = float(os.getenv('BROADCAST_RATE', '20'))
+BROADCAST_WORKERS = int(os.getenv('BROADCAST_WORKERS', '8'))
+BROADCAST_REPORT_INTERVAL = float(os.getenv('BROADCAST_REPORT_INTERVAL', '10'))
+
+# Метрики: запросы SQL дольше SLOW_QUERY_MS миллисекунд пишутся в лог (0 - не писать).
+# Если задан METRICS_PORT, гистограммы отдаются в формате Prometheus по http://METRICS_HOST:METRICS_PORT/metrics;
+# администраторам они также доступны командой /stats. При WORKERS > 1 обработчик с номером i
+# отдаёт свои метрики на порту METRICS_PORT + i, а /stats показывает метрики нулевого
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '100'))
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
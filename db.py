@@ -0,0 +1,625 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from schedule import parse_schedule
+
+DB_PATH = os.getenv('BOT_DATABASE', 'bot_database.db')
+
+
+def parse_hackathon_dates(conn):
+    """Миграция 9: разобранные даты хакатона рядом с исходным текстом таблицы.
+
+    Время хранится в секундах Unix, NULL - текст не разобран (тогда бот показывает
+    только исходный текст). Даты разбирает Python (schedule.parse_schedule), поэтому
+    существующие строки заполняются здесь же, а новые - импортером.
+    """
+    conn.execute("ALTER TABLE hackathons ADD COLUMN starts_at INTEGER")
+    conn.execute("ALTER TABLE hackathons ADD COLUMN ends_at INTEGER")
+    conn.execute("ALTER TABLE hackathons ADD COLUMN registration_deadline INTEGER")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_hackathons_deadline ON hackathons (registration_deadline)")
+    conn.executemany(
+        "UPDATE hackathons SET starts_at = ?, ends_at = ?, registration_deadline = ? WHERE id = ?",
+        [parse_schedule(registration, duration) + (hackathon_id,) for hackathon_id, registration, duration
+         in conn.execute("SELECT id, registration, duration FROM hackathons").fetchall()])
+
+
+# Версионированные миграции схемы: номер миграции хранится в PRAGMA user_version.
+# Миграция - SQL-скрипт или функция fn(conn), выполняемая в транзакции
+MIGRATIONS = [
+    # 1: исходная схема
+    '''
+    CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER PRIMARY KEY,
+        username TEXT,
+        profile TEXT
+    );
+    CREATE TABLE IF NOT EXISTS hackathons (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT,
+        prizes TEXT,
+        registration TEXT,
+        duration TEXT,
+        link TEXT,
+        telegram_chat TEXT,
+        comments TEXT
+    );
+    CREATE TABLE IF NOT EXISTS participations (
+        user_id INTEGER,
+        hackathon_id INTEGER,
+        FOREIGN KEY (user_id) REFERENCES users (user_id),
+        FOREIGN KEY (hackathon_id) REFERENCES hackathons (id),
+        PRIMARY KEY (user_id, hackathon_id)
+    );
+    ''',
+    # 2: поиск участников по хакатону; выборка по пользователю покрыта первичным ключом
+    '''
+    CREATE INDEX IF NOT EXISTS idx_participations_hackathon ON participations (hackathon_id, user_id);
+    ''',
+    # 3: денормализованный счётчик участников, поддерживаемый триггерами
+    '''
+    ALTER TABLE hackathons ADD COLUMN participant_count INTEGER NOT NULL DEFAULT 0;
+    UPDATE hackathons SET participant_count = (
+        SELECT COUNT(*) FROM participations p WHERE p.hackathon_id = hackathons.id
+    );
+    CREATE TRIGGER IF NOT EXISTS trg_participations_insert AFTER INSERT ON participations
+    BEGIN
+        UPDATE hackathons SET participant_count = participant_count + 1 WHERE id = NEW.hackathon_id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_participations_delete AFTER DELETE ON participations
+    BEGIN
+        UPDATE hackathons SET participant_count = participant_count - 1 WHERE id = OLD.hackathon_id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_participations_update AFTER UPDATE OF hackathon_id ON participations
+    BEGIN
+        UPDATE hackathons SET participant_count = participant_count - 1 WHERE id = OLD.hackathon_id;
+        UPDATE hackathons SET participant_count = participant_count + 1 WHERE id = NEW.hackathon_id;
+    END;
+    ''',
+    # 4: поколение каталога - меняется при любом изменении хакатонов, кроме счётчика участников
+    '''
+    CREATE TABLE IF NOT EXISTS metadata (
+        key TEXT PRIMARY KEY,
+        value
+    );
+    INSERT OR IGNORE INTO metadata (key, value) VALUES ('catalogue_generation', 0);
+    CREATE TRIGGER IF NOT EXISTS trg_hackathons_insert AFTER INSERT ON hackathons
+    BEGIN
+        UPDATE metadata SET value = value + 1 WHERE key = 'catalogue_generation';
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_hackathons_delete AFTER DELETE ON hackathons
+    BEGIN
+        UPDATE metadata SET value = value + 1 WHERE key = 'catalogue_generation';
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_hackathons_update
+    AFTER UPDATE OF name, prizes, registration, duration, link, telegram_chat, comments ON hackathons
+    BEGIN
+        UPDATE metadata SET value = value + 1 WHERE key = 'catalogue_generation';
+    END;
+    ''',
+    # 5: уникальные названия для UPSERT при импорте; участия в дублях переносятся на первый хакатон
+    '''
+    INSERT OR IGNORE INTO participations (user_id, hackathon_id)
+        SELECT p.user_id, (SELECT MIN(d.id) FROM hackathons d WHERE d.name = h.name)
+        FROM participations p
+        JOIN hackathons h ON h.id = p.hackathon_id
+        WHERE h.id != (SELECT MIN(d.id) FROM hackathons d WHERE d.name = h.name);
+    DELETE FROM participations WHERE hackathon_id IN (
+        SELECT h.id FROM hackathons h WHERE h.id != (SELECT MIN(d.id) FROM hackathons d WHERE d.name = h.name)
+    );
+    DELETE FROM hackathons WHERE id != (SELECT MIN(d.id) FROM hackathons d WHERE d.name = hackathons.name);
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_hackathons_name ON hackathons (name);
+    ''',
+    # 6: хэш содержимого строки для инкрементального импорта (NULL - хакатон добавлен не из CSV)
+    '''
+    ALTER TABLE hackathons ADD COLUMN content_hash TEXT;
+    ''',
+    # 7: упакованное состояние диалога пользователя (persistence.SessionPersistence)
+    '''
+    CREATE TABLE IF NOT EXISTS sessions (
+        user_id INTEGER PRIMARY KEY,
+        state BLOB NOT NULL,
+        touched INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_sessions_touched ON sessions (touched);
+    ''',
+    # 8: полнотекстовый поиск по профилям. Индекс без копии текста (content=''), ё приводится к е,
+    # как в search.fold; UPDATE профиля в save_profile переиндексирует его
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5(
+        profile, content='', tokenize="unicode61 remove_diacritics 2 tokenchars '+#'"
+    );
+    INSERT INTO users_fts (rowid, profile)
+        SELECT user_id, replace(replace(profile, 'ё', 'е'), 'Ё', 'Е') FROM users WHERE profile IS NOT NULL;
+    CREATE TRIGGER IF NOT EXISTS trg_users_fts_insert AFTER INSERT ON users WHEN NEW.profile IS NOT NULL
+    BEGIN
+        INSERT INTO users_fts (rowid, profile)
+        VALUES (NEW.user_id, replace(replace(NEW.profile, 'ё', 'е'), 'Ё', 'Е'));
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_users_fts_delete AFTER DELETE ON users WHEN OLD.profile IS NOT NULL
+    BEGIN
+        INSERT INTO users_fts (users_fts, rowid, profile)
+        VALUES ('delete', OLD.user_id, replace(replace(OLD.profile, 'ё', 'е'), 'Ё', 'Е'));
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_users_fts_update AFTER UPDATE OF profile ON users
+    BEGIN
+        INSERT INTO users_fts (users_fts, rowid, profile)
+        SELECT 'delete', OLD.user_id, replace(replace(OLD.profile, 'ё', 'е'), 'Ё', 'Е') WHERE OLD.profile IS NOT NULL;
+        INSERT INTO users_fts (rowid, profile)
+        SELECT NEW.user_id, replace(replace(NEW.profile, 'ё', 'е'), 'Ё', 'Е') WHERE NEW.profile IS NOT NULL;
+    END;
+    ''',
+    # 9: начало, конец и окончание регистрации; открытые хакатоны выбираются по индексу дедлайна
+    parse_hackathon_dates,
+    # 10: отправленные напоминания (reminders.ReminderScheduler). Ключ включает время события:
+    # если дедлайн или начало перенесут, напоминание придёт снова
+    '''
+    CREATE INDEX IF NOT EXISTS idx_hackathons_starts ON hackathons (starts_at);
+    CREATE TABLE IF NOT EXISTS reminders_sent (
+        user_id INTEGER NOT NULL,
+        hackathon_id INTEGER NOT NULL,
+        kind INTEGER NOT NULL,
+        at INTEGER NOT NULL,
+        sent_at INTEGER NOT NULL,
+        PRIMARY KEY (user_id, hackathon_id, kind, at)
+    ) WITHOUT ROWID;
+    ''',
+    # 11: рассылки администраторов (broadcast.Broadcast): текст, получатели до cursor обработаны
+    '''
+    CREATE TABLE IF NOT EXISTS broadcasts (
+        id INTEGER PRIMARY KEY,
+        admin_id INTEGER NOT NULL,
+        text TEXT NOT NULL,
+        total INTEGER NOT NULL,
+        cursor INTEGER NOT NULL DEFAULT 0,
+        sent INTEGER NOT NULL DEFAULT 0,
+        failed INTEGER NOT NULL DEFAULT 0,
+        created_at INTEGER NOT NULL,
+        finished_at INTEGER
+    );
+    INSERT OR IGNORE INTO metadata (key, value) VALUES ('announced_hackathon_id', 0);
+    ''',
+    # 12: хакатоны, пропавшие из CSV, архивируются (archived_at), а не удаляются вместе с участиями;
+    # архивирование и возврат в каталог тоже меняют поколение каталога
+    '''
+    ALTER TABLE hackathons ADD COLUMN archived_at INTEGER;
+    DROP TRIGGER IF EXISTS trg_hackathons_update;
+    CREATE TRIGGER trg_hackathons_update
+    AFTER UPDATE OF name, prizes, registration, duration, link, telegram_chat, comments, archived_at ON hackathons
+    BEGIN
+        UPDATE metadata SET value = value + 1 WHERE key = 'catalogue_generation';
+    END;
+    ''',
+]
+
+# Горячие запросы обработчиков
+HACKATHON_COLUMNS = "h.id, h.participant_count"
+
+# Постраничный (keyset) просмотр хакатонов: id и счётчик соседнего с курсором :cursor хакатона,
+# остальные поля берутся из кэша каталога. Ключ - (только мои хакатоны, направление).
+# Доступные хакатоны - только открытые (дедлайн не раньше :now) в порядке дедлайна: ключ страницы
+# (дедлайн, id), дедлайн курсора читается по id. Хакатоны с неразобранным дедлайном и архивные
+# не показываются; в "моих хакатонах" архивные остаются
+HACKATHON_PAGE_SQL = {
+    (False, 'next'): f"""
+        SELECT {HACKATHON_COLUMNS}
+        FROM hackathons h
+        WHERE h.registration_deadline >= :now AND h.archived_at IS NULL
+          AND (h.registration_deadline, h.id) > (
+              COALESCE((SELECT registration_deadline FROM hackathons WHERE id = :cursor), 0), :cursor)
+          AND NOT EXISTS (SELECT 1 FROM participations p WHERE p.user_id = :user_id AND p.hackathon_id = h.id)
+        ORDER BY h.registration_deadline, h.id
+        LIMIT 1
+    """,
+    (False, 'prev'): f"""
+        SELECT {HACKATHON_COLUMNS}
+        FROM hackathons h
+        WHERE h.registration_deadline >= :now AND h.archived_at IS NULL
+          AND (h.registration_deadline, h.id) < (
+              COALESCE((SELECT registration_deadline FROM hackathons WHERE id = :cursor), 9223372036854775807), :cursor)
+          AND NOT EXISTS (SELECT 1 FROM participations p WHERE p.user_id = :user_id AND p.hackathon_id = h.id)
+        ORDER BY h.registration_deadline DESC, h.id DESC
+        LIMIT 1
+    """,
+    (True, 'next'): f"""
+        SELECT {HACKATHON_COLUMNS}
+        FROM participations p
+        JOIN hackathons h ON h.id = p.hackathon_id
+        WHERE p.user_id = :user_id AND p.hackathon_id > :cursor
+        ORDER BY p.hackathon_id
+        LIMIT 1
+    """,
+    (True, 'prev'): f"""
+        SELECT {HACKATHON_COLUMNS}
+        FROM participations p
+        JOIN hackathons h ON h.id = p.hackathon_id
+        WHERE p.user_id = :user_id AND p.hackathon_id < :cursor
+        ORDER BY p.hackathon_id DESC
+        LIMIT 1
+    """,
+}
+
+CATALOGUE_GENERATION_SQL = "SELECT value FROM metadata WHERE key = 'catalogue_generation'"
+
+CATALOGUE_ROW_SQL = """
+    SELECT id, name, prizes, registration, duration, link, telegram_chat, comments
+    FROM hackathons
+    WHERE id = ?
+"""
+
+CATALOGUE_NAMES_SQL = "SELECT id, name FROM hackathons WHERE archived_at IS NULL ORDER BY id"
+
+# Прогрев кэша каталога после запуска: строки последних добавленных хакатонов (limit)
+CATALOGUE_RECENT_SQL = """
+    SELECT id, name, prizes, registration, duration, link, telegram_chat, comments
+    FROM hackathons
+    ORDER BY id DESC
+    LIMIT ?
+"""
+
+# Окно участников хакатона в порядке user_id: (hackathon_id, limit, offset)
+PARTICIPANTS_PAGE_SQL = """
+    SELECT u.username, u.profile
+    FROM participations p
+    JOIN users u ON u.user_id = p.user_id
+    WHERE p.hackathon_id = ?
+    ORDER BY p.user_id
+    LIMIT ? OFFSET ?
+"""
+
+PARTICIPANT_COUNT_SQL = """
+    SELECT COUNT(*)
+    FROM participations p
+    JOIN users u ON u.user_id = p.user_id
+    WHERE p.hackathon_id = ?
+"""
+
+# Сохранение профиля. UPSERT, а не INSERT OR REPLACE: замена строки не запускает триггеры удаления,
+# и старый текст остался бы в users_fts
+SAVE_PROFILE_SQL = """
+    INSERT INTO users (user_id, username, profile) VALUES (?, ?, ?)
+    ON CONFLICT(user_id) DO UPDATE SET username = excluded.username, profile = excluded.profile
+"""
+
+# Поиск участников по профилю (:query - запрос FTS5 из search.match_query): id не больше :limit самых
+# подходящих по bm25. Ключ - фильтр по участникам хакатона :hackathon_id. Ранжируются все совпадения,
+# поэтому результат считается один раз на поиск, а страницы читаются по id через SEARCH_PROFILES_SQL
+PARTICIPANT_SEARCH_SQL = {
+    False: """
+        SELECT rowid
+        FROM users_fts
+        WHERE users_fts MATCH :query
+        ORDER BY bm25(users_fts)
+        LIMIT :limit
+    """,
+    True: """
+        SELECT p.user_id
+        FROM participations p
+        JOIN users_fts ON users_fts.rowid = p.user_id
+        WHERE p.hackathon_id = :hackathon_id AND users_fts MATCH :query
+        ORDER BY bm25(users_fts)
+        LIMIT :limit
+    """,
+}
+
+# Профили по JSON-списку id в порядке списка
+SEARCH_PROFILES_SQL = """
+    SELECT u.user_id, u.username, u.profile
+    FROM json_each(?) j
+    JOIN users u ON u.user_id = j.value
+    ORDER BY j.key
+"""
+
+# Рекомендации: все профили для построения индекса навыков при запуске и участники хакатона
+PROFILES_SQL = "SELECT user_id, profile FROM users WHERE profile IS NOT NULL"
+HACKATHON_MEMBERS_SQL = "SELECT user_id FROM participations WHERE hackathon_id = ?"
+
+# Состояние диалога: загрузка при первом обновлении пользователя, пакетная запись, очистка старых
+SESSION_LOAD_SQL = "SELECT state FROM sessions WHERE user_id = ?"
+SESSION_SAVE_SQL = """
+    INSERT INTO sessions (user_id, state, touched) VALUES (?, ?, ?)
+    ON CONFLICT(user_id) DO UPDATE SET state = excluded.state, touched = excluded.touched
+"""
+SESSION_DELETE_SQL = "DELETE FROM sessions WHERE user_id = ?"
+SESSION_EXPIRE_SQL = "DELETE FROM sessions WHERE touched < ?"
+
+# Напоминания участникам, для которых до окончания регистрации (kind 0) или начала хакатона
+# (kind 1) осталось не больше :registration_lead / :start_lead секунд и которым напоминание о
+# событии в это время ещё не отправлено. Оба диапазона читаются по индексам дат хакатонов,
+# поэтому ближайшие события идут первыми
+REMINDERS_DUE_SQL = """
+    SELECT p.user_id, h.id, 0, h.registration_deadline
+    FROM hackathons h
+    JOIN participations p ON p.hackathon_id = h.id
+    WHERE h.registration_deadline > :now AND h.registration_deadline <= :now + :registration_lead
+      AND h.archived_at IS NULL
+      AND NOT EXISTS (SELECT 1 FROM reminders_sent r WHERE r.user_id = p.user_id AND r.hackathon_id = h.id
+                                                        AND r.kind = 0 AND r.at = h.registration_deadline)
+    UNION ALL
+    SELECT p.user_id, h.id, 1, h.starts_at
+    FROM hackathons h
+    JOIN participations p ON p.hackathon_id = h.id
+    WHERE h.starts_at > :now AND h.starts_at <= :now + :start_lead
+      AND h.archived_at IS NULL
+      AND NOT EXISTS (SELECT 1 FROM reminders_sent r WHERE r.user_id = p.user_id AND r.hackathon_id = h.id
+                                                        AND r.kind = 1 AND r.at = h.starts_at)
+    LIMIT :limit
+"""
+REMINDER_CLAIM_SQL = """
+    INSERT OR IGNORE INTO reminders_sent (user_id, hackathon_id, kind, at, sent_at) VALUES (?, ?, ?, ?, ?)
+"""
+REMINDER_RELEASE_SQL = "DELETE FROM reminders_sent WHERE user_id = ? AND hackathon_id = ? AND kind = ? AND at = ?"
+
+# Рассылки: получатели читаются пачками по id после курсора, состояние сохраняется контрольной точкой.
+# Объявляются открытые хакатоны, добавленные после последнего объявленного (announced_hackathon_id)
+BROADCAST_RECIPIENTS_SQL = "SELECT user_id FROM users WHERE user_id > ? ORDER BY user_id LIMIT ?"
+BROADCAST_LOAD_SQL = "SELECT admin_id, text, total, cursor, sent, failed, finished_at FROM broadcasts WHERE id = ?"
+BROADCAST_CHECKPOINT_SQL = "UPDATE broadcasts SET cursor = ?, sent = ?, failed = ?, finished_at = ? WHERE id = ?"
+BROADCAST_UNFINISHED_SQL = "SELECT id FROM broadcasts WHERE finished_at IS NULL ORDER BY id"
+NEW_HACKATHONS_SQL = """
+    SELECT id, registration_deadline
+    FROM hackathons
+    WHERE id > (SELECT value FROM metadata WHERE key = 'announced_hackathon_id') AND registration_deadline >= ?
+      AND archived_at IS NULL
+    ORDER BY registration_deadline
+"""
+
+# Запросы для проверки плана и таблицы (псевдонимы из запроса), полный обход которых допустим
+HOT_QUERIES = {
+    'view_profile': ("SELECT profile FROM users WHERE user_id = ?", (1,), ()),
+    'next_hackathon': (HACKATHON_PAGE_SQL[False, 'next'], {'user_id': 1, 'cursor': 0, 'now': 0}, ()),
+    'prev_hackathon': (HACKATHON_PAGE_SQL[False, 'prev'], {'user_id': 1, 'cursor': 0, 'now': 0}, ()),
+    'next_my_hackathon': (HACKATHON_PAGE_SQL[True, 'next'], {'user_id': 1, 'cursor': 0}, ()),
+    'prev_my_hackathon': (HACKATHON_PAGE_SQL[True, 'prev'], {'user_id': 1, 'cursor': 0}, ()),
+    'look_for_members': (PARTICIPANT_COUNT_SQL, (1,), ()),
+    'show_participant': (PARTICIPANTS_PAGE_SQL, (1, 5, 0), ()),
+    'catalogue_generation': (CATALOGUE_GENERATION_SQL, (), ()),
+    'catalogue_row': (CATALOGUE_ROW_SQL, (1,), ()),
+    'catalogue_names': (CATALOGUE_NAMES_SQL, (), ('hackathons',)),
+    'search_participants': (PARTICIPANT_SEARCH_SQL[False],
+                            {'query': '"python"*', 'hackathon_id': 1, 'limit': 50}, ()),
+    'search_hackathon_participants': (PARTICIPANT_SEARCH_SQL[True],
+                                      {'query': '"python"*', 'hackathon_id': 1, 'limit': 50}, ()),
+    'search_profiles': (SEARCH_PROFILES_SQL, ('[1, 2, 3]',), ('j',)),
+    'recommend_members': (HACKATHON_MEMBERS_SQL, (1,), ()),
+    'session_load': (SESSION_LOAD_SQL, (1,), ()),
+    'session_expire': (SESSION_EXPIRE_SQL, (0,), ()),
+    'reminders_due': (REMINDERS_DUE_SQL, {'now': 0, 'registration_lead': 86400, 'start_lead': 86400,
+                                          'limit': 1000}, ()),
+    'broadcast_recipients': (BROADCAST_RECIPIENTS_SQL, (0, 500), ()),
+}
+
+
+def connect(path=DB_PATH, readonly=False):
+    """Открыть соединение с базой в режиме WAL и кэшем подготовленных запросов"""
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False, cached_statements=256)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    if readonly:
+        conn.execute('PRAGMA query_only=ON')
+    return conn
+
+
+def setup_database(path=DB_PATH):
+    """Создание и миграция базы данных SQLite до последней версии схемы.
+
+    Актуальная схема - обычный случай при перезапуске: она проверяется одним
+    чтением user_version, без PRAGMA режима журнала и блокировок записи.
+    """
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        if conn.execute('PRAGMA user_version').fetchone()[0] == len(MIGRATIONS):
+            return
+    finally:
+        conn.close()
+    conn = connect(path)
+    try:
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        for number, script in enumerate(MIGRATIONS[version:], start=version + 1):
+            if callable(script):
+                conn.execute('BEGIN')
+                try:
+                    script(conn)
+                    conn.execute(f'PRAGMA user_version = {number}')
+                except Exception:
+                    conn.rollback()
+                    raise
+                conn.commit()
+            else:
+                conn.executescript(f'BEGIN; {script} PRAGMA user_version = {number}; COMMIT;')
+    finally:
+        conn.close()
+
+
+def full_scans(conn, sql, params=()):
+    """Таблицы, которые запрос читает полным обходом без индекса"""
+    scans = []
+    for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params):
+        detail = row[-1]
+        words = detail.replace('SCAN TABLE ', 'SCAN ').split()
+        if words[0] == 'SCAN' and 'USING' not in words:
+            # Виртуальная таблица с ограничениями читает свой индекс (FTS5 MATCH: "INDEX 32:M1")
+            if 'VIRTUAL' in words and not words[-1].endswith(':'):
+                continue
+            scans.append(words[1])
+    return scans
+
+
+def audit_query_plans(conn):
+    """Вернуть {запрос: [таблицы]} для горячих запросов с недопустимым полным обходом"""
+    problems = {}
+    for name, (sql, params, allowed) in HOT_QUERIES.items():
+        scans = [table for table in full_scans(conn, sql, params) if table not in allowed]
+        if scans:
+            problems[name] = scans
+    return problems
+
+
+def counter_drift(conn):
+    """Хакатоны, у которых participant_count расходится с participations: (id, stored, actual)"""
+    return conn.execute("""
+        SELECT h.id, h.participant_count, COUNT(p.user_id) AS actual
+        FROM hackathons h
+        LEFT JOIN participations p ON p.hackathon_id = h.id
+        GROUP BY h.id
+        HAVING h.participant_count != actual
+    """).fetchall()
+
+
+def rebuild_counters(conn):
+    """Пересчитать participant_count для всех хакатонов, вернуть число исправленных строк"""
+    with conn:
+        return conn.execute("""
+            UPDATE hackathons SET participant_count = (
+                SELECT COUNT(*) FROM participations p WHERE p.hackathon_id = hackathons.id
+            )
+            WHERE participant_count != (SELECT COUNT(*) FROM participations p WHERE p.hackathon_id = hackathons.id)
+        """).rowcount
+
+
+# Имена запросов для метрик: горячие запросы по имени из HOT_QUERIES, остальные по тексту
+QUERY_NAMES = {sql: name for name, (sql, _, _) in HOT_QUERIES.items()}
+
+
+def query_name(sql):
+    name = QUERY_NAMES.get(sql)
+    if name is None:
+        name = QUERY_NAMES[sql] = ' '.join(sql.split())[:80]
+    return name
+
+
+def _fetchone(conn, sql, params):
+    return conn.execute(sql, params).fetchone()
+
+
+def _fetchall(conn, sql, params):
+    return conn.execute(sql, params).fetchall()
+
+
+def _execute(conn, sql, params):
+    return conn.execute(sql, params).rowcount
+
+
+class Database:
+    """Слой доступа к данным: пул читающих соединений и один пишущий поток.
+
+    Все запросы выполняются вне event loop, поэтому медленный запрос одного
+    пользователя не блокирует обработку остальных чатов. С metrics время каждого
+    запроса (в потоке базы, для записи - вместе с фиксацией) попадает в гистограмму
+    по имени запроса или функции.
+    """
+
+    def __init__(self, path=DB_PATH, readers=4, metrics=None):
+        self.path = path
+        self.metrics = metrics
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._readers = ThreadPoolExecutor(readers, thread_name_prefix='db-read')
+        self._writer = ThreadPoolExecutor(1, thread_name_prefix='db-write')
+
+    def _connection(self, readonly):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = connect(self.path, readonly=readonly)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _read(self, fn, args, name):
+        if self.metrics is None:
+            return fn(self._connection(readonly=True), *args)
+        started = time.perf_counter()
+        error = True
+        try:
+            result = fn(self._connection(readonly=True), *args)
+            error = False
+            return result
+        finally:
+            elapsed = time.perf_counter() - started
+            self.metrics.observe_query(name or f'{fn.__module__}.{fn.__qualname__}', elapsed, error)
+
+    def _write(self, fn, args, name):
+        conn = self._connection(readonly=False)
+        started = time.perf_counter()
+        error = True
+        try:
+            result = fn(conn, *args)
+            conn.commit()
+            error = False
+            return result
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            if self.metrics is not None:
+                elapsed = time.perf_counter() - started
+                self.metrics.observe_query(name or f'{fn.__module__}.{fn.__qualname__}', elapsed, error)
+
+    async def read(self, fn, *args, name=None):
+        """Выполнить fn(conn, *args) на читающем соединении"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, self._read, fn, args, name)
+
+    async def write(self, fn, *args, name=None):
+        """Выполнить fn(conn, *args) в одной транзакции на пишущем соединении"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._writer, self._write, fn, args, name)
+
+    async def fetchone(self, sql, params=()):
+        return await self.read(_fetchone, sql, params, name=query_name(sql))
+
+    async def fetchall(self, sql, params=()):
+        return await self.read(_fetchall, sql, params, name=query_name(sql))
+
+    async def execute(self, sql, params=()):
+        return await self.write(_execute, sql, params, name=query_name(sql))
+
+    def close(self):
+        self._readers.shutdown(wait=True)
+        self._writer.shutdown(wait=True)
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+
+async def open_database(application) -> None:
+    """post_init: приложение владеет пулом соединений на всё время работы; метрики - из bot_data['metrics']"""
+    application.bot_data['db'] = Database(metrics=application.bot_data.get('metrics'))
+
+
+async def close_database(application) -> None:
+    """post_shutdown: закрыть пул соединений"""
+    db = application.bot_data.pop('db', None)
+    if db is not None:
+        db.close()
+
+
+if __name__ == '__main__':
+    import argparse
+    import logging
+
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    logger = logging.getLogger(__name__)
+
+    parser = argparse.ArgumentParser(description='Обслуживание базы данных бота')
+    parser.add_argument('command', choices=['migrate', 'verify-counters', 'rebuild-counters'])
+    args = parser.parse_args()
+
+    setup_database()
+    conn = connect()
+    if args.command == 'verify-counters':
+        drift = counter_drift(conn)
+        for hackathon_id, stored, actual in drift:
+            logger.warning("Hackathon %s: participant_count=%s, actual=%s", hackathon_id, stored, actual)
+        logger.info("Counters checked, %s drifted", len(drift))
+        conn.close()
+        raise SystemExit(1 if drift else 0)
+    elif args.command == 'rebuild-counters':
+        logger.info("Counters rebuilt, %s fixed", rebuild_counters(conn))
+    conn.close()
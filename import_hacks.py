@@ -1,82 +1,197 @@
 import csv
-import sqlite3
+import hashlib
 import logging
+import os
+import sys
+import time
+from itertools import islice
+
+import config
+from db import DB_PATH, connect, setup_database
+from schedule import parse_schedule
 
 # Set up logging
 logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def setup_database():
-    conn = sqlite3.connect('bot_database.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS hackathons (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT,
-        prizes TEXT,
-        registration TEXT,
-        duration TEXT,
-        link TEXT,
-        telegram_chat TEXT,
-        comments TEXT
-    )
-    ''')
-    
-    conn.commit()
-    conn.close()
-
-def import_hackathons(csv_file_path):
-    setup_database()  # Ensure the table exists
-
-    conn = sqlite3.connect('bot_database.db')
-    cursor = conn.cursor()
+BATCH_SIZE = 1000
+
+# CSV header -> hackathons column, in insert order
+CSV_COLUMNS = {
+    'Название': 'name',
+    'Призы': 'prizes',
+    'Регистрация': 'registration',
+    'Длительность': 'duration',
+    'Ссылка': 'link',
+    'Telegram чат': 'telegram_chat',
+    'Комментарии': 'comments',
+}
+
+UPSERT_SQL = '''
+INSERT INTO hackathons (name, prizes, registration, duration, link, telegram_chat, comments, content_hash,
+                        starts_at, ends_at, registration_deadline)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(name) DO UPDATE SET
+    prizes = excluded.prizes,
+    registration = excluded.registration,
+    duration = excluded.duration,
+    link = excluded.link,
+    telegram_chat = excluded.telegram_chat,
+    comments = excluded.comments,
+    content_hash = excluded.content_hash,
+    starts_at = excluded.starts_at,
+    ends_at = excluded.ends_at,
+    registration_deadline = excluded.registration_deadline,
+    archived_at = NULL
+'''
+
+# Hackathons gone from the CSV are archived: users' sign-ups and participant lists are kept
+ARCHIVE_SQL = '''
+UPDATE hackathons SET archived_at = ? WHERE id = ?
+'''
+
+# Archiving more than this share of the imported hackathons at once needs --force:
+# a truncated or half-written export would otherwise empty the catalogue
+MAX_REMOVED_SHARE = 0.5
+
+def read_hackathons(csv_file_path):
+    """Stream normalized hackathon rows from the spreadsheet export"""
+    with open(csv_file_path, 'r', encoding='utf-8', newline='') as csv_file:
+        for row in csv.DictReader(csv_file):
+            # Skip empty rows or rows with no name
+            if not (row['Название'] or '').strip():
+                continue
+            yield tuple(row[header] for header in CSV_COLUMNS)
+
+def row_hash(row):
+    return hashlib.blake2b('\x1f'.join(value or '' for value in row).encode('utf-8'), digest_size=8).hexdigest()
+
+def file_hash(path):
+    digest = hashlib.blake2b()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def batched(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+def diff_rows(rows, existing, seen, summary):
+    """Yield only added or changed rows with their hash.
+
+    `existing` maps name -> stored content hash, `seen` collects name -> hash of every CSV row.
+    """
+    for row in rows:
+        name, content_hash = row[0], row_hash(row)
+        if name in seen:
+            # Duplicate name in the CSV: the last row wins, as with a plain upsert
+            if seen[name] != content_hash:
+                if name in existing and seen[name] == existing[name]:
+                    summary['unchanged'] -= 1
+                    summary['changed'] += 1
+                seen[name] = content_hash
+                yield row + (content_hash,)
+            continue
+
+        seen[name] = content_hash
+        if name not in existing:
+            summary['added'] += 1
+        elif existing[name] != content_hash:
+            summary['changed'] += 1
+        else:
+            summary['unchanged'] += 1
+            continue
+        yield row + (content_hash,)
+
+def with_schedule(rows):
+    """Append parsed start, end and registration deadline; the raw text is kept as is.
+
+    Hackathons without a recognizable deadline are not listed as open in the bot.
+    """
+    for row in rows:
+        schedule = parse_schedule(row[2], row[3])
+        if schedule[2] is None:
+            logger.warning("Registration deadline not recognized for %r: %r", row[0], row[2])
+        yield row + schedule
+
+def import_hackathons(csv_file_path, db_path=DB_PATH, force=False):
+    """Apply only added, changed and removed hackathons from the CSV in a single transaction.
+
+    The whole file is skipped when its fingerprint (mtime, size, content hash) matches
+    the last import. Removed hackathons are archived; a file without rows, or one that
+    removes more than MAX_REMOVED_SHARE of them without force, is rejected as a whole.
+    Returns the diff summary, or None if the import failed.
+    """
+    setup_database(db_path)  # Ensure the schema is up to date
+
+    summary = {'added': 0, 'changed': 0, 'removed': 0, 'unchanged': 0, 'skipped': False}
+    fingerprint_key = f'import_fingerprint:{os.path.abspath(csv_file_path)}'
+    conn = connect(db_path)
 
     try:
-        with open(csv_file_path, 'r', encoding='utf-8') as csv_file:
-            csv_reader = csv.DictReader(csv_file)
-            for row in csv_reader:
-                # Skip empty rows or rows with no name
-                if not row['Название']:
+        stat = os.stat(csv_file_path)
+        row = conn.execute("SELECT value FROM metadata WHERE key = ?", (fingerprint_key,)).fetchone()
+        mtime, size, digest = row[0].split(':') if row else (None, None, None)
+        if not force and (mtime, size) == (str(stat.st_mtime_ns), str(stat.st_size)):
+            summary['skipped'] = True
+        else:
+            content = file_hash(csv_file_path)
+            fingerprint = f'{stat.st_mtime_ns}:{stat.st_size}:{content}'
+            if not force and content == digest:
+                # Touched but identical: remember the new mtime so the next run skips hashing
+                with conn:
+                    conn.execute("UPDATE metadata SET value = ? WHERE key = ?", (fingerprint, fingerprint_key))
+                summary['skipped'] = True
+
+        if summary['skipped']:
+            logger.info("Hackathon import skipped: %s is unchanged", csv_file_path)
+            return summary
+
+        with conn:
+            existing = {}
+            ids = {}
+            for hackathon_id, name, content_hash, archived_at in conn.execute(
+                    "SELECT id, name, content_hash, archived_at FROM hackathons WHERE name IS NOT NULL"):
+                if archived_at is not None:
+                    # Back in the CSV: counted as added, the upsert clears archived_at
                     continue
+                existing[name] = content_hash
+                ids[name] = (hackathon_id, content_hash is not None)
+
+            seen = {}
+            changes = with_schedule(diff_rows(read_hackathons(csv_file_path), existing, seen, summary))
+            for batch in batched(changes, BATCH_SIZE):
+                conn.executemany(UPSERT_SQL, batch)
+
+            # Only hackathons that came from the CSV are removed, manual entries have no hash
+            imported = [(name, hackathon_id) for name, (hackathon_id, from_csv) in ids.items() if from_csv]
+            removed = [(int(time.time()), hackathon_id) for name, hackathon_id in imported if name not in seen]
+            if removed and not seen:
+                raise ValueError(f"{csv_file_path} has no hackathon rows, refusing to remove all "
+                                 f"{len(removed)} imported hackathons")
+            if not force and len(removed) > MAX_REMOVED_SHARE * len(imported):
+                raise ValueError(f"{csv_file_path} would remove {len(removed)} of {len(imported)} imported "
+                                 f"hackathons, rerun with --force if this is intended")
+            conn.executemany(ARCHIVE_SQL, removed)
+            summary['removed'] = len(removed)
 
-                # Check if the hackathon already exists
-                cursor.execute("SELECT id FROM hackathons WHERE name = ?", (row['Название'],))
-                existing_hackathon = cursor.fetchone()
-
-                if existing_hackathon:
-                    # Update existing hackathon
-                    cursor.execute('''
-                    UPDATE hackathons
-                    SET prizes = ?, registration = ?, duration = ?, link = ?, telegram_chat = ?, comments = ?
-                    WHERE name = ?
-                    ''', (
-                        row['Призы'], row['Регистрация'], row['Длительность'],
-                        row['Ссылка'], row['Telegram чат'], row['Комментарии'],
-                        row['Название']
-                    ))
-                    logger.info(f"Updated hackathon: {row['Название']}")
-                else:
-                    # Insert new hackathon
-                    cursor.execute('''
-                    INSERT INTO hackathons (name, prizes, registration, duration, link, telegram_chat, comments)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        row['Название'], row['Призы'], row['Регистрация'], row['Длительность'],
-                        row['Ссылка'], row['Telegram чат'], row['Комментарии']
-                    ))
-                    logger.info(f"Inserted new hackathon: {row['Название']}")
-
-        conn.commit()
-        logger.info("Hackathon import completed successfully")
+            conn.execute("INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)", (fingerprint_key, fingerprint))
+
+        logger.info("Hackathon import completed successfully: %(added)s added, %(changed)s changed, "
+                    "%(removed)s removed, %(unchanged)s unchanged", summary)
 
     except Exception as e:
-        conn.rollback()
-        logger.error(f"Error importing hackathons: {str(e)}")
+        logger.error("Error importing hackathons: %s", e)
+        summary = None
 
     finally:
         conn.close()
 
+    return summary
+
 if __name__ == '__main__':
-    csv_file_path = '/home/dukhanin/com_bot/main/Community_bot/Copy of agi in 2024 - хакатоны.csv'
-    import_hackathons(csv_file_path)
\ No newline at end of file
+    default_path = config.CATALOGUE_CSV or 'Copy of agi in 2024 - хакатоны.csv'
+    csv_file_path = sys.argv[1] if len(sys.argv) > 1 and not sys.argv[1].startswith('--') else default_path
+    sys.exit(0 if import_hackathons(csv_file_path, force='--force' in sys.argv) is not None else 1)
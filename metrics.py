@@ -0,0 +1,209 @@
+import asyncio
+import functools
+import logging
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм, с: от долей миллисекунды (запрос SQLite) до секунд (ответ Bot API)
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Распределение длительностей по фиксированным корзинам BUCKETS и переполнению.
+
+    Запись под блокировкой: запросы к базе измеряются в её потоках.
+    """
+
+    __slots__ = ('counts', 'count', 'sum', 'errors', '_lock')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, error=False):
+        index = bisect_left(BUCKETS, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += seconds
+            if error:
+                self.errors += 1
+
+    def quantile(self, q):
+        """Оценка квантиля линейной интерполяцией внутри корзины, с"""
+        with self._lock:
+            counts, count = list(self.counts), self.count
+        if not count:
+            return 0.0
+        rank = q * count
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = BUCKETS[index - 1] if index else 0.0
+                upper = BUCKETS[index] if index < len(BUCKETS) else BUCKETS[-1] * 2
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return BUCKETS[-1]
+
+
+class Timer:
+    """Контекстный менеджер: время блока и исключение из него попадают в гистограмму"""
+
+    __slots__ = ('histogram', 'started')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        error = exc_type is not None and not issubclass(exc_type, asyncio.CancelledError)
+        self.histogram.observe(time.perf_counter() - self.started, error)
+
+
+class Metrics:
+    """Гистограммы времени обработчиков (по маршрутам) и запросов SQL (по именам).
+
+    slow_query - порог в секундах, выше которого запрос пишется в лог (0 - не писать).
+    """
+
+    def __init__(self, slow_query=0.0):
+        self.slow_query = slow_query
+        self.slow_queries = 0
+        self.handlers = {}
+        self.queries = {}
+        # Показатели подсистем: префикс -> (заголовок, read() -> {имя: число}, имена счётчиков)
+        self.gauges = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def _histogram(self, family, name):
+        histogram = family.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = family.setdefault(name, Histogram())
+        return histogram
+
+    def add_gauges(self, prefix, title, read, counters=()):
+        """Показатели подсистемы: read() читается при каждой сводке и выдаче метрик.
+
+        Имена из counters растут монотонно и экспортируются как счётчики (_total),
+        остальные - как текущие значения.
+        """
+        self.gauges[prefix] = (title, read, frozenset(counters))
+
+    def time_handler(self, route):
+        """with metrics.time_handler(route): ... - время обработки обновления"""
+        return Timer(self._histogram(self.handlers, route))
+
+    def observe_query(self, name, seconds, error=False):
+        self._histogram(self.queries, name).observe(seconds, error)
+        if self.slow_query and seconds >= self.slow_query:
+            self.slow_queries += 1
+            logger.warning("Медленный запрос %s: %.1f мс", name, seconds * 1000)
+
+    def summary(self, limit=15):
+        """Текстовая сводка для /stats: самые частые маршруты и запросы с квантилями в мс"""
+        lines = [f"Метрики за {(time.time() - self.started) / 3600:.1f} ч"]
+        for title, family in (("Обработчики", self.handlers), ("SQL", self.queries)):
+            lines.append(f"\n{title} (число, ошибки, p50/p95/p99 мс):")
+            top = sorted(((name, histogram) for name, histogram in family.items() if histogram.count),
+                         key=lambda item: item[1].count, reverse=True)[:limit]
+            for name, histogram in top:
+                p50, p95, p99 = (histogram.quantile(q) * 1000 for q in (0.5, 0.95, 0.99))
+                lines.append(f"{name}: {histogram.count}, {histogram.errors}, {p50:.1f}/{p95:.1f}/{p99:.1f}")
+            if len(family) > limit:
+                lines.append(f"...и еще {len(family) - limit}")
+        if self.slow_query:
+            lines.append(f"\nМедленных запросов (от {self.slow_query * 1000:.0f} мс): {self.slow_queries}")
+        for title, read, _ in self.gauges.values():
+            lines.append(f"\n{title}:")
+            lines.extend(f"{name}: {value:.3f}" if isinstance(value, float) else f"{name}: {value}"
+                         for name, value in read().items())
+        return "\n".join(lines)
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus"""
+        lines = []
+        for metric, label, family in (('bot_handler_seconds', 'route', self.handlers),
+                                      ('bot_query_seconds', 'query', self.queries)):
+            lines.append(f"# TYPE {metric} histogram")
+            errors = []
+            for name, histogram in sorted(family.items()):
+                with histogram._lock:
+                    counts, count = list(histogram.counts), histogram.count
+                    total, failed = histogram.sum, histogram.errors
+                value = escape(name)
+                cumulative = 0
+                for bound, bucket_count in zip(BUCKETS, counts):
+                    cumulative += bucket_count
+                    lines.append(f'{metric}_bucket{{{label}="{value}",le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_bucket{{{label}="{value}",le="+Inf"}} {count}')
+                lines.append(f'{metric}_sum{{{label}="{value}"}} {total}')
+                lines.append(f'{metric}_count{{{label}="{value}"}} {count}')
+                errors.append(f'{metric[:-len("_seconds")]}_errors_total{{{label}="{value}"}} {failed}')
+            lines.append(f"# TYPE {metric[:-len('_seconds')]}_errors_total counter")
+            lines.extend(errors)
+        lines.append("# TYPE bot_slow_queries_total counter")
+        lines.append(f"bot_slow_queries_total {self.slow_queries}")
+        for prefix, (_, read, counters) in sorted(self.gauges.items()):
+            for name, value in read().items():
+                if name in counters:
+                    metric, kind = f"bot_{prefix}_{name}_total", "counter"
+                else:
+                    metric, kind = f"bot_{prefix}_{name}", "gauge"
+                lines.append(f"# TYPE {metric} {kind}")
+                lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host='127.0.0.1'):
+        """Отдавать render() по HTTP GET /metrics в фоновом потоке; вернуть сервер для shutdown()"""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+                data = metrics.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+        return server
+
+
+def escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# Метрики процесса: обработчики размечаются при импорте bot.py
+METRICS = Metrics()
+
+
+def timed(route):
+    """Декоратор обработчика: время и ошибки каждого вызова в METRICS под именем route"""
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(*args, **kwargs):
+            with METRICS.time_handler(route):
+                return await handler(*args, **kwargs)
+        return wrapper
+    return decorator
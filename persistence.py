@@ -0,0 +1,255 @@
+import asyncio
+import struct
+import time
+from collections import OrderedDict
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from db import SESSION_DELETE_SQL, SESSION_EXPIRE_SQL, SESSION_LOAD_SQL, SESSION_SAVE_SQL
+
+# Упакованное состояние диалога: версия формата, флаги, хакатон, число участников, номер участника
+SESSION_FORMAT = struct.Struct('<BBqii')
+SESSION_VERSION = 1
+EXPECTING_PROFILE = 1
+BROWSING_PARTICIPANTS = 2
+EXPECTING_SEARCH = 4
+SEARCH_RESULTS = 8
+# Хвост состояния поиска: хакатон фильтра (0 - без фильтра), затем текст запроса в UTF-8
+SEARCH_FORMAT = struct.Struct('<q')
+
+# Как часто удалять из базы записи старше срока хранения, с
+EXPIRE_INTERVAL = 3600
+
+
+def pack_session(user_data):
+    """Упаковать состояние диалога в байты; None, если хранить нечего.
+
+    Сохраняются флаг ожидания профиля, курсор просмотра участников и запрос
+    поиска по навыкам. Окно предзагруженных профилей - это кэш, после загрузки
+    оно читается заново.
+    """
+    flags = 0
+    if user_data.get('expecting_profile'):
+        flags |= EXPECTING_PROFILE
+    if user_data.get('participants_hackathon') is not None:
+        flags |= BROWSING_PARTICIPANTS
+    if user_data.get('expecting_search'):
+        flags |= EXPECTING_SEARCH
+    if user_data.get('search_query'):
+        flags |= SEARCH_RESULTS
+    if not flags:
+        return None
+    state = SESSION_FORMAT.pack(SESSION_VERSION, flags, user_data.get('participants_hackathon') or 0,
+                                user_data.get('participants_total', 0), user_data.get('current_participant', 0))
+    if flags & (EXPECTING_SEARCH | SEARCH_RESULTS):
+        state += SEARCH_FORMAT.pack(user_data.get('search_hackathon') or 0)
+        state += user_data.get('search_query', '').encode()
+    return state
+
+
+def unpack_session(state):
+    """Восстановить user_data из упакованного состояния; неизвестный формат даёт пустой диалог"""
+    if len(state) < SESSION_FORMAT.size or state[0] != SESSION_VERSION:
+        return {}
+    _, flags, hackathon_id, total, current = SESSION_FORMAT.unpack_from(state)
+    user_data = {}
+    if flags & EXPECTING_PROFILE:
+        user_data['expecting_profile'] = True
+    if flags & BROWSING_PARTICIPANTS:
+        user_data.update(participants_hackathon=hackathon_id, participants_total=total,
+                         participants_offset=0, participants=[], current_participant=current)
+    if flags & (EXPECTING_SEARCH | SEARCH_RESULTS):
+        search_hackathon, = SEARCH_FORMAT.unpack_from(state, SESSION_FORMAT.size)
+        user_data['search_hackathon'] = search_hackathon or None
+        if flags & EXPECTING_SEARCH:
+            user_data['expecting_search'] = True
+        if flags & SEARCH_RESULTS:
+            user_data['search_query'] = bytes(state[SESSION_FORMAT.size + SEARCH_FORMAT.size:]).decode()
+    return user_data
+
+
+def save_sessions(conn, batch, touched, expire_before=None):
+    """Записать пачку состояний {user_id: state}; state None удаляет запись"""
+    conn.executemany(SESSION_SAVE_SQL, [(user_id, state, touched) for user_id, state in batch.items()
+                                        if state is not None])
+    conn.executemany(SESSION_DELETE_SQL, [(user_id,) for user_id, state in batch.items() if state is None])
+    if expire_before is not None:
+        conn.execute(SESSION_EXPIRE_SQL, (expire_before,))
+
+
+class SessionPersistence(BasePersistence):
+    """Хранение user_data в таблице sessions той же базы SQLite.
+
+    Состояние пользователя читается из базы при первом его обновлении после
+    запуска или выгрузки, а не целиком при старте. Application раз в
+    flush_interval секунд передаёт изменившиеся user_data; они упаковываются и
+    записываются одной транзакцией, неизменившиеся не пишутся. Пользователи без
+    обновлений дольше idle_ttl выгружаются из памяти приложения, поэтому память
+    зависит от числа активных пользователей, а не от всех, кто когда-либо писал боту.
+
+    Выгружаются только пользователи, чьи user_data приложение уже передало в
+    update_user_data после последнего обновления. Выгрузка идёт через
+    Application.drop_user_data, поэтому drop_user_data выгруженного пользователя
+    не удаляет его запись из базы.
+
+    Нужен OrderedApplication: базу и выгрузку даёт приложение, переданное в bind.
+    """
+
+    def __init__(self, flush_interval=5, idle_ttl=900, retention_days=30):
+        if idle_ttl < 2 * flush_interval:
+            raise ValueError("idle_ttl должен быть не меньше двух интервалов записи")
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=flush_interval,
+        )
+        self.idle_ttl = idle_ttl
+        self.retention = retention_days * 86400
+        self._application = None
+        # user_id -> (время последнего обновления, записанное состояние), от давних к недавним
+        self._resident = OrderedDict()
+        self._dirty = {}
+        # Пользователи с обновлениями, чьи user_data приложение ещё не передало в update_user_data
+        self._unflushed = set()
+        # Выгруженные пользователи, drop_user_data которых приложение ещё не вызвало
+        self._evicted = set()
+        self._write_lock = asyncio.Lock()
+        self._next_expiry = 0.0
+        self.loads = 0
+        self.writes = 0
+        self.evictions = 0
+
+    def bind(self, application):
+        """post_init: подключить базу (bot_data['db']) и приложение для выгрузки неактивных"""
+        self._application = application
+
+    @property
+    def _db(self):
+        return self._application.bot_data['db']
+
+    async def get_user_data(self):
+        # Состояние загружается по пользователю в refresh_user_data
+        return {}
+
+    async def refresh_user_data(self, user_id, user_data):
+        now = time.monotonic()
+        entry = self._resident.get(user_id)
+        if entry is None:
+            row = await self._db.fetchone(SESSION_LOAD_SQL, (user_id,))
+            state = row[0] if row else None
+            if state is not None and not user_data:
+                user_data.update(unpack_session(state))
+            self.loads += 1
+        else:
+            state = entry[1]
+            self._resident.move_to_end(user_id)
+        self._resident[user_id] = (now, state)
+        self._unflushed.add(user_id)
+        self._evict_idle(now)
+
+    def _evict_idle(self, now):
+        idle = []
+        while self._resident:
+            user_id, (seen, _) = next(iter(self._resident.items()))
+            if now - seen < self.idle_ttl:
+                break
+            self._resident.popitem(last=False)
+            # Несохранённые вернутся в _resident при передаче их user_data
+            if user_id not in self._unflushed:
+                idle.append(user_id)
+        if idle:
+            # Пропущенные приложением пользователи при следующем обновлении сохранят данные в памяти
+            evicted = self._application.evict_user_data(idle)
+            self._evicted.update(evicted)
+            self.evictions += len(evicted)
+
+    async def update_user_data(self, user_id, data):
+        self._unflushed.discard(user_id)
+        state = pack_session(data)
+        entry = self._resident.get(user_id)
+        if entry is None:
+            self._resident[user_id] = (time.monotonic(), state)
+        elif entry[1] == state:
+            return
+        else:
+            self._resident[user_id] = (entry[0], state)
+        self._dirty[user_id] = state
+        # update_persistence вызывает update_user_data всех изменившихся пользователей одновременно:
+        # уступаем цикл, чтобы остальные успели добавить свои записи, и пишем их одной транзакцией
+        await asyncio.sleep(0)
+        await self._write_dirty()
+
+    async def _write_dirty(self):
+        async with self._write_lock:
+            if not self._dirty or self._application is None:
+                return
+            batch, self._dirty = self._dirty, {}
+            expire_before = None
+            if self.retention and time.monotonic() >= self._next_expiry:
+                self._next_expiry = time.monotonic() + EXPIRE_INTERVAL
+                expire_before = int(time.time() - self.retention)
+            try:
+                await self._db.write(save_sessions, batch, int(time.time()), expire_before)
+            except Exception:
+                self._dirty = {**batch, **self._dirty}
+                raise
+            self.writes += len(batch)
+
+    async def drop_user_data(self, user_id):
+        if user_id in self._evicted:
+            self._evicted.discard(user_id)
+            # Application не передаёт изменения пользователя, удаляемого в том же цикле записи:
+            # вернувшийся после выгрузки пользователь запишется в следующем
+            if user_id in self._resident:
+                self._application.mark_data_for_update_persistence(user_ids=user_id)
+            return
+        self._resident.pop(user_id, None)
+        self._dirty.pop(user_id, None)
+        await self._db.execute(SESSION_DELETE_SQL, (user_id,))
+
+    async def flush(self):
+        await self._write_dirty()
+
+    def stats(self):
+        """Пользователи в памяти, ожидающие записи, загрузки, записи и выгрузки"""
+        return {
+            'resident': len(self._resident),
+            'dirty': len(self._dirty),
+            'loads': self.loads,
+            'writes': self.writes,
+            'evictions': self.evictions,
+        }
+
+    # Данные чатов, бота, callback_data и состояния ConversationHandler не хранятся
+
+    async def get_chat_data(self):
+        return {}
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name):
+        return {}
+
+    async def update_conversation(self, name, key, new_state):
+        pass
+
+    async def update_chat_data(self, chat_id, data):
+        pass
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_chat_data(self, chat_id):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
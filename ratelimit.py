@@ -0,0 +1,272 @@
+import asyncio
+import logging
+import multiprocessing
+import time
+from collections import deque
+from functools import partial
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Правки сообщений, которые можно схлопнуть: важна только последняя
+MERGEABLE_ENDPOINTS = {'editMessageText', 'editMessageReplyMarkup'}
+
+
+class TokenBucket:
+    """Корзина токенов с резервированием: acquire возвращает, сколько ждать до своего токена"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def pause(self, seconds):
+        """Сдвинуть выдачу токенов на seconds вперёд"""
+        self._refill(time.monotonic())
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+    def idle(self):
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity
+
+
+class SharedTokenBucket(TokenBucket):
+    """Корзина токенов в общей памяти процессов: один лимит бота на все процессы-обработчики.
+
+    Создаётся до запуска процессов в их контексте multiprocessing (context) и
+    передаётся им аргументом (workers.py); time.monotonic общий для процессов
+    одной машины.
+    """
+
+    def __init__(self, rate, capacity, context=multiprocessing):
+        self.rate = rate
+        self.capacity = capacity
+        self._state = context.RawArray('d', (capacity, time.monotonic()))
+        self._lock = context.Lock()
+
+    @property
+    def tokens(self):
+        return self._state[0]
+
+    @tokens.setter
+    def tokens(self, value):
+        self._state[0] = value
+
+    @property
+    def updated(self):
+        return self._state[1]
+
+    @updated.setter
+    def updated(self, value):
+        self._state[1] = value
+
+    def acquire(self):
+        with self._lock:
+            return super().acquire()
+
+    def pause(self, seconds):
+        with self._lock:
+            super().pause(seconds)
+
+    def idle(self):
+        with self._lock:
+            return super().idle()
+
+
+class PendingEdit:
+    """Правка сообщения в очереди ограничителя"""
+
+    __slots__ = ('result', 'superseded_by', 'sending')
+
+    def __init__(self):
+        self.result = asyncio.get_running_loop().create_future()
+        self.superseded_by = None
+        self.sending = False
+
+
+def follow_result(target, source):
+    """Done-колбэк source: перенести его результат в target.
+
+    Схлопнутая правка завершается вместе с правкой, которая её заменила. Та сама
+    может оказаться заменена позже, и тогда её result следует за следующей, так
+    что по цепочке все ожидающие получают результат последней отправленной правки.
+    """
+    if target.done():
+        return
+    if source.cancelled():
+        target.cancel()
+    elif source.exception() is not None:
+        target.set_exception(source.exception())
+        # Ошибку получает отправивший; ожидающих схлопнутой правки может не быть
+        target.exception()
+    else:
+        target.set_result(source.result())
+
+
+class TokenBucketRateLimiter(BaseRateLimiter):
+    """Ограничитель исходящих запросов к Bot API.
+
+    Сообщения в чат проходят через корзину чата (личный чат или группа, у групп
+    лимит в минуту), затем через общую корзину бота. Ответ 429 приостанавливает все
+    запросы на retry_after и повторяет запрос. Если правка сообщения ждёт очереди,
+    а для того же сообщения пришла более новая правка, старая не отправляется и
+    возвращает результат новой.
+
+    global_bucket - общая корзина бота, если его запросы отправляют несколько
+    процессов (SharedTokenBucket); по умолчанию своя корзина на global_rate.
+    """
+
+    def __init__(self, global_rate=30, chat_rate=1, chat_burst=3, group_per_minute=20, max_retries=3,
+                 global_bucket=None):
+        # Без всплеска: Telegram считает сообщения бота в скользящем окне
+        self.global_bucket = global_bucket or TokenBucket(global_rate, 1)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_per_minute = group_per_minute
+        self.max_retries = max_retries
+        self._chats = {}
+        self._latest_edits = {}
+        self._paused_at = 0.0
+        self._paused_until = 0.0
+        self._waits = deque(maxlen=1000)
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.requests = 0
+        self.merged_edits = 0
+        self.retries = 0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) > 10000:
+                self._chats = {key: value for key, value in self._chats.items() if not value.idle()}
+            if str(chat_id).startswith('-'):
+                bucket = TokenBucket(self.group_per_minute / 60, self.group_per_minute)
+            else:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    async def _wait_turn(self, chat_id, edit=None):
+        """Дождаться токенов чата и бота; правка, которую заменила более новая, токен бота не берёт"""
+        delay = self._chat_bucket(chat_id).acquire()
+        if delay:
+            await asyncio.sleep(delay)
+        if edit is not None and edit.superseded_by is not None:
+            return
+        delay = self.global_bucket.acquire()
+        slot = time.monotonic() + delay
+        if delay:
+            await asyncio.sleep(delay)
+        while True:
+            now = time.monotonic()
+            if now >= self._paused_until:
+                return
+            # Пока ждали, пришел 429: корзина бота уже сдвинута на паузу, а полученный токен
+            # сдвигается на ту же паузу, сохраняя очередь и интервалы между запросами
+            slot = self._paused_until + max(0.0, slot - self._paused_at)
+            await asyncio.sleep(slot - now)
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get('chat_id')
+        if chat_id is None:
+            return await callback(*args, **kwargs)
+
+        edit = None
+        if endpoint in MERGEABLE_ENDPOINTS and data.get('message_id') is not None:
+            edit_key = (chat_id, data['message_id'])
+            edit = PendingEdit()
+            previous = self._latest_edits.get(edit_key)
+            if previous is not None and not previous.sending:
+                previous.superseded_by = edit
+            self._latest_edits[edit_key] = edit
+
+        self.requests += 1
+        self.queue_depth += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        started = time.monotonic()
+        try:
+            await self._wait_turn(chat_id, edit)
+        finally:
+            self.queue_depth -= 1
+            self._waits.append(time.monotonic() - started)
+
+        if edit is None:
+            return await self._send(callback, args, kwargs, endpoint, chat_id)
+
+        try:
+            if edit.superseded_by is not None:
+                # Пока правка ждала очереди, пришла более новая правка того же сообщения
+                self.merged_edits += 1
+                latest = edit.superseded_by
+                while latest.superseded_by is not None:
+                    latest = latest.superseded_by
+                # Те, кто уже ждёт эту правку, ждут и ту, что её заменила
+                latest.result.add_done_callback(partial(follow_result, edit.result))
+                return await asyncio.shield(latest.result)
+
+            edit.sending = True
+            try:
+                result = await self._send(callback, args, kwargs, endpoint, chat_id)
+            except asyncio.CancelledError:
+                # Отправивший отменён: схлопнутые правки не должны ждать вечно
+                edit.result.cancel()
+                raise
+            except Exception as exc:
+                edit.result.set_exception(exc)
+                # Ошибку получает сам вызывающий; ожидающих схлопнутых правок может не быть
+                edit.result.exception()
+                raise
+            edit.result.set_result(result)
+            return result
+        finally:
+            if self._latest_edits.get(edit_key) is edit:
+                del self._latest_edits[edit_key]
+
+    async def _send(self, callback, args, kwargs, endpoint, chat_id):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as exc:
+                if attempt == self.max_retries:
+                    raise
+                self.retries += 1
+                if time.monotonic() + exc.retry_after > self._paused_until:
+                    self._paused_at = time.monotonic()
+                    self._paused_until = self._paused_at + exc.retry_after
+                    self.global_bucket.pause(exc.retry_after)
+                logger.warning("Bot API 429 на %s, пауза %s с", endpoint, exc.retry_after)
+                await self._wait_turn(chat_id)
+
+    def stats(self):
+        """Глубина очереди, число запросов, повторов и схлопнутых правок, время ожидания (с)"""
+        waits = sorted(self._waits)
+        return {
+            'queue_depth': self.queue_depth,
+            'max_queue_depth': self.max_queue_depth,
+            'requests': self.requests,
+            'retries': self.retries,
+            'merged_edits': self.merged_edits,
+            'wait_p50': waits[len(waits) // 2] if waits else 0.0,
+            'wait_p99': waits[int(len(waits) * 0.99)] if waits else 0.0,
+            'wait_max': waits[-1] if waits else 0.0,
+        }
@@ -0,0 +1,268 @@
+import asyncio
+import logging
+import math
+from collections import Counter
+
+try:
+    import numpy as np
+except ImportError:  # рекомендации отключаются, остальной бот работает без NumPy
+    np = None
+
+from db import HACKATHON_MEMBERS_SQL, PROFILES_SQL
+from search import TOKEN_RE, fold
+
+logger = logging.getLogger(__name__)
+
+# Вес общих с пользователем навыков относительно новых: новые важнее, общие отличают людей из той же области
+SIMILARITY_WEIGHT = 0.5
+
+# Когда мусор от перезаписанных профилей занимает больше этой доли буферов, они уплотняются
+COMPACT_RATIO = 0.5
+
+
+def skill_terms(profile):
+    """Слова профиля с числом повторов, без первой строки (по шаблону профиля это имя) и без чисел"""
+    lines = profile.splitlines()
+    if len(lines) > 1:
+        lines = lines[1:]
+    return Counter(word for word in TOKEN_RE.findall(fold(' '.join(lines)).lower()) if not word.isdigit())
+
+
+class SkillIndex:
+    """TF-IDF векторы навыков всех профилей в разреженном виде на массивах NumPy.
+
+    Строка профиля - отрезок [starts[slot], ends[slot]) в буферах indices (номер
+    слова) и tf (1 + log частоты). Частоты слов по профилям (df) ведутся
+    инкрементально, а idf применяется при запросе, поэтому изменение одного
+    профиля - это дописывание его строки в конец буферов без пересчёта остальных.
+    Старая строка обнуляется и остаётся мусором до уплотнения.
+
+    Кандидат оценивается как сумма весов его слов, которых нет у пользователя
+    (что он добавит в команду), плюс SIMILARITY_WEIGHT * косинусная близость.
+    """
+
+    def __init__(self):
+        self.vocabulary = {}
+        self.terms = []
+        self.df = np.zeros(1024, dtype=np.int64)
+        self.slots = {}
+        self.user_ids = np.zeros(1024, dtype=np.int64)
+        self.starts = np.zeros(1024, dtype=np.int64)
+        self.ends = np.zeros(1024, dtype=np.int64)
+        self.indices = np.zeros(16384, dtype=np.intp)
+        self.tf = np.zeros(16384, dtype=np.float32)
+        self.rows = np.zeros(16384, dtype=np.intp)
+        self.size = 0
+        self.garbage = 0
+        self._scratch = np.zeros(1024, dtype=np.float32)
+
+    @classmethod
+    def load(cls, conn):
+        """Построить индекс по всем профилям базы (выполняется в потоке читателя)"""
+        index = cls()
+        index.extend(conn.execute(PROFILES_SQL))
+        return index
+
+    def __len__(self):
+        return len(self.slots)
+
+    @staticmethod
+    def _grow(array, needed):
+        if needed <= len(array):
+            return array
+        grown = np.zeros(max(needed, 2 * len(array)), dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def _term_ids(self, counts):
+        ids = []
+        for term in counts:
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                term_id = self.vocabulary[term] = len(self.terms)
+                self.terms.append(term)
+            ids.append(term_id)
+        self.df = self._grow(self.df, len(self.terms))
+        self._scratch = self._grow(self._scratch, len(self.terms))
+        return ids
+
+    def extend(self, profiles):
+        """Добавить или заменить пачку профилей (user_id, текст) одной записью в буферы"""
+        profiles = dict(profiles)
+        for user_id in profiles:
+            self.remove(user_id)
+        indices, tf, rows, lengths = [], [], [], []
+        for user_id, profile in profiles.items():
+            counts = skill_terms(profile or '')
+            slot = self.slots[user_id] = len(self.slots)
+            self.user_ids = self._grow(self.user_ids, slot + 1)
+            self.starts = self._grow(self.starts, slot + 1)
+            self.ends = self._grow(self.ends, slot + 1)
+            self.user_ids[slot] = user_id
+            indices += self._term_ids(counts)
+            tf += [1 + math.log(count) for count in counts.values()]
+            rows += [slot] * len(counts)
+            lengths.append((slot, len(counts)))
+        if not lengths:
+            return
+
+        end = self.size + len(indices)
+        self.indices = self._grow(self.indices, end)
+        self.tf = self._grow(self.tf, end)
+        self.rows = self._grow(self.rows, end)
+        self.indices[self.size:end] = indices
+        self.tf[self.size:end] = tf
+        self.rows[self.size:end] = rows
+        self.df[:len(self.terms)] += np.bincount(np.asarray(indices, dtype=np.int64), minlength=len(self.terms))
+        position = self.size
+        for slot, length in lengths:
+            self.starts[slot] = position
+            self.ends[slot] = position = position + length
+        self.size = end
+
+    def update(self, user_id, profile):
+        """Пересчитать вектор одного профиля после save_profile"""
+        self.extend([(user_id, profile)])
+        if self.garbage > COMPACT_RATIO * self.size:
+            self.compact()
+
+    def remove(self, user_id):
+        slot = self.slots.pop(user_id, None)
+        if slot is None:
+            return
+        start, end = self.starts[slot], self.ends[slot]
+        np.subtract.at(self.df, self.indices[start:end], 1)
+        self.tf[start:end] = 0
+        self.garbage += end - start
+        # Освободившийся слот занимает последний, чтобы слоты шли подряд
+        last = len(self.slots)
+        if slot != last:
+            moved = int(self.user_ids[last])
+            self.slots[moved] = slot
+            self.user_ids[slot] = moved
+            self.starts[slot], self.ends[slot] = self.starts[last], self.ends[last]
+            self.rows[self.starts[slot]:self.ends[slot]] = slot
+        self.starts[last] = self.ends[last] = 0
+
+    def compact(self):
+        """Переписать буферы без строк заменённых и удалённых профилей"""
+        count = len(self.slots)
+        positions = self._positions(np.arange(count))
+        lengths = self.ends[:count] - self.starts[:count]
+        self.indices = self.indices[positions].copy()
+        self.tf = self.tf[positions].copy()
+        self.rows = np.repeat(np.arange(count), lengths)
+        self.ends[:count] = np.cumsum(lengths)
+        self.starts[:count] = self.ends[:count] - lengths
+        self.size = len(positions)
+        self.garbage = 0
+
+    def _positions(self, slots):
+        """Позиции в буферах всех слов профилей slots, подряд по профилям"""
+        starts, lengths = self.starts[slots], self.ends[slots] - self.starts[slots]
+        offsets = np.cumsum(lengths) - lengths
+        return np.repeat(starts - offsets, lengths) + np.arange(lengths.sum())
+
+    def _idf(self):
+        """idf всех слов словаря для текущих частот"""
+        count = len(self.terms)
+        return (np.log((1 + len(self.slots)) / (1 + self.df[:count])) + 1).astype(np.float32)
+
+    def recommend(self, user_id, candidates=None, k=5):
+        """До k пар (user_id, оценка) кандидатов, лучше всего дополняющих пользователя.
+
+        candidates - id участников, среди которых выбирать; None - все профили.
+        Пустой список, если у пользователя нет профиля.
+        """
+        slot = self.slots.get(user_id)
+        if slot is None:
+            return []
+        if candidates is None:
+            slots = np.arange(len(self.slots))
+            positions = slice(0, self.size)
+            rows = self.rows[:self.size]
+        else:
+            slots = np.fromiter((self.slots[c] for c in candidates if c in self.slots), dtype=np.int64)
+            positions = self._positions(slots)
+            rows = np.repeat(np.arange(len(slots)), self.ends[slots] - self.starts[slots])
+        if not len(slots):
+            return []
+
+        idf = self._idf()
+        user_indices = self.indices[self.starts[slot]:self.ends[slot]]
+        user_weights = self.tf[self.starts[slot]:self.ends[slot]] * idf[user_indices]
+        user_norm = np.linalg.norm(user_weights)
+        # Вклад слова кандидата на единицу tf: новое для пользователя слово - его idf целиком,
+        # общее - SIMILARITY_WEIGHT * idf * вес слова в нормированном векторе пользователя
+        coefficients = idf.copy()
+        coefficients[user_indices] = SIMILARITY_WEIGHT * idf[user_indices] * user_weights / (user_norm or 1)
+
+        indices, tf = self.indices[positions], self.tf[positions]
+        weights = tf * idf[indices]
+        # Строки мусора могут ссылаться на освободившиеся слоты за концом: их веса нулевые
+        count = len(slots)
+        norms = np.sqrt(np.bincount(rows, weights * weights, minlength=count)[:count])
+        totals = np.bincount(rows, tf * coefficients[indices], minlength=count)[:count]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scores = totals / norms
+        scores[(norms == 0) | (slots == slot)] = -np.inf
+        k = min(k, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return []
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(int(self.user_ids[slots[i]]), float(scores[i])) for i in best]
+
+    def new_skills(self, user_id, candidate_id, limit=3):
+        """Слова кандидата с наибольшим весом, которых нет в профиле пользователя"""
+        candidate = self.slots.get(candidate_id)
+        if candidate is None:
+            return []
+        indices = self.indices[self.starts[candidate]:self.ends[candidate]]
+        weights = self.tf[self.starts[candidate]:self.ends[candidate]] * self._idf()[indices]
+        slot = self.slots.get(user_id)
+        if slot is not None:
+            own = self.indices[self.starts[slot]:self.ends[slot]]
+            weights = np.where(np.isin(indices, own), 0, weights)
+        order = np.argsort(-weights)[:limit]
+        return [self.terms[indices[i]] for i in order if weights[i] > 0]
+
+
+class Recommender:
+    """Индекс навыков бота: строится в фоне при запуске, дальше обновляется по save_profile"""
+
+    def __init__(self, db):
+        self.db = db
+        self.index = None
+        self._loading = None
+        self._pending = {}
+
+    def start(self):
+        """Начать построение индекса в потоке читателя базы"""
+        if self._loading is None:
+            self._loading = asyncio.ensure_future(self._load())
+        return self._loading
+
+    async def _load(self):
+        index = await self.db.read(SkillIndex.load)
+        # Профили, сохранённые во время построения, могли не попасть в снимок базы
+        index.extend(self._pending.items())
+        self._pending.clear()
+        self.index = index
+        logger.info("Индекс навыков построен: %s профилей, %s слов", len(index), len(index.terms))
+
+    def update(self, user_id, profile):
+        if self.index is None:
+            self._pending[user_id] = profile
+        else:
+            self.index.update(user_id, profile)
+
+    async def recommend(self, user_id, hackathon_id, k=5):
+        """Лучшие кандидаты среди участников хакатона: [(user_id, новые навыки)]; None без профиля"""
+        await self.start()
+        if user_id not in self.index.slots:
+            return None
+        members = await self.db.fetchall(HACKATHON_MEMBERS_SQL, (hackathon_id,))
+        best = self.index.recommend(user_id, [member for member, in members], k)
+        return [(candidate, self.index.new_skills(user_id, candidate)) for candidate, _ in best]
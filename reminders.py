@@ -0,0 +1,86 @@
+import asyncio
+import logging
+import time
+
+from telegram.error import BadRequest, Forbidden
+
+from db import REMINDER_CLAIM_SQL, REMINDER_RELEASE_SQL, REMINDERS_DUE_SQL
+
+logger = logging.getLogger(__name__)
+
+# Виды напоминаний, как в REMINDERS_DUE_SQL
+REGISTRATION = 0
+START = 1
+
+
+def claim(conn, reminders, sent_at):
+    conn.executemany(REMINDER_CLAIM_SQL, [reminder + (sent_at,) for reminder in reminders])
+
+
+def release(conn, reminders):
+    conn.executemany(REMINDER_RELEASE_SQL, reminders)
+
+
+class ReminderScheduler:
+    """Напоминания участникам о дедлайне регистрации и начале хакатона.
+
+    Вместо задачи JobQueue на каждого участника одна повторяющаяся задача раз в
+    тик выбирает из базы до batch_size наступивших напоминаний одним запросом
+    (REMINDERS_DUE_SQL) и рассылает их через send(user_id, hackathon_id, kind, at),
+    то есть через ограничитель исходящих запросов бота. Напоминания отмечаются в
+    reminders_sent перед отправкой, пачками по chunk_size: после перезапуска
+    отправленное не повторяется, а при падении теряется не больше одной пачки.
+    Временные ошибки снимают отметку, и напоминание уходит в следующий тик;
+    пользователь, заблокировавший бота, повторно не беспокоится.
+    """
+
+    def __init__(self, db, send, registration_lead=86400, start_lead=86400, batch_size=1000, chunk_size=30,
+                 clock=time.time):
+        self.db = db
+        self.send = send
+        self.registration_lead = registration_lead
+        self.start_lead = start_lead
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.clock = clock
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+
+    async def tick(self, now=None):
+        """Разослать наступившие напоминания; вернуть число выбранных из базы"""
+        now = int(self.clock() if now is None else now)
+        due = await self.db.fetchall(REMINDERS_DUE_SQL, {
+            'now': now, 'registration_lead': self.registration_lead, 'start_lead': self.start_lead,
+            'limit': self.batch_size,
+        })
+        for start in range(0, len(due), self.chunk_size):
+            chunk = [tuple(reminder) for reminder in due[start:start + self.chunk_size]]
+            await self.db.write(claim, chunk, now)
+            results = await asyncio.gather(*(self.send(*reminder) for reminder in chunk), return_exceptions=True)
+            retry = []
+            for reminder, result in zip(chunk, results):
+                if not isinstance(result, Exception):
+                    self.sent += 1
+                elif isinstance(result, (Forbidden, BadRequest)):
+                    # Бот заблокирован или чат недоступен: повтор не поможет
+                    self.failed += 1
+                    logger.info("Напоминание %s не доставлено: %s", reminder, result)
+                else:
+                    retry.append(reminder)
+                    logger.warning("Напоминание %s будет повторено: %s", reminder, result)
+            if retry:
+                self.retried += len(retry)
+                await self.db.write(release, retry)
+        if due:
+            logger.info("Напоминания: выбрано %s, всего отправлено %s", len(due), self.sent)
+        return len(due)
+
+    async def job(self, context):
+        """Задача JobQueue"""
+        await self.tick()
+
+    def schedule(self, job_queue, interval):
+        """Запускать tick каждые interval секунд; следующий тик не начинается, пока идёт предыдущий"""
+        return job_queue.run_repeating(self.job, interval=interval, first=interval, name='reminders',
+                                       job_kwargs={'max_instances': 1, 'coalesce': True})
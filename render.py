@@ -0,0 +1,44 @@
+from collections import OrderedDict
+
+from telegram.error import BadRequest
+
+
+class RenderCache:
+    """LRU готовых сообщений: ключ -> (текст, клавиатура).
+
+    Ключ должен однозначно определять содержимое, например
+    (id хакатона, версия строки, вариант карточки).
+    """
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, build, *args):
+        """Вернуть готовое сообщение по ключу или собрать его через build(*args)"""
+        item = self._items.get(key)
+        if item is not None:
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item
+
+        self.misses += 1
+        item = build(*args)
+        self._items[key] = item
+        if len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+        return item
+
+
+async def edit_message(message, text, reply_markup=None):
+    """Изменить сообщение бота, только если текст или клавиатура действительно меняются"""
+    if message.text == text and message.reply_markup == reply_markup:
+        return
+    try:
+        await message.edit_text(text, reply_markup=reply_markup)
+    except BadRequest as e:
+        # Сообщение могло измениться после того, как Telegram прислал нам его копию
+        if str(e) != "Message is not modified":
+            raise
@@ -0,0 +1,107 @@
+import logging
+import re
+
+from telegram.ext import CallbackQueryHandler
+
+logger = logging.getLogger(__name__)
+
+# Разделитель имени маршрута и аргументов в callback_data: "participate:12"
+SEPARATOR = ':'
+
+# Под этим именем в метриках учитываются кнопки, которых нет среди маршрутов
+OUTDATED = 'outdated'
+
+
+def callback_data(name, *args):
+    """Закодировать имя маршрута и аргументы в callback_data"""
+    return SEPARATOR.join((name, *map(str, args)))
+
+
+class CallbackRouter:
+    """Реестр маршрутов callback_data: имя -> (обработчик, типы аргументов).
+
+    Диспетчеризация - один поиск в словаре по имени до первого разделителя,
+    независимо от количества зарегистрированных кнопок. Обработчик вызывается
+    как handler(update, context, *args); аргументов может быть меньше, чем
+    типов, тогда действуют значения по умолчанию обработчика.
+    """
+
+    def __init__(self, timer=None, unknown=None):
+        # timer(name) - контекстный менеджер вокруг вызова обработчика маршрута name (метрики)
+        self.timer = timer
+        # unknown(update, context) - ответ на кнопку, которой нет среди маршрутов (устаревшее сообщение)
+        self.unknown = unknown
+        self._routes = {}
+        self._legacy = {}
+
+    def add(self, name, handler, *arg_types):
+        if SEPARATOR in name:
+            raise ValueError(f"Имя маршрута не может содержать '{SEPARATOR}': {name}")
+        if name in self._routes:
+            raise ValueError(f"Маршрут уже зарегистрирован: {name}")
+        self._routes[name] = (handler, arg_types)
+
+    def add_legacy(self, prefix, name):
+        """Старый формат callback_data prefix<аргумент> (participate_12) ведёт на маршрут name.
+
+        Кнопки в уже отправленных сообщениях остаются в старом формате; префиксы
+        проверяются, только если имя не нашлось среди маршрутов.
+        """
+        if name not in self._routes:
+            raise ValueError(f"Маршрут не зарегистрирован: {name}")
+        self._legacy[prefix] = name
+
+    def route(self, name, *arg_types):
+        """Декоратор для регистрации обработчика"""
+        def decorator(handler):
+            self.add(name, handler, *arg_types)
+            return handler
+        return decorator
+
+    def resolve(self, data):
+        """Вернуть (имя маршрута, обработчик, аргументы) для callback_data или None для неизвестного маршрута.
+
+        Имя - зарегистрированное, в том числе для старого формата: по нему считаются метрики.
+        """
+        name, _, payload = data.partition(SEPARATOR)
+        route = self._routes.get(name)
+        if route is not None:
+            values = payload.split(SEPARATOR) if payload else ()
+        else:
+            for prefix, legacy_name in self._legacy.items():
+                if data.startswith(prefix):
+                    name = legacy_name
+                    route = self._routes[legacy_name]
+                    values = (data[len(prefix):],)
+                    break
+            else:
+                return None
+        handler, arg_types = route
+        if len(values) > len(arg_types):
+            raise ValueError(f"Лишние аргументы в callback_data: {data}")
+        return name, handler, [arg_type(value) for arg_type, value in zip(arg_types, values)]
+
+    async def dispatch(self, update, context):
+        resolved = self.resolve(update.callback_query.data)
+        if resolved is None:
+            logger.warning("Неизвестный callback_data: %s", update.callback_query.data)
+            if self.unknown is None:
+                return
+            name, handler, args = OUTDATED, self.unknown, ()
+        else:
+            name, handler, args = resolved
+        if self.timer is None:
+            await handler(update, context, *args)
+            return
+        with self.timer(name):
+            await handler(update, context, *args)
+
+    def handlers(self, callback):
+        """Отдельный CallbackQueryHandler с шаблоном на каждый маршрут.
+
+        callback получает обновление после проверки шаблона, обычно это обёртка,
+        вызывающая dispatch.
+        """
+        return ([CallbackQueryHandler(callback, pattern=f'^{re.escape(name)}({SEPARATOR}|$)')
+                 for name in self._routes]
+                + [CallbackQueryHandler(callback, pattern=f'^{re.escape(prefix)}') for prefix in self._legacy])
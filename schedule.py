@@ -0,0 +1,138 @@
+import re
+from calendar import monthrange
+from datetime import datetime, timedelta, timezone
+
+# Даты в таблице хакатонов указаны по Москве
+MSK = timezone(timedelta(hours=3), 'MSK')
+
+# Дата из таблицы: "28.07.2024 23:59", "15.11.24", "1.08", "08.2024" (месяц и год)
+DATE_RE = re.compile(r'''
+    (?<![\d.:])
+    (?:(?P<day>\d{1,2})\.)?
+    (?P<month>\d{1,2})
+    (?:\.(?P<year>\d{4}|\d{2}))?
+    (?![\d.:])
+    (?:\s+(?P<hour>\d{1,2}):(?P<minute>\d{2}))?
+''', re.VERBOSE)
+
+# Дата словами: "27 сентября 2024", "сентябрь", "29 сентября"
+WORDS_RE = re.compile(r'(?:(?P<day>\d{1,2})\s+)?(?P<month>[а-яё]+)(?:\s+(?P<year>\d{4}))?', re.IGNORECASE)
+DAY_RE = re.compile(r'\d{1,2}')
+RANGE_RE = re.compile(r'\s*[-–—]\s*')
+
+# Первые три буквы названия месяца в любом падеже
+MONTHS = {'янв': 1, 'фев': 2, 'мар': 3, 'апр': 4, 'май': 5, 'мая': 5, 'июн': 6,
+          'июл': 7, 'авг': 8, 'сен': 9, 'окт': 10, 'ноя': 11, 'дек': 12}
+
+
+def _year(value, default):
+    if value is None:
+        return default
+    year = int(value)
+    return year + 2000 if year < 100 else year
+
+
+def _timestamp(year, month, day, hour=0, minute=0, second=0):
+    try:
+        return int(datetime(year, month, day, hour, minute, second, tzinfo=MSK).timestamp())
+    except ValueError:
+        return None
+
+
+def parse_deadline(text, year=None):
+    """Окончание регистрации в секундах Unix или None, если в тексте нет даты.
+
+    Берётся последняя дата текста ("09.09.2024 09:00 - 06.10.2024 23:59" - это
+    период регистрации). Без времени - конец дня, без числа ("08.2024") -
+    конец месяца, без года - year (по умолчанию текущий).
+    """
+    year = year or datetime.now(MSK).year
+    deadline = None
+    for match in DATE_RE.finditer(text or ''):
+        day, month = match['day'], int(match['month'])
+        if day is None and match['year'] is None:
+            continue  # Просто число, не дата
+        match_year = _year(match['year'], year)
+        if not 1 <= month <= 12:
+            continue
+        day = int(day) if day is not None else monthrange(match_year, month)[1]
+        if match['hour'] is not None:
+            moment = _timestamp(match_year, month, day, int(match['hour']), int(match['minute']))
+        else:
+            moment = _timestamp(match_year, month, day, 23, 59, 59)
+        if moment is not None:
+            deadline = moment
+    return deadline
+
+
+def _point(text):
+    """Число, месяц и год одного конца периода; отсутствующие части - None"""
+    text = text.strip()
+    match = DATE_RE.fullmatch(text)
+    if match and match['hour'] is None and match['day'] is not None:
+        return int(match['day']), int(match['month']), match['year'] and _year(match['year'], None)
+    if DAY_RE.fullmatch(text):
+        return int(text), None, None
+    match = WORDS_RE.fullmatch(text)
+    if match and match['month'][:3].lower() in MONTHS:
+        return (match['day'] and int(match['day']), MONTHS[match['month'][:3].lower()],
+                match['year'] and int(match['year']))
+    return None
+
+
+def parse_period(text, year=None, month=None):
+    """Начало и конец проведения (секунды Unix) из "1.08 - 10.08", "27-29 сентября 2024",
+    "15.11.24 - 31.01.25" или "июнь"; (None, None), если период не разобран.
+
+    Недостающие месяц и год начала берутся из конца, конца - из year и month
+    (обычно дата окончания регистрации). Период через Новый год без указания
+    года считается переходящим на следующий год.
+    """
+    year = year or datetime.now(MSK).year
+    parts = RANGE_RE.split((text or '').strip(), maxsplit=1)
+    points = [_point(part) for part in parts]
+    if not parts[0] or None in points:
+        return None, None
+    if len(points) == 1:
+        day, end_month, end_year = points[0]
+        start = (day or 1, end_month, end_year)
+        points.append((day, end_month, end_year))
+    else:
+        start = points[0]
+
+    end_day, end_month, end_year = points[-1]
+    end_month = end_month or month
+    if end_month is None:
+        return None, None
+    explicit_end_year = end_year is not None
+    end_year = end_year or year
+    end_day = end_day or monthrange(end_year, end_month)[1]
+    start_day, start_month, start_year = start
+    start_month = start_month or end_month
+    explicit_start_year = start_year is not None
+    start_year = start_year or end_year
+
+    if (start_year, start_month, start_day) > (end_year, end_month, end_day) and not explicit_start_year:
+        if explicit_end_year:
+            start_year -= 1
+        else:
+            end_year += 1
+    starts_at = _timestamp(start_year, start_month, start_day)
+    ends_at = _timestamp(end_year, end_month, end_day, 23, 59, 59)
+    if starts_at is None or ends_at is None or starts_at > ends_at:
+        return None, None
+    return starts_at, ends_at
+
+
+def parse_schedule(registration, duration, year=None):
+    """(starts_at, ends_at, registration_deadline) из текстов таблицы; неразобранное - None.
+
+    Год и месяц, которых нет в периоде проведения, берутся из даты окончания регистрации.
+    """
+    deadline = parse_deadline(registration, year)
+    if deadline is not None:
+        moment = datetime.fromtimestamp(deadline, MSK)
+        starts_at, ends_at = parse_period(duration, moment.year, moment.month)
+    else:
+        starts_at, ends_at = parse_period(duration, year)
+    return starts_at, ends_at, deadline
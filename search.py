@@ -0,0 +1,31 @@
+import re
+
+# Слово профиля: буквы и цифры, а также + и # внутри названий вроде C++ и C#.
+# Совпадает с токенизатором users_fts (unicode61, tokenchars '+#')
+TOKEN_RE = re.compile(r'[\w+#]+')
+
+# Больше слов в запросе не имеет смысла: все они должны встретиться в одном профиле
+MAX_TERMS = 8
+
+
+def fold(text):
+    """Привести ё к е: так же текст профиля попадает в users_fts (миграция 8)"""
+    return text.replace('ё', 'е').replace('Ё', 'Е')
+
+
+def terms(text):
+    """Различные слова текста в нижнем регистре, в порядке появления"""
+    return list(dict.fromkeys(word.lower() for word in TOKEN_RE.findall(fold(text))))
+
+
+def match_query(text):
+    """Запрос FTS5 из свободного текста; None, если в тексте нет слов.
+
+    Каждое слово ищется как префикс ("разраб" найдёт "разработчик" и "разработки"),
+    это заменяет стемминг для русского. Слова заключаются в кавычки, поэтому
+    синтаксис FTS5 во вводе пользователя не действует.
+    """
+    words = terms(text)[:MAX_TERMS]
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
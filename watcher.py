@@ -0,0 +1,179 @@
+import asyncio
+import ctypes
+import ctypes.util
+import logging
+import os
+import struct
+
+logger = logging.getLogger(__name__)
+
+# Флаги и события inotify из <sys/inotify.h>
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+EVENT = struct.Struct('iIII')
+
+
+def load_inotify():
+    """libc с функциями inotify или None (не Linux): тогда файл опрашивается"""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+inotify = load_inotify()
+
+
+class CatalogueWatcher:
+    """Фоновый импорт каталога хакатонов при изменении CSV-файла.
+
+    Следит за каталогом файла через inotify: запись в файл и его замена
+    переименованием (как сохраняют редакторы и rsync) видны сразу. Где inotify
+    нет или он не подключился, раз в poll_interval секунд сравниваются время
+    изменения и размер файла. События склеиваются: import_catalogue(path)
+    вызывается в потоке через debounce секунд после последнего изменения, и
+    event loop продолжает обрабатывать обновления. Импорт идёт одной транзакцией,
+    поэтому обработчики видят либо старый каталог, либо новый; триггеры
+    увеличивают поколение каталога, и CatalogueCache сбрасывается при следующем
+    запросе.
+    """
+
+    def __init__(self, path, import_catalogue, debounce=2.0, poll_interval=5.0):
+        self.path = os.path.abspath(path)
+        self.import_catalogue = import_catalogue
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.mode = None
+        self.imports = 0
+        self.last_summary = None
+        self._fd = None
+        self._poller = None
+        self._timer = None
+        self._importing = None
+        self._changed_again = False
+        self._stopped = False
+
+    def start(self):
+        self._stopped = False
+        self.mode = 'inotify' if self._watch() else 'polling'
+        if self.mode == 'polling':
+            self._poller = asyncio.ensure_future(self._poll())
+        logger.info("Каталог хакатонов: отслеживается %s (%s)", self.path, self.mode)
+        # Файл мог измениться, пока бот не работал; неизменный импорт пропустит по отпечатку
+        self.changed()
+
+    def _watch(self):
+        if inotify is None:
+            return False
+        fd = inotify.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            logger.warning("inotify недоступен: %s", os.strerror(ctypes.get_errno()))
+            return False
+        directory = os.path.dirname(self.path).encode()
+        if inotify.inotify_add_watch(fd, directory, IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+            logger.warning("inotify не следит за %s: %s", directory.decode(), os.strerror(ctypes.get_errno()))
+            os.close(fd)
+            return False
+        self._fd = fd
+        asyncio.get_running_loop().add_reader(fd, self._read_events)
+        return True
+
+    def _read_events(self):
+        try:
+            data = os.read(self._fd, 65536)
+        except BlockingIOError:
+            return
+        name = os.path.basename(self.path).encode()
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = EVENT.unpack_from(data, offset)
+            offset += EVENT.size
+            event_name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if mask & IN_IGNORED:
+                # Каталог удалён или перемонтирован: дальше только опрос
+                logger.warning("inotify перестал следить за каталогом %s", os.path.dirname(self.path))
+                self._unwatch()
+                self.mode = 'polling'
+                self._poller = asyncio.ensure_future(self._poll())
+                return
+            if mask & IN_Q_OVERFLOW or event_name == name:
+                self.changed()
+
+    def _unwatch(self):
+        if self._fd is not None:
+            asyncio.get_running_loop().remove_reader(self._fd)
+            os.close(self._fd)
+            self._fd = None
+
+    async def _poll(self):
+        last = self._stat()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            current = self._stat()
+            if current != last:
+                last = current
+                self.changed()
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def changed(self):
+        """Файл изменился: импортировать через debounce секунд, если изменений больше не будет"""
+        if self._stopped:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = asyncio.get_running_loop().call_later(self.debounce, self._run)
+
+    def _run(self):
+        self._timer = None
+        if self._stopped:
+            return
+        if self._importing is not None and not self._importing.done():
+            # Импорт уже идёт и мог прочитать файл до изменения: повторить после него
+            self._changed_again = True
+            return
+        self._importing = asyncio.ensure_future(self._import())
+
+    async def _import(self):
+        if not os.path.exists(self.path):
+            logger.warning("Каталог хакатонов %s не найден", self.path)
+            return
+        try:
+            summary = await asyncio.to_thread(self.import_catalogue, self.path)
+        except Exception:
+            # Ошибка в файле не должна останавливать слежение: следующее изменение импортируется заново
+            logger.exception("Не удалось импортировать каталог хакатонов из %s", self.path)
+        else:
+            self.imports += 1
+            self.last_summary = summary
+        if self._changed_again:
+            self._changed_again = False
+            self.changed()
+
+    async def stop(self):
+        self._stopped = True
+        self._changed_again = False
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._unwatch()
+        if self._poller is not None:
+            self._poller.cancel()
+            await asyncio.gather(self._poller, return_exceptions=True)
+            self._poller = None
+        if self._importing is not None:
+            # Поток импорта не прервать: дождаться, пока транзакция завершится
+            await asyncio.gather(self._importing, return_exceptions=True)
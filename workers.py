@@ -0,0 +1,226 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import tempfile
+
+from telegram import Bot, Update
+from telegram.ext import Updater
+
+import config
+from concurrency import ordering_key
+from ratelimit import SharedTokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Наибольший размер одного обновления в канале к обработчику, байт
+MAX_UPDATE_SIZE = 2 ** 20
+
+# Как часто проверять, что процессы-обработчики живы, и пауза перед перезапуском упавшего, с
+SUPERVISE_INTERVAL = 1.0
+RESTART_DELAY = 1.0
+
+# Сколько ждать завершения обработчика после SIGTERM, с
+STOP_TIMEOUT = 30.0
+
+# Дочерние процессы запускаются заново, а не копией фронта: в нём уже работает event loop
+CONTEXT = multiprocessing.get_context('spawn')
+
+
+def shard_index(update, workers, admins=frozenset()):
+    """Номер обработчика для обновления.
+
+    Ключ тот же, что у OrderedApplication: пользователь, иначе чат, поэтому
+    обновления одного пользователя всегда попадают в один процесс, к его
+    user_data. Администраторы закреплены за нулевым обработчиком, где живут
+    рассылки и напоминания.
+    """
+    key = ordering_key(update)
+    if key is None:
+        return 0
+    kind, key_id = key
+    if kind == 'user' and key_id in admins:
+        return 0
+    return key_id % workers
+
+
+async def serve_worker(application, index, path):
+    """Обработчик: принимать обновления из Unix-сокета path в очередь приложения до SIGTERM"""
+    stop = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+
+    async def receive(reader, writer):
+        try:
+            while line := await reader.readline():
+                # Полная очередь приложения притормаживает чтение, а за ним и фронт
+                await application.update_queue.put(Update.de_json(json.loads(line), application.bot))
+        finally:
+            writer.close()
+
+    await application.initialize()
+    application.bot_data['worker'] = index
+    await application.post_init(application)
+    await application.start()
+    server = await asyncio.start_unix_server(receive, path, limit=MAX_UPDATE_SIZE)
+    logger.info("Обработчик %s (pid %s) принимает обновления на %s", index, os.getpid(), path)
+    try:
+        await stop.wait()
+    finally:
+        server.close()
+        await server.wait_closed()
+        # Обновления, уже стоящие в очереди, обрабатываются до остановки
+        await application.stop()
+        await application.post_stop(application)
+        await application.shutdown()
+        await application.post_shutdown(application)
+
+
+def run_worker(index, path, token, base_url, rate_bucket):
+    """Точка входа процесса-обработчика"""
+    # Ctrl+C получает вся группа процессов; обработчики останавливает фронт, дослав им обновления
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    import bot
+    application = bot.build_application(token, base_url=base_url, rate_bucket=rate_bucket)
+    asyncio.run(serve_worker(application, index, path))
+
+
+class Shard:
+    """Процесс-обработчик, очередь обновлений для него и канал к нему"""
+
+    def __init__(self, index, directory, worker_args):
+        self.index = index
+        self.path = os.path.join(directory, f'worker-{index}.sock')
+        self.queue = asyncio.Queue(config.UPDATE_QUEUE_SIZE)
+        self.process = None
+        self._worker_args = worker_args
+        self._writer = None
+
+    def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.process = CONTEXT.Process(target=run_worker, args=(self.index, self.path, *self._worker_args),
+                                       name=f'worker-{self.index}')
+        self.process.start()
+
+    async def restart(self):
+        logger.error("Обработчик %s завершился с кодом %s, перезапуск", self.index, self.process.exitcode)
+        self._disconnect()
+        await asyncio.sleep(RESTART_DELAY)
+        self.start()
+
+    async def _connect(self):
+        while True:
+            try:
+                _, self._writer = await asyncio.open_unix_connection(self.path)
+                return
+            except (FileNotFoundError, ConnectionRefusedError):
+                # Обработчик ещё запускается (или его перезапускает supervise)
+                await asyncio.sleep(0.05)
+
+    def _disconnect(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    async def send(self, data):
+        while True:
+            if self._writer is None:
+                await self._connect()
+            try:
+                self._writer.write(data)
+                await self._writer.drain()
+                return
+            except ConnectionError as e:
+                logger.warning("Канал к обработчику %s разорван: %s", self.index, e)
+                self._disconnect()
+
+    async def forward(self):
+        """Пересылать обновления из очереди обработчику; медленный обработчик не задерживает остальных"""
+        while True:
+            update = await self.queue.get()
+            try:
+                await self.send(update.to_json().encode() + b'\n')
+            except Exception:
+                logger.exception("Обновление %s не передано обработчику %s", update.update_id, self.index)
+            finally:
+                self.queue.task_done()
+
+    async def stop(self):
+        self._disconnect()
+        if self.process.is_alive():
+            self.process.terminate()
+        await asyncio.get_running_loop().run_in_executor(None, self.process.join, STOP_TIMEOUT)
+        if self.process.is_alive():
+            logger.error("Обработчик %s не остановился за %s с", self.index, STOP_TIMEOUT)
+            self.process.kill()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+async def route(updates, shards, admins):
+    while True:
+        update = await updates.get()
+        try:
+            await shards[shard_index(update, len(shards), admins)].queue.put(update)
+        finally:
+            updates.task_done()
+
+
+async def supervise(shards):
+    while True:
+        await asyncio.sleep(SUPERVISE_INTERVAL)
+        for shard in shards:
+            if not shard.process.is_alive():
+                await shard.restart()
+
+
+async def run_front(token, workers, base_url=None, secret_token=None):
+    """Фронт: получать обновления (polling или webhook, как BOT_MODE) и раздавать их workers обработчикам.
+
+    Обработчики - отдельные процессы с полным приложением bot.build_application,
+    работающие с общей базой в режиме WAL; запись разных процессов упорядочивает
+    блокировка SQLite. Общий лимит исходящих запросов бота делят через
+    SharedTokenBucket. Упавший обработчик перезапускается; обновления, которые
+    он успел принять, но не обработал, теряются, как и при падении одного процесса.
+    """
+    directory = config.WORKER_SOCKET_DIR or tempfile.mkdtemp(prefix='community-bot-')
+    rate_bucket = SharedTokenBucket(config.RATE_LIMIT_GLOBAL, 1, CONTEXT) if config.RATE_LIMIT_GLOBAL else None
+    shards = [Shard(index, directory, (token, base_url, rate_bucket)) for index in range(workers)]
+    for shard in shards:
+        shard.start()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+
+    updates = asyncio.Queue(config.UPDATE_QUEUE_SIZE)
+    bot = Bot(token, base_url=base_url) if base_url else Bot(token)
+    updater = Updater(bot, updates)
+    tasks = [asyncio.ensure_future(route(updates, shards, config.ADMIN_IDS)),
+             asyncio.ensure_future(supervise(shards))]
+    tasks += [asyncio.ensure_future(shard.forward()) for shard in shards]
+    try:
+        async with updater:
+            if config.BOT_MODE == 'webhook':
+                await updater.start_webhook(listen=config.WEBHOOK_LISTEN, port=config.WEBHOOK_PORT,
+                                            url_path=config.WEBHOOK_PATH, webhook_url=config.WEBHOOK_URL,
+                                            secret_token=secret_token)
+            else:
+                await updater.start_polling()
+            logger.info("Фронт раздаёт обновления %s обработчикам", workers)
+            await stop.wait()
+            await updater.stop()
+        # Принятые обновления дойдут до обработчиков, прежде чем те остановятся
+        await updates.join()
+        for shard in shards:
+            await shard.queue.join()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.gather(*(shard.stop() for shard in shards))
+        if not config.WORKER_SOCKET_DIR:
+            os.rmdir(directory)